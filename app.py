@@ -1,10 +1,22 @@
 # pylint: disable=C0301
 # pylint: disable=C0103
 import datetime
+import os
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from streamlit_utils.utils import process_data, smoothen_plot, get_maker_data, get_session_state, estimate_price
+from streamlit_utils.utils import (
+    process_data,
+    smoothen_plot,
+    get_maker_data,
+    get_maker_cube,
+    get_object_cache,
+    get_session_state,
+    get_price_model_registry,
+    estimate_price,
+)
+from src.utils import cubes
+from src.utils.price_models import predict_price
 
 
 pd.options.mode.chained_assignment = None  # Disable Pandas SettingWithCopyWarning
@@ -53,8 +65,6 @@ if "car_makes" not in st.session_state:
     st.session_state.car_makes = car_makes
 if "car_models" not in st.session_state:
     st.session_state.car_models = car_models
-if "car_data" not in st.session_state:
-    st.session_state.car_data = {}
 
 selected_make = col2.selectbox(
     label="Choose brand",
@@ -64,73 +74,65 @@ selected_make = col2.selectbox(
     label_visibility="collapsed",
 )
 
+# Maker data is cached once per process and shared by all sessions instead of being copied into session state
+maker_cube = None
+selected_model = None
 if selected_make:
-    if selected_make not in st.session_state.car_data.keys():
-        maker_data = get_maker_data(st.session_state.s3, selected_make)
-        if maker_data.empty:
-            st.warning(f"Sorry, {selected_make} is not supported yet. Please try another one.", icon="⚠️")
-        else:
-            st.session_state.car_data[selected_make] = maker_data
-
-    if selected_make in st.session_state.car_data.keys():
+    maker_cube = get_maker_cube(st.session_state.s3, selected_make)
+    if maker_cube.empty:
+        st.warning(f"Sorry, {selected_make} is not supported yet. Please try another one.", icon="⚠️")
+        maker_cube = None
+    else:
         selected_model = col2.selectbox(
             label="Choose model",
-            options=["All models"] + st.session_state.car_data[selected_make]["Model pojazdu"].unique().tolist(),
+            options=["All models"] + cubes.models(maker_cube),
             index=0,
             placeholder="Choose model",
             label_visibility="collapsed",
         )
 
 
-if selected_make in st.session_state.car_data.keys():
-    data = st.session_state.car_data[selected_make]
-    if selected_model != "All models":
-        data = data[data["Model pojazdu"] == selected_model]
+if maker_cube is not None:
+    # Dashboard is rendered from summaries precomputed at upload time, raw adverts are only needed for estimation
+    cube = cubes.select_model(maker_cube, None if selected_model == "All models" else selected_model)
 
     st.divider()
 
-    data = process_data(data)
-    avg_price = str(int(data["Cena"].mean())) + " PLN"
+    averages = cubes.averages(cube)
+    avg_price = str(int(averages["Cena"])) + " PLN"
     st.subheader("Average price:   " + f":blue[{avg_price}]")
-    avg_age = str(datetime.date.today().year - int(data["Rok produkcji"].astype(int).mean())) + " years"
+    avg_age = str(datetime.date.today().year - int(averages["Rok produkcji"])) + " years"
     st.subheader("Average age:   " + f":blue[{avg_age}]")
-    avg_mileage = str(int(data["Przebieg"].mean())) + " km"
+    avg_mileage = str(int(averages["Przebieg"])) + " km"
     st.subheader("Average mileage:   " + f":blue[{avg_mileage}]")
-    countries_origin = " ".join(data["Kraj pochodzenia"].value_counts()[:3].index.to_list())
+    countries_origin = " ".join(cubes.value_counts(cube, "Kraj pochodzenia")[:3].index.to_list())
     st.subheader("Most common countries of origin:   " + f":blue[{countries_origin}]")
-    common_color = " ".join(data["Kolor"].value_counts()[:3].index.to_list())
+    common_color = " ".join(cubes.value_counts(cube, "Kolor")[:3].index.to_list())
     st.subheader("Most common colours:   " + f":blue[{common_color}]")
 
     left_column, right_column = st.columns(2)
     left_column.subheader("Fuel types")
-    left_column.bar_chart(data=data["Rodzaj paliwa"].value_counts().to_dict())
+    left_column.bar_chart(data=cubes.value_counts(cube, "Rodzaj paliwa").to_dict())
 
     right_column.subheader("Body types")
-    right_column.bar_chart(data=data["Typ nadwozia"].value_counts().to_dict())
+    right_column.bar_chart(data=cubes.value_counts(cube, "Typ nadwozia").to_dict())
 
     left_column, right_column = st.columns(2)
 
+    data_size = cubes.total_count(cube)
     left_column.subheader("Drivetrain types")
-    drivetrain_type_percentage = []
-    data_size = len(data)
-    for drivetrain in data["Napęd"].dropna().unique().tolist():
-        drivetrain_dict = {}
-        drivetrain_dict["Type of drivetrain"] = drivetrain
-        drivetrain_dict["Percentage"] = round(data["Napęd"].value_counts()[drivetrain] / data_size, 2)
-        drivetrain_type_percentage.append(drivetrain_dict)
-    drivetrain_type_percentage = pd.DataFrame(drivetrain_type_percentage)
+    drivetrain_counts = cubes.value_counts(cube, "Napęd")
+    drivetrain_type_percentage = pd.DataFrame(
+        {"Type of drivetrain": drivetrain_counts.index, "Percentage": (drivetrain_counts / data_size).round(2).values}
+    )
     drivetrain_type_plot = px.pie(drivetrain_type_percentage, names="Type of drivetrain", values="Percentage")
     left_column.plotly_chart(drivetrain_type_plot, theme="streamlit", use_container_width=True)
 
     right_column.subheader("Gearboxes types")
-    gearbox_type_percentage = []
-    data_size = len(data)
-    for gearbox in data["Skrzynia biegów"].dropna().unique().tolist():
-        gearbox_dict = {}
-        gearbox_dict["Type of gearbox"] = gearbox
-        gearbox_dict["Percentage"] = round(data["Skrzynia biegów"].value_counts()[gearbox] / data_size, 2)
-        gearbox_type_percentage.append(gearbox_dict)
-    gearbox_type_percentage = pd.DataFrame(gearbox_type_percentage)
+    gearbox_counts = cubes.value_counts(cube, "Skrzynia biegów")
+    gearbox_type_percentage = pd.DataFrame(
+        {"Type of gearbox": gearbox_counts.index, "Percentage": (gearbox_counts / data_size).round(2).values}
+    )
     gearbox_type_plot = px.pie(gearbox_type_percentage, names="Type of gearbox", values="Percentage")
     right_column.plotly_chart(gearbox_type_plot, theme="streamlit", use_container_width=True)
 
@@ -139,9 +141,7 @@ if selected_make in st.session_state.car_data.keys():
     left_column.caption(
         "Possible gaps in the charts are due to a lack of cars from a specific model year with a specific type of power source."
     )
-    data["Rok produkcji"] = data["Rok produkcji"].astype(str)
-    year_mileage = data.groupby(["Rok produkcji", "Rodzaj paliwa"])["Przebieg"].mean().astype(int).reset_index()
-    year_mileage = year_mileage.pivot(index="Rok produkcji", columns="Rodzaj paliwa", values="Przebieg")
+    year_mileage = cubes.mean_by_fuel(cube, cubes.YEAR_DIMENSION, "Przebieg")
     left_column.line_chart(year_mileage)
 
     right_column.subheader("Year / Price")
@@ -149,18 +149,17 @@ if selected_make in st.session_state.car_data.keys():
     right_column.caption(
         "Possible gaps in the charts are due to a lack of cars from a specific model year with a specific type of power source."
     )
-    year_price = data.groupby(["Rok produkcji", "Rodzaj paliwa"])["Cena"].mean().astype(int).reset_index()
-    year_price = year_price.pivot(index="Rok produkcji", columns="Rodzaj paliwa", values="Cena")
+    year_price = cubes.mean_by_fuel(cube, cubes.YEAR_DIMENSION, "Cena")
     right_column.line_chart(year_price)
 
     st.subheader("Mileage / Price")
-    st.caption("Ratio calculated by averaging all cars prices over mileages")
+    mileage_bin = f"{cubes.MILEAGE_BIN_KM:,}".replace(",", " ")
+    st.caption(f"Ratio calculated by averaging all cars prices in {mileage_bin} km mileage bins")
     st.caption(
         "Note: Smoothening is performed by fitting exponential decay model and might not be indicative in all cases"
     )
     smoothen_toggle = st.toggle("Smoothen plot", value=True)
-    mileage_price = data.groupby(["Przebieg", "Rodzaj paliwa"])["Cena"].mean().astype(int).reset_index()
-    mileage_price = mileage_price.pivot(index="Przebieg", columns="Rodzaj paliwa", values="Cena")
+    mileage_price = cubes.mean_by_fuel(cube, cubes.MILEAGE_DIMENSION, "Cena")
 
     if smoothen_toggle:
         mileage_price = smoothen_plot(data=mileage_price.reset_index(), columns=mileage_price.columns.to_list())
@@ -168,46 +167,51 @@ if selected_make in st.session_state.car_data.keys():
     st.line_chart(mileage_price)
 
 
-if (selected_make in st.session_state.car_data.keys()) and selected_model != "All models":
-    data = st.session_state.car_data[selected_make]
-    data = data[data["Model pojazdu"] == selected_model]
-    data = process_data(data)
+if maker_cube is not None and selected_model != "All models":
+    cube = cubes.select_model(maker_cube, selected_model)
     st.subheader("Price estimation")
 
-    if data is not None:
+    if not cube.empty:
         left_column, right_column = st.columns(2)
+        min_year, max_year = cubes.year_range(cube)
         year = left_column.number_input(
-            min_value=int(data["Rok produkcji"].min()),
-            max_value=int(data["Rok produkcji"].max()),
-            value=int(data["Rok produkcji"].min()),
+            min_value=min_year,
+            max_value=max_year,
+            value=min_year,
             label="Year",
             key="price_estimation_year",
         )
         mileage = right_column.text_input(label="Mileage (km)", value="100000", key="price_estimation_mileage")
         fuel_type = left_column.selectbox(
             label="Fuel type",
-            options=data["Rodzaj paliwa"].unique().tolist(),
+            options=cubes.value_counts(cube, "Rodzaj paliwa").index.to_list(),
             index=0,
             key="price_estimation_fuel_type",
         )
         power = right_column.text_input(label="Power (KM)", value="100", key="price_estimation_power")
         gearbox_type = left_column.selectbox(
             label="Gearbox type",
-            options=data["Skrzynia biegów"].unique().tolist(),
+            options=cubes.value_counts(cube, "Skrzynia biegów").index.to_list(),
             index=0,
             key="price_estimation_gearbox_type",
         )
         drive_type = right_column.selectbox(
             label="Drive type",
-            options=data["Napęd"].dropna().unique().tolist(),
+            options=cubes.value_counts(cube, "Napęd").index.to_list(),
             index=0,
             key="price_estimation_drive_type",
         )
         body_type = left_column.selectbox(
-            label="Body type", options=data["Typ nadwozia"].unique().tolist(), index=0, key="price_estimation_body_type"
+            label="Body type",
+            options=cubes.value_counts(cube, "Typ nadwozia").index.to_list(),
+            index=0,
+            key="price_estimation_body_type",
         )
         color = right_column.selectbox(
-            label="Color", options=data["Kolor"].unique().tolist(), index=0, key="price_estimation_color"
+            label="Color",
+            options=cubes.value_counts(cube, "Kolor").index.to_list(),
+            index=0,
+            key="price_estimation_color",
         )
         clean_title = left_column.toggle(label="Clean title", value=False)
         tow_hitch = right_column.toggle(label="Tow hitch", value=False)
@@ -227,10 +231,19 @@ if (selected_make in st.session_state.car_data.keys()) and selected_model != "Al
 
         if st.button("Estimate price", use_container_width=True):
             with st.spinner("Calculating price estimate..."):
-                prediction = estimate_price(prediction_features, data)
+                price_model = get_price_model_registry(st.session_state.s3).get(selected_make, selected_model)
+                if price_model is not None:
+                    prediction = predict_price(price_model, prediction_features)
+                else:
+                    data = process_data(get_maker_data(st.session_state.s3, selected_make).select(selected_model))
+                    prediction = estimate_price(prediction_features, data)
                 st.subheader(f"Estimated price: :blue[{prediction}]")
 
 
+if os.environ.get("SHOW_CACHE_STATS"):
+    st.sidebar.subheader("Cache")
+    st.sidebar.json(get_object_cache(st.session_state.s3).stats())
+
 st.markdown(
     """<div style="width:100%;text-align:center;">
     Developed by Mikołaj Wojciuk
@@ -0,0 +1,135 @@
+"""Benchmark of upload preprocessing: whole files in threads versus process pool with chunked reads.
+
+Generates synthetic scraped csv files, runs every mode in a fresh interpreter and reports wall time, peak memory
+and whether both modes produced identical upload bodies.
+
+Usage:
+    python benchmarks/preprocessing.py --makers 8 --rows 50000 --processes 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEATURES_FILE_PATH = os.path.join(REPO_DIRECTORY, "src", "resources", "features_names.txt")
+
+
+def generate_files(directory: str, n_makers: int, n_rows: int, seed: int = 0) -> list:
+    """Writes synthetic scraped csv files resembling real ones.
+
+    Args:
+        directory (str): Output directory.
+        n_makers (int): Number of files.
+        n_rows (int): Number of rows per file.
+        seed (int): Random seed.
+
+    Returns:
+        list: Paths of the written files.
+    """
+    from src.utils.equipment import EquipmentCodec  # pylint: disable=import-outside-toplevel
+
+    with open(FEATURES_FILE_PATH, "r", encoding="utf-8") as feats_file:
+        features = [line.strip() for line in feats_file]
+    equipment = EquipmentCodec(features).features
+    rng = np.random.default_rng(seed)
+    paths = []
+    for n in range(n_makers):
+        df = pd.DataFrame(index=range(n_rows), columns=features, dtype=object)
+        for feature in equipment:
+            df[feature] = np.where(rng.random(n_rows) < rng.uniform(0.05, 0.6), 1.0, np.nan)
+        # Few popular models and a long tail of rare ones, dropped by min_n_records
+        weights = np.linspace(1, 0.001, 40) ** 3
+        df["Model pojazdu"] = rng.choice([f"model-{i}" for i in range(40)], n_rows, p=weights / weights.sum())
+        df["Marka pojazdu"] = f"maker-{n}"
+        df["Cena"] = rng.integers(5_000, 400_000, n_rows).astype(str)
+        df["Przebieg"] = [f"{value:,} km".replace(",", " ") for value in rng.integers(0, 400_000, n_rows)]
+        df.loc[rng.random(n_rows) < 0.001, "Przebieg"] = "brak"
+        df["Moc"] = [f"{value} KM" for value in rng.integers(60, 400, n_rows)]
+        df["Pojemność skokowa"] = [f"{value:,} cm3".replace(",", " ") for value in rng.integers(900, 5000, n_rows)]
+        df["Rok produkcji"] = rng.integers(1995, 2025, n_rows).astype(str)
+        df["Liczba drzwi"] = np.where(rng.random(n_rows) < 0.02, np.nan, rng.choice([3.0, 5.0], n_rows))
+        for feature, values in {
+            "Rodzaj paliwa": ["Benzyna", "Diesel", "Hybryda"],
+            "Skrzynia biegów": ["Manualna", "Automatyczna"],
+            "Kolor": ["Czarny", "Biały", "Srebrny"],
+            "Bezwypadkowy": ["Tak", None],
+            "Kraj pochodzenia": ["Polska", "Niemcy", None],
+        }.items():
+            df[feature] = rng.choice(np.array(values, dtype=object), n_rows)
+        df["Waluta"] = "PLN"
+        df["Url"] = [f"https://www.otomoto.pl/oferta/{n}-{i}.html" for i in range(n_rows)]
+        path = os.path.join(directory, f"maker-{n}.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def run_mode(paths: list, processes: int) -> dict:
+    """Preprocesses files in the current interpreter.
+
+    Args:
+        paths (list): Csv files.
+        processes (int): Number of processes, 0 for whole files in threads.
+
+    Returns:
+        dict: Wall time, peak memory of this process and its children and hashes of produced bodies.
+    """
+    from src.utils.db_utils import preprocess_collections  # pylint: disable=import-outside-toplevel
+
+    start = time.perf_counter()
+    hashes = {
+        collection.name: hashlib.sha256(collection.body).hexdigest() if collection.body is not None else None
+        for collection in preprocess_collections(paths, FEATURES_FILE_PATH, processes=processes)
+    }
+    seconds = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return {"seconds": seconds, "peak_mb": max(peak_self, peak_children), "hashes": hashes}
+
+
+def main() -> None:
+    """Runs the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--makers", type=int, default=8, help="Number of generated files")
+    parser.add_argument("--rows", type=int, default=50000, help="Number of rows per generated file")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Processes of the parallel mode")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--files", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        print(json.dumps(run_mode(args.files, int(args.run))))
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_files(directory, args.makers, args.rows)
+        size_mb = sum(os.path.getsize(path) for path in paths) / 1024**2
+        print(f"{args.makers} files x {args.rows} rows, {size_mb:.0f} MB of csv")
+        results = {}
+        for mode, processes in (("threads, whole files", 0), (f"{args.processes} processes, chunks", args.processes)):
+            output = subprocess.run(
+                [sys.executable, __file__, "--run", str(processes), "--files", *paths],
+                check=True,
+                capture_output=True,
+                text=True,
+                cwd=REPO_DIRECTORY,
+            ).stdout
+            results[mode] = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:>24}: {results[mode]['seconds']:7.2f} s, peak RSS {results[mode]['peak_mb']:7.0f} MB")
+        hashes = [result["hashes"] for result in results.values()]
+        print(f"Identical upload bodies: {hashes[0] == hashes[1]}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, REPO_DIRECTORY)
+    main()
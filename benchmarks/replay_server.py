@@ -0,0 +1,206 @@
+"""Local stand-in for otomoto.pl replaying recorded listing and advert pages.
+
+Listing pages are served under /osobowe/<maker>?page=<n> and link to adverts under /oferta/. Fixtures are templates
+with {{BASE}}, {{MAKER}}, {{PAGE}} and {{LAST_PAGE}} placeholders, see benchmarks/fixtures.
+Every response can be delayed and a fraction of them fails, to resemble a remote server under load.
+
+Usage:
+    python benchmarks/replay_server.py --port 8000 --latency 0.05 --error-rate 0.01 --markup mixed
+"""
+import argparse
+import http.server
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+MARKUPS = ("current", "legacy", "mixed")
+LISTING_PATTERN = re.compile(r"^/osobowe/(?P<maker>[^/?]+)(?:\?page=(?P<page>\d+))?$")
+
+
+def read_fixtures(directory: str = FIXTURES_DIRECTORY) -> Dict[str, str]:
+    """Reads fixtures.
+
+    Args:
+        directory (str): Fixtures directory.
+
+    Returns:
+        Dict[str, str]: Fixture templates by name, e.g. "advert_current".
+    """
+    fixtures = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith(".html"):
+            with open(os.path.join(directory, file_name), "r", encoding="utf-8") as fixture_file:
+                fixtures[file_name[: -len(".html")]] = fixture_file.read()
+    return fixtures
+
+
+class ReplayServer:
+    """
+    HTTP server replaying fixtures in a background thread.
+    Args:
+        markup: Markup of served pages: "current", "legacy" or "mixed", which alternates them per request
+        latency: Mean delay of every response in seconds
+        jitter: Delay is drawn uniformly from latency +- jitter
+        error_rate: Fraction of requests answered with error_status
+        error_status: Status of failed responses
+        last_page: Number of listing pages of every maker
+        port: Port to listen on, 0 picks a free one
+        seed: Seed of delays and failures
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        markup: str = "current",
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        last_page: int = 5,
+        port: int = 0,
+        seed: Optional[int] = 0,
+    ):
+        if markup not in MARKUPS:
+            raise ValueError(f"Unknown markup {markup}. Expected one of: {', '.join(MARKUPS)}")
+        self.markup = markup
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.last_page = last_page
+        self.fixtures = read_fixtures()
+        self.counts = {"requests": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base url of the server."""
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self) -> "ReplayServer":
+        """Starts serving in a background thread.
+
+        Returns:
+            ReplayServer: The server itself.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops serving."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "ReplayServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _draw(self) -> tuple:
+        """Delay and failure of a response."""
+        with self._lock:
+            self.counts["requests"] += 1
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.counts["errors"] += 1
+            markup = self.markup
+            if markup == "mixed":
+                markup = MARKUPS[self.counts["requests"] % 2]
+        return delay, failed, markup
+
+    def render(self, path: str, markup: str) -> Optional[str]:
+        """Page served under a path.
+
+        Args:
+            path (str): Request path, with query.
+            markup (str): "current" or "legacy".
+
+        Returns:
+            Optional[str]: Page html or None if nothing is served under the path.
+        """
+        if path.startswith("/oferta/"):
+            return self.fixtures[f"advert_{markup}"]
+        if not (match := LISTING_PATTERN.match(path)):
+            return None
+        replacements = {
+            "{{BASE}}": self.url,
+            "{{MAKER}}": match.group("maker"),
+            "{{PAGE}}": match.group("page") or "1",
+            "{{LAST_PAGE}}": str(self.last_page),
+        }
+        page = self.fixtures[f"listing_{markup}"]
+        for placeholder, value in replacements.items():
+            page = page.replace(placeholder, value)
+        return page
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Request handler of ReplayServer."""
+
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Serves a fixture."""
+                delay, failed, markup = server._draw()  # pylint: disable=protected-access
+                time.sleep(delay)
+                page = None if failed else server.render(self.path, markup)
+                status = server.error_status if failed else (200 if page is not None else 404)
+                body = (page or "").encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                if failed:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def main() -> None:
+    """Runs the server until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--markup", choices=MARKUPS, default="current", help="Markup of served pages")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean delay of responses in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum deviation of the delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of failed responses")
+    parser.add_argument("--error-status", type=int, default=503, help="Status of failed responses")
+    parser.add_argument("--last-page", type=int, default=5, help="Number of listing pages of every maker")
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        args.markup,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        last_page=args.last_page,
+        port=args.port,
+    ).start()
+    print(f"Serving fixtures at {server.url}, e.g. {server.url}/osobowe/opel")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
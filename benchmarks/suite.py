@@ -0,0 +1,444 @@
+"""Offline benchmark suite of the scraper and data processing.
+
+Scraper benchmarks run against a local replay of recorded otomoto pages (see replay_server.py), processing benchmarks
+against synthetic scraped data. Import and cold start benchmarks time fresh interpreters, as short-lived workers
+and app boots see them, and report which heavy dependencies got imported on the way. Every benchmark runs in a fresh
+interpreter and reports throughput, p50/p99 latency of a single operation and peak RSS. With --baseline, the run
+fails when throughput or p99 latency of a benchmark got worse by more than --tolerance compared to a previous --json
+report.
+
+Usage:
+    python benchmarks/suite.py --latency 0.02 --json report.json
+    python benchmarks/suite.py --baseline report.json --tolerance 0.25
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESOURCES_DIRECTORY = os.path.join(REPO_DIRECTORY, "src", "resources")
+MAKER = "opel"
+# Dependencies which should only be imported once they are used, see import benchmarks
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "sklearn", "joblib", "boto3", "bs4", "lxml", "tqdm", "aiohttp")
+IMPORT_PROBE = """
+import importlib, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(seconds, ",".join(name for name in sys.argv[2:] if name in sys.modules))
+"""
+COLD_START = """
+import sys
+from loguru import logger
+logger.remove()
+from modules.scrapers.car_scraper import CarScraper
+url, maker, parser = sys.argv[1:]
+scraper = CarScraper("cold-start", parser=parser)
+scraper.BASE_URL = url
+links = scraper._get_cars_in_page(f"{url}/osobowe/{maker}", 1, maker)
+scraper.ad_fetcher._download_url(links[0])
+"""
+
+
+def summarize(latencies: List[float], n_items: int, seconds: float, unit: str) -> dict:
+    """Summary of a benchmark run in the current interpreter.
+
+    Args:
+        latencies (List[float]): Durations of single operations in seconds.
+        n_items (int): Number of processed items, e.g. adverts or rows.
+        seconds (float): Wall time of the whole run.
+        unit (str): Name of items.
+
+    Returns:
+        dict: Throughput in items per second, p50/p99 latency in milliseconds and peak RSS in megabytes.
+    """
+    from modules.scrapers.pipeline import percentile  # pylint: disable=import-outside-toplevel
+
+    return {
+        "items": n_items,
+        "unit": unit,
+        "seconds": seconds,
+        "throughput": n_items / seconds if seconds else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def timed(operations: List[Callable[[], int]], unit: str) -> dict:
+    """Runs operations one by one, timing every one of them.
+
+    Args:
+        operations (List[Callable[[], int]]): Operations returning number of items they processed.
+        unit (str): Name of items.
+
+    Returns:
+        dict: Summary, see summarize.
+    """
+    latencies = []
+    n_items = 0
+    start = time.perf_counter()
+    for operation in operations:
+        operation_start = time.perf_counter()
+        n_items += operation()
+        latencies.append(time.perf_counter() - operation_start)
+    return summarize(latencies, n_items, time.perf_counter() - start, unit)
+
+
+def children_summary(latencies: List[float], unit: str) -> dict:
+    """Summary of operations run in child interpreters, see summarize. Peak RSS is the one of the largest child.
+
+    Args:
+        latencies (List[float]): Durations of operations in seconds, one operation per child.
+        unit (str): Name of operations.
+
+    Returns:
+        dict: Summary, see summarize.
+    """
+    summary = summarize(latencies, len(latencies), sum(latencies), unit)
+    summary["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return summary
+
+
+def timed_import(module: str, args: argparse.Namespace) -> dict:
+    """Imports module in fresh interpreters, timing the import alone.
+
+    Args:
+        module (str): Imported module.
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see summarize, with heavy modules imported along with the module.
+    """
+    latencies = []
+    for _ in range(args.repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE, module, *HEAVY_MODULES], check=True, capture_output=True, text=True
+        ).stdout
+        seconds, _, loaded = output.strip().partition(" ")
+        latencies.append(float(seconds))
+    return {**children_summary(latencies, "imports"), "loaded": loaded.split(",") if loaded else []}
+
+
+def make_scraper(args: argparse.Namespace, data_directory: str):
+    """Scraper pointed at the replay server, writing into the workspace.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+        data_directory (str): Output directory of the scraper, relative to the workspace.
+
+    Returns:
+        CarScraper: Scraper.
+    """
+    from loguru import logger  # pylint: disable=import-outside-toplevel
+    from modules.scrapers.car_scraper import CarScraper  # pylint: disable=import-outside-toplevel
+
+    logger.remove()
+    scraper = CarScraper(
+        data_directory, engine=args.engine, parser=args.parser, max_requests_per_second=args.max_rps
+    )
+    # Overrides the class constant for this instance only, pylint would report the assignment as a bad attribute name
+    setattr(scraper, "BASE_URL", args.url)
+    return scraper
+
+
+def bench_download_url(args: argparse.Namespace) -> dict:
+    """AdvertisementFetcher._download_url: download and parse of a single advert.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see summarize.
+    """
+    from loguru import logger  # pylint: disable=import-outside-toplevel
+    from modules.scrapers.adv_scraper import AdvertisementFetcher  # pylint: disable=import-outside-toplevel
+
+    logger.remove()
+    fetcher = AdvertisementFetcher(parser=args.parser)
+    urls = [f"{args.url}/oferta/{MAKER}-bench-{i}.html" for i in range(args.adverts)]
+    # Benchmarks the private method on purpose, fetch_ad would also store the advert
+    download = fetcher._download_url  # pylint: disable=protected-access
+    return timed([lambda url=url: int(download(url) is not None) for url in urls], "adverts")
+
+
+def bench_get_cars_in_page(args: argparse.Namespace) -> dict:
+    """CarScraper._get_cars_in_page: download and parse of a single listing page.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see summarize.
+    """
+    scraper = make_scraper(args, "listing")
+    path = f"{scraper.BASE_URL}/osobowe/{MAKER}"
+    pages = [i % args.last_page + 1 for i in range(args.pages)]
+    get_cars_in_page = scraper._get_cars_in_page  # pylint: disable=protected-access
+    return timed([lambda page=page: len(get_cars_in_page(path, page, MAKER)) for page in pages], "links")
+
+
+def bench_scrap_maker(args: argparse.Namespace) -> dict:
+    """CarScraper.scrap_maker: all listing pages and adverts of a maker written to disk, repeated from scratch.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see summarize.
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    def run(repeat: int) -> int:
+        """Scrapes the maker into a new output directory.
+
+        Args:
+            repeat (int): Number of the repetition, naming the output directory.
+
+        Returns:
+            int: Number of written adverts.
+        """
+        scraper = make_scraper(args, f"scrap-{repeat}")
+        scraper.scrap_maker(MAKER)
+        return len(pd.read_csv(os.path.join(scraper.data_directory, f"{MAKER}.csv")))
+
+    return timed([lambda repeat=repeat: run(repeat) for repeat in range(args.repeat)], "adverts")
+
+
+def bench_import_scraper(args: argparse.Namespace) -> dict:
+    """Import of modules.scrapers.car_scraper in a fresh interpreter.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see timed_import.
+    """
+    return timed_import("modules.scrapers.car_scraper", args)
+
+
+def bench_import_app(args: argparse.Namespace) -> dict:
+    """Import of streamlit_utils.utils in a fresh interpreter, which the app does on every boot.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see timed_import, or reason why the benchmark was skipped.
+    """
+    if importlib.util.find_spec("streamlit") is None:
+        return {"skipped": "app dependencies are not installed (streamlit)"}
+    return timed_import("streamlit_utils.utils", args)
+
+
+def bench_cold_start(args: argparse.Namespace) -> dict:
+    """Fresh interpreter creating a scraper and downloading its first listing page and advert, as a worker does.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see children_summary.
+    """
+    latencies = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", COLD_START, args.url, MAKER, args.parser], check=True)
+        latencies.append(time.perf_counter() - start)
+    return children_summary(latencies, "starts")
+
+
+def read_collection(args: argparse.Namespace):
+    """Synthetic scraped file read the way upload reads it.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        tuple[pd.DataFrame, List[str]]: Read data and list of features.
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from preprocessing import FEATURES_FILE_PATH, generate_files  # pylint: disable=import-outside-toplevel
+    # pylint: disable-next=import-outside-toplevel,protected-access
+    from src.utils.db_utils import _read_collection, _read_features
+
+    features = _read_features(FEATURES_FILE_PATH)
+    path = generate_files(os.getcwd(), 1, args.rows)[0]
+    return _read_collection(path, features, MAKER), features
+
+
+def bench_process_dataframe(args: argparse.Namespace) -> dict:
+    """db_utils._process_dataframe: preprocessing of a whole scraped file before upload.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see summarize.
+    """
+    from src.utils.db_utils import _process_dataframe  # pylint: disable=import-outside-toplevel
+    from src.utils.equipment import EquipmentCodec  # pylint: disable=import-outside-toplevel
+
+    data, features = read_collection(args)
+    codec = EquipmentCodec(features)
+    return timed([lambda: len(_process_dataframe(data.copy(), 100, codec))] * args.repeat, "rows")
+
+
+def bench_process_data(args: argparse.Namespace) -> dict:
+    """streamlit_utils.utils.process_data: processing of uploaded maker data in the app, without its cache.
+
+    Args:
+        args (argparse.Namespace): Suite arguments.
+
+    Returns:
+        dict: Summary, see summarize, or reason why the benchmark was skipped.
+    """
+    try:
+        from streamlit_utils.utils import process_data  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        return {"skipped": f"app dependencies are not installed ({e.name})"}
+    from src.utils.db_utils import _process_dataframe  # pylint: disable=import-outside-toplevel
+    from src.utils.equipment import EquipmentCodec  # pylint: disable=import-outside-toplevel
+
+    data, features = read_collection(args)
+    uploaded = _process_dataframe(data, 100, EquipmentCodec(features))
+    process = getattr(process_data, "__wrapped__", process_data)
+    return timed([lambda: len(process(uploaded.copy()))] * args.repeat, "rows")
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], dict]] = {
+    "download_url": bench_download_url,
+    "get_cars_in_page": bench_get_cars_in_page,
+    "scrap_maker": bench_scrap_maker,
+    "process_dataframe": bench_process_dataframe,
+    "process_data": bench_process_data,
+    "import_scraper": bench_import_scraper,
+    "import_app": bench_import_app,
+    "cold_start": bench_cold_start,
+}
+
+
+def prepare_workspace(directory: str) -> None:
+    """Resources the scraper reads relative to the working directory, with a single maker.
+
+    Args:
+        directory (str): Workspace directory.
+    """
+    resources = os.path.join(directory, "src", "resources")
+    os.makedirs(resources)
+    shutil.copy(os.path.join(RESOURCES_DIRECTORY, "features_names.txt"), resources)
+    with open(os.path.join(resources, "car_makes.txt"), "w", encoding="utf-8") as makes_file:
+        makes_file.write(f"{MAKER}\n")
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """Regressions against a baseline report.
+
+    Args:
+        results (Dict[str, dict]): Current results by benchmark.
+        baseline (Dict[str, dict]): Baseline results by benchmark.
+        tolerance (float): Allowed relative change, e.g. 0.2 for 20%.
+
+    Returns:
+        List[str]: Descriptions of regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name, {})
+        if "throughput" not in result or "throughput" not in reference:
+            continue
+        if result["throughput"] < reference["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {result['throughput']:.1f} < {reference['throughput']:.1f}")
+        if result["p99_ms"] > reference["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {result['p99_ms']:.1f} ms > {reference['p99_ms']:.1f} ms")
+    return regressions
+
+
+def main() -> None:
+    """Runs the suite."""
+    from replay_server import MARKUPS, ReplayServer  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmarks", nargs="*", help=f"Benchmarks to run, any of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--engine", choices=["threaded", "async"], default="threaded", help="Crawl engine")
+    parser.add_argument("--parser", choices=["bs4", "lxml", "json"], default="bs4", help="Advert parser backend")
+    parser.add_argument("--markup", choices=MARKUPS, default="current", help="Markup of replayed pages")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum deviation of the delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of failed responses")
+    parser.add_argument("--max-rps", type=float, help="Requests per second ceiling of the scraper, none by default")
+    parser.add_argument("--last-page", type=int, default=5, help="Number of listing pages of the maker")
+    parser.add_argument("--adverts", type=int, default=200, help="Adverts downloaded by download_url")
+    parser.add_argument("--pages", type=int, default=50, help="Listing pages downloaded by get_cars_in_page")
+    parser.add_argument("--rows", type=int, default=50000, help="Rows of data processed by processing benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of scrap_maker and processing benchmarks")
+    parser.add_argument("--json", help="Path to write the report to")
+    parser.add_argument("--baseline", help="Report to compare with, the run fails on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        print(json.dumps(BENCHMARKS[args.run](args)))
+        return
+
+    names = args.benchmarks or list(BENCHMARKS)
+    if unknown := [name for name in names if name not in BENCHMARKS]:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    python_path = os.pathsep.join([REPO_DIRECTORY, os.path.join(REPO_DIRECTORY, "src")])
+    results = {}
+    server = ReplayServer(
+        args.markup,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        last_page=args.last_page,
+    )
+    with server, tempfile.TemporaryDirectory() as workspace:
+        prepare_workspace(workspace)
+        child_args = [arg for arg in sys.argv[1:] if arg not in names]
+        for name in names:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *child_args, "--run", name, "--url", server.url],
+                check=True,
+                capture_output=True,
+                text=True,
+                cwd=workspace,
+                env={**os.environ, "PYTHONPATH": python_path},
+            ).stdout
+            results[name] = json.loads(output.strip().splitlines()[-1])
+            result = results[name]
+            if "skipped" in result:
+                print(f"{name:>18}: skipped, {result['skipped']}")
+                continue
+            print(
+                f"{name:>18}: {result['throughput']:10.1f} {result['unit']}/s, p50 {result['p50_ms']:9.2f} ms, "
+                f"p99 {result['p99_ms']:9.2f} ms, peak RSS {result['peak_rss_mb']:7.0f} MB"
+                + (f", imported: {', '.join(result['loaded']) or 'none'}" if "loaded" in result else "")
+            )
+        print(f"Replay server: {server.counts['requests']} requests, {server.counts['errors']} failed")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as report_file:
+            json.dump(results, report_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,4 +3,9 @@ from glob import glob
 import os
 
 files_to_upload = glob(os.getcwd() + "/output/data/*.csv")
-upload_to_db(csv_files=files_to_upload, features=os.getcwd() + "/src/resources/features_names.txt")
+upload_to_db(
+    csv_files=files_to_upload,
+    features=os.getcwd() + "/src/resources/features_names.txt",
+    resources_directory=os.getcwd() + "/src/resources",
+    train_price_models=True,
+)
@@ -1,13 +1,120 @@
+"""Scrapes otomoto.pl and optionally combines, converts and uploads scraped data.
+
+Usage:
+    python src/main.py opel bmw --engine async
+    python src/main.py --stages scrape combine upload --profile
+
+With --profile, every stage (scrap_maker of every maker, combine_data, write_dataset, upload_to_db) runs under
+a sampling profiler writing flamegraph-ready folded stacks to <output>/profiles/<stage>.folded and stage timings
+to <output>/profiles/timings.jsonl, e.g. `flamegraph.pl output/profiles/combine_data.folded > combine_data.svg`.
+"""
+import argparse
+import contextlib
+import os
+from glob import glob
+from typing import Iterator, List, Optional
+
+from loguru import logger
 from modules.scrapers.car_scraper import CarScraper
+from utils.profiling import profile_stage
 
+STAGES = ("scrape", "combine", "dataset", "upload")
 
-if __name__ == "__main__":
-    # If you have a list of specific car makes to scrape, you can pass it as a parameter.
-    # car_scraper = CarScraper("resources/car_makes.txt", "output")
 
-    # Create CarScraper instance with specified output.
-    car_scraper = CarScraper("output")
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parses command line arguments.
+
+    Args:
+        argv (Optional[List[str]]): Arguments. Defaults to sys.argv.
+
+    Returns:
+        argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("makers", nargs="*", help="Makers to scrape. Defaults to all makers in car_makes.txt")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=["scrape"], help="Stages to run")
+    parser.add_argument("--output", default="output", help="Output directory")
+    parser.add_argument("--engine", choices=["threaded", "async"], default="threaded", help="Crawl engine")
+    parser.add_argument("--parser", choices=["bs4", "lxml", "json"], default="bs4", help="Advert parser backend")
+    parser.add_argument("--incremental", action="store_true", help="Download only new and changed adverts")
+    parser.add_argument("--job-id", help="Scrape job to start or resume. Defaults to a new job")
+    parser.add_argument("--resume", action="store_true", help="Resume the last unfinished job when no id is given")
+    parser.add_argument("--train-price-models", action="store_true", help="Train price models on upload")
+    parser.add_argument("--profile", action="store_true", help="Profile every stage with a sampling profiler")
+    parser.add_argument("--profile-directory", help="Directory of profiles. Defaults to <output>/profiles")
+    return parser.parse_args(argv)
+
+
+@contextlib.contextmanager
+def stage(name: str, profile_directory: Optional[str]) -> Iterator[None]:
+    """Context manager profiling a stage when profile directory is given, see utils.profiling.profile_stage.
+
+    Args:
+        name (str): Name of the stage.
+        profile_directory (Optional[str]): Directory of profiles. Stage is not profiled when not given.
 
-    # car_scraper.scrap_all_makers()
-    car_scraper.scrap_maker("marka_warszawa")
-    # car_scraper.combine_data(filename="combined.csv")
+    Yields:
+        None: Nothing.
+    """
+    if profile_directory is None:
+        yield
+        return
+    with profile_stage(name, profile_directory) as profiler:
+        yield
+    hottest = ", ".join(f"{function} ({count})" for function, count in profiler.hottest(3))
+    logger.info(f"Profiled {name}: {profiler.seconds:.1f}s, {profiler.n_samples} samples, hottest: {hottest}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Runs selected stages.
+
+    Args:
+        argv (Optional[List[str]]): Arguments. Defaults to sys.argv.
+    """
+    args = parse_args(argv)
+    profile_directory = None
+    if args.profile:
+        profile_directory = args.profile_directory or os.path.join(os.getcwd(), args.output, "profiles")
+
+    car_scraper = CarScraper(
+        args.output,
+        engine=args.engine,
+        parser=args.parser,
+        incremental=args.incremental,
+        job_id=args.job_id,
+        resume=args.resume,
+    )
+    if "scrape" in args.stages:
+        for maker in args.makers or car_scraper.makers:
+            with stage(f"scrap_maker.{maker.strip()}", profile_directory):
+                car_scraper.scrap_maker(maker)
+        car_scraper.journal.finish()
+        car_scraper.journal.drop_finished_jobs()
+    if "combine" in args.stages:
+        with stage("combine_data", profile_directory):
+            car_scraper.combine_data()
+    if "dataset" in args.stages:
+        # Writes a Parquet dataset partitioned by maker and scrape date into <output>/dataset
+        with stage("write_dataset", profile_directory):
+            car_scraper.write_dataset()
+    if "upload" in args.stages:
+        from utils.db_utils import upload_to_db  # pylint: disable=import-outside-toplevel
+
+        csv_files = [
+            path
+            for path in glob(os.path.join(car_scraper.data_directory, "*.csv"))
+            if os.path.basename(path) != CarScraper.COMBINED_FILENAME
+        ]
+        with stage("upload_to_db", profile_directory):
+            upload_to_db(
+                csv_files=csv_files,
+                features=os.path.join("src", "resources", "features_names.txt"),
+                resources_directory=os.path.join("src", "resources"),
+                train_price_models=args.train_price_models,
+            )
+    if profile_directory is not None:
+        logger.info(f"Profiles written to {profile_directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,18 @@
+import asyncio
 import os
-import random
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
 from loguru import logger
 
-import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from resources.headers import ADVERT_HEADERS
+from modules.scrapers.concurrency import AimdController, AsyncConcurrencyLimiter, ConcurrencyLimiter
+from modules.scrapers.metrics import ScrapeMetrics
+from modules.scrapers.parsers import get_parser
+from modules.scrapers.seen_index import SeenAdvertIndex
+from modules.scrapers.sinks import RowSink
+from modules.scrapers.transport import AsyncHttpTransport, HttpTransport
+from utils.equipment import EQUIPMENT_COLUMN, EquipmentCodec
 
 
 class AdvertisementFetcher:
@@ -15,148 +20,222 @@ class AdvertisementFetcher:
     Fetches advertisements
     Args:
          features_file_path: Path to file with features
+         engine: Crawl engine, either "threaded" (thread pool with blocking requests) or "async" (asyncio + aiohttp)
+         transport: Pooled HTTP transport used by the threaded engine. Defaults to a new HttpTransport
+         parser: Advert parser backend, one of modules.scrapers.parsers.PARSERS. Defaults to "bs4"
+         seen_index: Index notified about adverts written by save_ads during incremental scrapes.
+            With a sink, adverts are marked fetched by its on_flush callback once they are written
+         sink: Sink streaming fetched adverts to disk. When not given, adverts are accumulated in memory in cars
+         compact_equipment: Whether to store equipment flags as a single bitmask column (see utils.equipment)
+            instead of one column per equipment feature
+         metrics: Metrics of fetches, parsing and saved adverts. Defaults to new ScrapeMetrics
+         controller: Controller adapting the number of advert requests in flight to latency and throttling of the
+            site, it should be fed by the transport. Defaults to make_controller(engine, metrics)
     """
 
-    MAX_THREADS = 4
-
-    def __init__(self, features_file_path="src/resources/features_names.txt"):
+    # Upper bounds of advert requests in flight of the threaded and async engine, the actual number starts at
+    # INITIAL_CONCURRENCY and is adapted at runtime, see modules.scrapers.concurrency
+    MAX_THREADS = 32
+    MAX_CONCURRENT_REQUESTS = 200
+    INITIAL_CONCURRENCY = 4
+    ENGINES = ("threaded", "async")
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        features_file_path="src/resources/features_names.txt",
+        *,
+        engine: str = "threaded",
+        transport: Optional[HttpTransport] = None,
+        parser: str = "bs4",
+        seen_index: Optional[SeenAdvertIndex] = None,
+        sink: Optional[RowSink] = None,
+        compact_equipment: bool = False,
+        metrics: Optional[ScrapeMetrics] = None,
+        controller: Optional[AimdController] = None,
+    ):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine}. Expected one of: {', '.join(self.ENGINES)}")
+        self.engine = engine
         self.features_file_path = os.path.join(os.getcwd(), features_file_path)
         self.all_features = self._read_features()
-        self.header = random.choice(ADVERT_HEADERS)
+        self.equipment_codec = EquipmentCodec(self.all_features) if compact_equipment else None
+        self.columns = self.equipment_codec.columns(self.all_features) if compact_equipment else self.all_features
+        self.metrics = metrics or ScrapeMetrics()
+        self.controller = controller or self.make_controller(engine, self.metrics)
+        self.limiter = ConcurrencyLimiter(self.controller)
+        self.transport = transport or HttpTransport(metrics=self.metrics, controller=self.controller)
+        self.parser = get_parser(parser, self.metrics)
+        self.seen_index = seen_index
+        self.sink = sink
+        self.fetched_urls: Set[str] = set()
         self.cars = []
 
+    @classmethod
+    def make_controller(cls, engine: str, metrics: Optional[ScrapeMetrics] = None) -> AimdController:
+        """Creates concurrency controller for an engine.
+
+        Args:
+            engine (str): Crawl engine, see ENGINES.
+            metrics (Optional[ScrapeMetrics]): Metrics the current limit is reported to.
+
+        Returns:
+            AimdController: Controller starting at INITIAL_CONCURRENCY, bounded by MAX_THREADS for the threaded
+                engine and MAX_CONCURRENT_REQUESTS for the async one.
+        """
+        max_limit = cls.MAX_CONCURRENT_REQUESTS if engine == "async" else cls.MAX_THREADS
+        return AimdController(cls.INITIAL_CONCURRENCY, max_limit=max_limit, metrics=metrics)
+
     def _read_features(self) -> List[str]:
         with open(self.features_file_path, "r", encoding="utf-8") as feats_file:
             features = feats_file.readlines()
         return [x.strip() for x in features]
 
     def _make_line(self, main_features) -> Dict[str, str]:
+        if self.equipment_codec is not None:
+            temp = {feat: main_features.get(feat, None) for feat in self.columns[:-1]}
+            temp[EQUIPMENT_COLUMN] = self.equipment_codec.encode(
+                feat for feat, value in main_features.items() if value is not None
+            )
+            return temp
         temp = {feat: main_features.get(feat, None) for feat in self.all_features}
         return temp
 
     def _download_url(self, path) -> Optional[Dict[str, str]]:
+        start = time.perf_counter()
         try:
-            res = requests.get(path)
+            with self.limiter:
+                res = self.transport.get(path)
             res.raise_for_status()
         except requests.exceptions.RequestException as e:
+            self.metrics.record_fetch("advert", time.perf_counter() - start, getattr(e.response, "status_code", None))
             logger.info(f"Could not retrieve data from {path}.")
             logger.info(f"Error: {e}")
             logger.info(f"Skipping {path} url.")
             return None
+        self.metrics.record_fetch("advert", time.perf_counter() - start, res.status_code, len(res.content))
 
-        soup = BeautifulSoup(res.text)
-        if style_tags := soup.find_all("style"):
-            for style_tag in style_tags:
-                style_tag.decompose()
-
-        features = self._get_main_features(soup)
-        extendend_features = self._get_extended_features(path, soup)
-        features.update(extendend_features)
-        price_feat = self._get_price(soup)
-        features.update(price_feat)
-        currency_feat = self._get_currency(soup)
-        features.update(currency_feat)
-        features.update({"Url": str(path)})
-        features = self._make_line(features)
+        return self._parse_advert(path, res.text)
 
-        return features
+    async def _download_url_async(
+        self, transport: AsyncHttpTransport, limiter: AsyncConcurrencyLimiter, path: str
+    ) -> Optional[Dict[str, str]]:
+        import aiohttp  # pylint: disable=import-outside-toplevel
 
-    def _get_main_features(self, soup) -> Dict[str, str]:
-        features = {}
-        if main_params := soup.find("div", {"data-testid": "content-details-section"}):
-            if advert_details := main_params.find_all("div", attrs={"data-testid": "advert-details-item"}):
-                for param in advert_details:
-                    el = [x.text for x in param]
-                    features.update({el[0]: el[1]})
-
-        else:
-            if main_params := soup.find_all(class_="offer-params__item"):
-                features = {
-                    param.find("span", class_="offer-params__label")
-                    .text.strip(): param.find("div", class_="offer-params__value")
-                    .text.strip()
-                    for param in main_params
-                }
+        async with limiter:
+            start = time.perf_counter()
+            try:
+                page = await transport.get(path, raise_for_status=True)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.metrics.record_fetch("advert", time.perf_counter() - start, getattr(e, "status", None))
+                logger.info(f"Could not retrieve data from {path}.")
+                logger.info(f"Error: {e}")
+                logger.info(f"Skipping {path} url.")
+                return None
+            self.metrics.record_fetch("advert", time.perf_counter() - start, page.status, len(page.content))
+
+        return self._parse_advert(path, page.text)
+
+    def _parse_advert(self, path: str, html: str) -> Dict[str, str]:
+        features = self.parser.parse(path, html)
+        features.update({"Url": str(path)})
+        features = self._make_line(features)
 
         return features
 
-    def _get_extended_features(self, path, soup) -> Dict[str, str]:
-        features = {}
+    def _collect(self, result: Optional[Dict[str, str]]) -> None:
+        if result is not None and result["Cena"] is None:
+            self.metrics.inc("scraper_adverts_total", outcome="no_price")
+        if result is not None and result["Cena"] is not None:
+            self.metrics.inc("scraper_adverts_total", outcome="saved")
+            self.fetched_urls.add(result["Url"])
+            if self.sink is not None:
+                self.sink.write(result)
+            else:
+                self.cars.append(result)
 
-        try:
-            extendend_params = soup.find_all("div", attrs={"data-testid": "accordion-collapse-inner-content"})
-            for param in extendend_params:
-                for x in param.find_all("p"):
-                    features[x.text.strip()] = 1
-        except (IndexError, AttributeError) as e:
-            logger.info(
-                f"""Error while fetching extended features using accordion-collapse-inner-content: {e}.
-                Processing with parameter-feature-item"""
-            )
-            try:
-                extendend_params = soup.find_all("li", class_="parameter-feature-item")
-                for param in extendend_params:
-                    features[param.text.strip()] = 1
-            except (IndexError, AttributeError) as ee:
-                logger.info(f"Error {ee} while fetching extended features from {path}")
-        return features
+    def fetch_ad(self, link: str) -> Optional[Dict[str, str]]:
+        """Fetches single ad and stores it if it has a price.
 
-    def _get_price(self, soup) -> Dict[str, str]:
-        features = {}
-        try:
-            price = "".join(soup.select('h3[class^="offer-price__number"]')[0].text.strip().split())
-            features["Cena"] = price
-        except (IndexError, AttributeError) as e:
-            logger.info(
-                f"""Error while fetching price feature from h3 offer-price__number: {e}.
-            Processing with span offer-price__number"""
-            )
-            try:
-                price = "".join(soup.find("span", class_="offer-price__number").text.strip().split()[:-1])
-                features["Cena"] = price
-            except (IndexError, AttributeError) as ee:
-                logger.info(f"Error {ee} while fetching price feature.")
-                features["Cena"] = None
-        return features
-
-    def _get_currency(self, soup) -> Dict[str, str]:
-        features = {}
+        Args:
+            link (str): Advertisement url.
 
-        try:
-            currency = "".join(soup.select('p[class^="offer-price__currency"]')[0].text.strip().split())
-            features["Waluta"] = currency
-        except (IndexError, AttributeError) as e:
-            logger.info(
-                f"""Error while fetching currency feature from p offer-price__currency: {e}.
-            Processing with span offer-price__currency"""
-            )
-            try:
-                currency = soup.find("span", class_="offer-price__currency").text.strip()
-                features["Waluta"] = currency
-            except (IndexError, AttributeError) as ee:
-                logger.info(f"Error {ee} while fetching currency feature.")
-                features["Waluta"] = None
-        return features
+        Returns:
+            Optional[Dict[str, str]]: Advertisement features or None if it could not be retrieved.
+        """
+        result = self._download_url(link)
+        self._collect(result)
+        return result
 
     def fetch_ads(self, links: List[str]):
         """Fetches ads
         Args:
              links(list[str]): links
         """
+        if self.engine == "async":
+            asyncio.run(self._fetch_ads_async(links))
+            return
+
         with ThreadPoolExecutor(max_workers=min(self.MAX_THREADS, len(links) + 1)) as executor:
             features = []
             for link in links:
                 features.append(executor.submit(self._download_url, link))
             for feature in as_completed(features):
-                result = feature.result()
-                if result is not None and result["Cena"] is not None:
-                    self.cars.append(result)
+                self._collect(feature.result())
+
+    async def _fetch_ads_async(self, links: List[str]) -> None:
+        async with self.make_async_transport() as transport:
+            await self.fetch_ads_async(links, transport, AsyncConcurrencyLimiter(self.controller))
+
+    def make_async_transport(self) -> AsyncHttpTransport:
+        """Creates async transport sized for the async engine.
 
-    def save_ads(self, model: str):
+        Returns:
+            AsyncHttpTransport: Transport with connection pool matching MAX_CONCURRENT_REQUESTS, feeding the controller.
+        """
+        return AsyncHttpTransport(
+            limit=self.MAX_CONCURRENT_REQUESTS,
+            metrics=self.metrics,
+            rate_limiter=self.transport.rate_limiter,
+            controller=self.controller,
+        )
+
+    async def fetch_ads_async(
+        self, links: List[str], transport: AsyncHttpTransport, limiter: AsyncConcurrencyLimiter
+    ) -> None:
+        """Fetches ads concurrently within a running event loop.
+
+        Args:
+            links (List[str]): links
+            transport (AsyncHttpTransport): Transport shared by all requests of the crawl.
+            limiter (AsyncConcurrencyLimiter): Limiter bounding number of requests in flight.
+        """
+        for feature in asyncio.as_completed([self._download_url_async(transport, limiter, link) for link in links]):
+            self._collect(await feature)
+
+    def save_ads(self, model: str, keep_urls: Optional[Set[str]] = None):
         """
         Saves ads
         Args:
              model(str): model
+             keep_urls(set[str]): When given, ads already saved for the model are merged with the fetched ones:
+                rows whose url is still listed and was not fetched again are kept, the rest is dropped.
         """
-
-        pd.DataFrame(self.cars).to_csv(f"output/data/{model}.csv", index=False)
+        if self.sink is not None:
+            if keep_urls is not None and os.path.exists(self.sink.path):
+                for saved in self.sink.read_saved():
+                    self.sink.write_frame(saved[saved["Url"].isin(keep_urls) & ~saved["Url"].isin(self.fetched_urls)])
+            self.sink.close()
+            return
+
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        path = f"output/data/{model}.csv"
+        data = pd.DataFrame(self.cars, columns=self.columns)
+        if keep_urls is not None and os.path.exists(path):
+            saved = pd.read_csv(path, low_memory=False)
+            saved = saved[saved["Url"].isin(keep_urls) & ~saved["Url"].isin(data["Url"])]
+            data = pd.concat([saved, data], ignore_index=True)
+        data.to_csv(path, index=False)
+        # Rows written through a sink are marked fetched by its on_flush callback
+        if self.seen_index is not None:
+            self.seen_index.mark_fetched(data["Url"])
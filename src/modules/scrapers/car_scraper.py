@@ -1,14 +1,32 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import functools
 import os
 import pathlib
-import pandas as pd
+import shutil
+import time
 import requests
 import json
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set
 from modules.scrapers.adv_scraper import AdvertisementFetcher
+from modules.scrapers.concurrency import AsyncConcurrencyLimiter, HostRateLimiter
+from modules.scrapers.journal import JobJournal
+from modules.scrapers.metrics import MetricsExporter, ScrapeMetrics
+from modules.scrapers.partition import SearchPartitioner, SearchSlice
+from modules.scrapers.parsers import ListingCard, fingerprint, parse_listing_cards
+from modules.scrapers.pipeline import AdvertPipeline
+from modules.scrapers.seen_index import SeenAdvertIndex
+from modules.scrapers.sinks import SINKS, make_sink, read_batches
+from modules.scrapers.transport import HttpTransport
 from pathlib import Path
 from loguru import logger
-from tqdm import tqdm
 from resources.headers import PAGE_HEADER
+from utils.catalog import CATALOG_KEY, build_catalog, write_catalog
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class CarScraper:
@@ -16,9 +34,50 @@ class CarScraper:
     Scraps cars from otomoto.pl
     Args:
         data_directory: path to directory where data will be saved
+        engine: Crawl engine, either "threaded" or "async". See AdvertisementFetcher.
+        parser: Advert parser backend, one of "bs4", "lxml" or "json". See modules.scrapers.parsers.
+            With "json" listing pages are also read from their embedded data first.
+        incremental: Whether to fetch only adverts which are new or whose listing card changed since the last run.
+            Seen adverts are tracked in seen_index.sqlite inside data_directory.
+        output_format: Format of per-maker files, either "csv" or "parquet". Rows are streamed to disk in batches.
+        job_id: Identifier of the scrape job recorded in journal.sqlite inside data_directory. Restarting a job with
+            the same identifier skips finished makers and listing pages and continues interrupted outputs.
+            Defaults to a new job, see JobJournal. scrap_all_makers finishes the job once all makers are done.
+        resume: Whether to resume the last job which has not been finished when job_id is not given.
+        compact_equipment: Whether to store equipment flags as a single bitmask column instead of one column per
+            equipment feature. See utils.equipment.
+        metrics_file: Name of the JSON snapshot of crawl metrics inside the logs directory, rewritten every
+            METRICS_INTERVAL seconds. None disables snapshots. See modules.scrapers.metrics.
+        metrics_port: Port serving crawl metrics in Prometheus format under /metrics. Not served by default.
+        max_requests_per_second: Ceiling of requests per second sent to the site, None removes it. The number
+            of advert requests in flight adapts to the site's latency and throttling below this ceiling.
     """
 
-    def __init__(self, data_directory):
+    BASE_URL = "https://www.otomoto.pl"
+    COMBINE_BATCH_SIZE = 10000
+    COMBINED_FILENAME = "combined.csv"
+    METRICS_INTERVAL = 30.0
+    MAX_REQUESTS_PER_SECOND = 20.0
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        data_directory,
+        *,
+        engine: str = "threaded",
+        parser: str = "bs4",
+        incremental: bool = False,
+        output_format: str = "csv",
+        job_id: Optional[str] = None,
+        resume: bool = False,
+        compact_equipment: bool = False,
+        metrics_file: Optional[str] = "metrics.json",
+        metrics_port: Optional[int] = None,
+        max_requests_per_second: Optional[float] = MAX_REQUESTS_PER_SECOND,
+    ):
+        self.engine = engine
+        self.parser = parser
+        self.output_format = output_format
+        self.compact_equipment = compact_equipment
         self.data_directory = os.path.join(os.getcwd(), data_directory, "data")
         self.log_directory = os.path.join(os.getcwd(), data_directory, "logs")
 
@@ -33,22 +92,86 @@ class CarScraper:
             diagnose=True,
         )
 
+        self.metrics = ScrapeMetrics()
+        self.metrics_exporter = MetricsExporter(
+            self.metrics,
+            os.path.join(self.log_directory, metrics_file) if metrics_file is not None else None,
+            self.METRICS_INTERVAL,
+            metrics_port,
+        ).start()
+        if self.metrics_exporter.url is not None:
+            logger.info(f"Serving crawl metrics at {self.metrics_exporter.url}")
+        # One controller for the whole crawl, so the limit learnt on one maker carries over to the next one
+        self.controller = AdvertisementFetcher.make_controller(engine, self.metrics)
+        self.transport = HttpTransport(
+            metrics=self.metrics,
+            rate_limiter=HostRateLimiter(max_requests_per_second) if max_requests_per_second else None,
+            controller=self.controller,
+        )
         self.car_makers_file_path = os.path.join("src", "resources", "car_makes.txt")
+        self.partitioner = SearchPartitioner(self._count_slice_pages, os.path.join("src", "resources", "car_models"))
         if not os.path.exists(self.car_makers_file_path):
             logger.info("Manufacturers data not found. Fetching into resources/car_makes.txt")
             self._scrape_makes_models()
 
         self.makers = self._read_makers()
-        self.ad_fetcher = AdvertisementFetcher()
         self.header = PAGE_HEADER
         pathlib.Path(self.data_directory).mkdir(parents=True, exist_ok=True)
+        self.seen_index = (
+            SeenAdvertIndex(os.path.join(os.getcwd(), data_directory, "seen_index.sqlite")) if incremental else None
+        )
+        self.journal = JobJournal(os.path.join(os.getcwd(), data_directory, "journal.sqlite"), job_id, resume)
+        self._listed_urls = set()
+        self._written_urls = set()
+        self.ad_fetcher = self._make_ad_fetcher()
+
+    def _make_ad_fetcher(
+        self, output_name: Optional[str] = None, output_directory: Optional[str] = None
+    ) -> AdvertisementFetcher:
+        ad_fetcher = AdvertisementFetcher(
+            engine=self.engine,
+            transport=self.transport,
+            parser=self.parser,
+            seen_index=self.seen_index,
+            compact_equipment=self.compact_equipment,
+            metrics=self.metrics,
+            controller=self.controller,
+        )
+        if output_name is not None:
+            ad_fetcher.sink = make_sink(
+                self.output_format,
+                output_directory or self.data_directory,
+                output_name,
+                ad_fetcher.columns,
+                on_flush=functools.partial(self._on_flush, output_name),
+                resume_state=self.journal.sink_state(output_name),
+            )
+            ad_fetcher.fetched_urls.update(self._written_urls)
+        return ad_fetcher
+
+    def _on_flush(self, output_name: str, batch: pd.DataFrame, state: int) -> None:
+        self.journal.record_flush(output_name, batch["Url"], state)
+        if self.seen_index is not None:
+            # Fingerprints are committed only once rows are durable, a crash before the flush refetches them
+            self.seen_index.mark_fetched(batch["Url"])
+        self.metrics.inc("scraper_rows_written_total", len(batch), output=output_name)
+
+    @property
+    def shards_directory(self) -> str:
+        """Directory with outputs of slices and page ranges of the current job, merged into maker outputs."""
+        return os.path.join(self.data_directory, "shards", self.journal.job_id)
+
+    def _complete_page(self, maker: str, ad_fetcher: AdvertisementFetcher, page: int) -> None:
+        ad_fetcher.sink.flush()
+        self.journal.mark_page_done(maker, page)
 
     def _scrape_makes_models(self) -> None:
         """Function for scraping car manufacturers and car models.
         Inteded for single use when there is a need to update existing cars and models.
+        Besides car_makes.txt and car_models directory writes catalog.json with all makes and models.
         """
 
-        res = requests.get("https://www.otomoto.pl/ajax/jsdata/params/")
+        res = self.transport.get(f"{self.BASE_URL}/ajax/jsdata/params/")
         data = res.text.split("var searchConditions = ")[1]
         data = data.split(";var searchCondition")[0]
         items = json.loads(data)
@@ -75,11 +198,18 @@ class CarScraper:
             for maker in list(results.keys()):
                 maker_file.write(f"{maker}\n")
 
+        # Single manifest of makes and models, uploaded with the data so the app loads it in one request
+        write_catalog(str(resources_path.parent.joinpath(CATALOG_KEY)), build_catalog(results))
+
     def _read_makers(self):
         with open(self.car_makers_file_path, "r", encoding="utf-8") as file:
             makers = [line for line in file if not line.isspace()]
         return makers
 
+    @staticmethod
+    def _page_url(path: str, i: int) -> str:
+        return f"{path}{'&' if '?' in path else '?'}page={i}"
+
     def _get_cars_in_page(self, path, i, maker):
         """
         Gets cars in page
@@ -90,76 +220,349 @@ class CarScraper:
             list of links
         """
         logger.info(f"Scrapping maker: {maker} page: {i}")
-        res = requests.get(f"{path}?page={i}", headers=self.header)
-        soup = BeautifulSoup(res.content, "html.parser")
+        start = time.perf_counter()
+        try:
+            res = self.transport.get(self._page_url(path, i), headers=self.header)
+        except requests.exceptions.RequestException:
+            self.metrics.record_fetch("listing", time.perf_counter() - start, None)
+            raise
+        self.metrics.record_fetch("listing", time.perf_counter() - start, res.status_code, len(res.content))
+        return self._parse_links(res.content, maker)
+
+    async def _get_cars_in_page_async(self, transport, limiter, path, i, maker):
+        """
+        Gets cars in page using the async engine
+        Args:
+            transport: async transport
+            limiter: limiter bounding number of requests in flight
+            path: path to page
+            i: page number
+            maker: manufacturer name
+        return:
+            list of links
+        """
+        import aiohttp  # pylint: disable=import-outside-toplevel
+
+        async with limiter:
+            logger.info(f"Scrapping maker: {maker} page: {i}")
+            start = time.perf_counter()
+            try:
+                page = await transport.get(self._page_url(path, i), headers=self.header)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.metrics.record_fetch("listing", time.perf_counter() - start, None)
+                raise
+            self.metrics.record_fetch("listing", time.perf_counter() - start, page.status, len(page.content))
+        return self._parse_links(page.content, maker)
+
+    def _parse_links(self, content, maker):
+        with self.metrics.time("scraper_parse_seconds", parser="listing", extractor="cards"):
+            cards = self._parse_cards(content)
+        logger.info(f"Found {len(cards)} links")
+        if self._written_urls:
+            cards = [card for card in cards if card.url not in self._written_urls]
+        if self.seen_index is None:
+            return [card.url for card in cards]
+
+        self._listed_urls.update(card.url for card in cards)
+        self.journal.record_listed(maker, [card.url for card in cards])
+        links = self.seen_index.select_changed(cards)
+        logger.info(f"{len(links)} of them are new or changed since the last run")
+        return links
+
+    def _parse_cards(self, content):
+        if self.parser == "json" and (cards := parse_listing_cards(content)) is not None:
+            return cards
+
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
+        soup = BeautifulSoup(content, "html.parser")
         car_links_section = soup.find("div", {"data-testid": "search-results"})
-        links = []
+        cards = []
         if car_links_section:
             for x in car_links_section.find_all("div"):
                 if articles := x.find("article", attrs={"data-media-size": True}):
                     if articles_data := articles.find("a", href=True)["href"]:
-                        links.append(articles_data)
-        logger.info(f"Found {len(links)} links")
-        return links
+                        cards.append(ListingCard(articles_data, fingerprint(articles.text)))
+        return cards
 
     def scrap_maker(self, maker: str):
         """Scrap data from single car manufacturer.
+        Makers with more listing pages than the site shows are split into slices by model, production year
+        and price (see modules.scrapers.partition), scraped one by one and merged, without duplicated adverts.
+        Slices are written into shards of the current job, removed once they are merged.
 
         Args:
             maker (str): Manufacturer name.
 
         Raises:
-            SystemExit: Error when obtaining HTTP request.
+            SystemExit: Error when obtaining number of listing pages.
+            requests.exceptions.RequestException: Error when obtaining listing page with the threaded engine.
+            aiohttp.ClientError: Error when obtaining listing page with the async engine.
+            asyncio.TimeoutError: Timeout of listing page request with the async engine.
         """
         maker = maker.strip()
+        if self.journal.is_maker_done(maker):
+            logger.info(f"Maker {maker} already scrapped in job {self.journal.job_id}. Skipping")
+            return
         logger.info(f"Start scrapping maker: {maker}")
-        path = f"https://www.otomoto.pl/osobowe/{maker}"
+        slices = self.partitioner.partition(maker)
+        if len(slices) == 1:
+            search, last_page_num = slices[0]
+            self.scrap_pages(maker, range(1, last_page_num + 1), path=search.url(self.BASE_URL))
+        else:
+            logger.info(f"Scrapping {maker} in {len(slices)} slices")
+            shard_directory = os.path.join(self.shards_directory, maker)
+            written_urls = set()
+            for search, last_page_num in slices:
+                if self.journal.is_maker_done(search.name):
+                    # Journal entries of finished slices are dropped, their adverts are read back from the output
+                    written_urls.update(self._output_urls(shard_directory, search.name))
+                    continue
+                written_urls = self.scrap_pages(
+                    maker,
+                    range(1, last_page_num + 1),
+                    output_name=search.name,
+                    output_directory=shard_directory,
+                    path=search.url(self.BASE_URL),
+                    skip_urls=written_urls,
+                )
+            self.merge_shards(maker)
+            self.journal.mark_maker_done(maker)
+            # Removed only once the maker is done, a crash before it merges the shards again on resume
+            shutil.rmtree(shard_directory, ignore_errors=True)
+        logger.info(f"End Scrapping maker: {maker}")
+
+    def get_last_page_num(self, maker: str) -> int:
+        """Get number of listing pages of a manufacturer, capped at the number of pages the site shows.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            int: Number of listing pages.
+
+        Raises:
+            SystemExit: Error when obtaining HTTP request.
+        """
+        return min(self.count_pages(f"{self.BASE_URL}/osobowe/{maker}"), self.partitioner.max_pages)
+
+    def _count_slice_pages(self, search: SearchSlice) -> int:
+        return self.count_pages(search.url(self.BASE_URL))
+
+    def count_pages(self, path: str) -> int:
+        """Get number of listing pages of a listing url, as shown in its pagination.
+
+        Args:
+            path (str): Listing url.
+
+        Returns:
+            int: Number of listing pages.
 
+        Raises:
+            SystemExit: Error when obtaining HTTP request.
+        """
+        start = time.perf_counter()
         try:
-            res = requests.get(path)
+            res = self.transport.get(path)
             res.raise_for_status()
         except requests.exceptions.RequestException as e:
+            self.metrics.record_fetch("listing", time.perf_counter() - start, getattr(e.response, "status_code", None))
             logger.info(f"Could not retrieve data from {path}.")
             logger.info(f"Error: {e}")
             raise SystemExit() from e
+        self.metrics.record_fetch("listing", time.perf_counter() - start, res.status_code, len(res.content))
+
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
 
         soup = BeautifulSoup(res.text)
         if pagination_list_item := soup.find_all("li", attrs={"data-testid": "pagination-list-item"}):
             last_page_num = int(pagination_list_item[-1].text)
         else:
             last_page_num = 1
-        last_page_num = min(last_page_num, 500)
         logger.info(f"Model has: {last_page_num} subpages")
+        return last_page_num
 
-        pages = range(1, last_page_num + 1)
-        ad_fetcher = AdvertisementFetcher()
-        for page in tqdm(pages):
-            links = self._get_cars_in_page(path, page, maker)
-            ad_fetcher.fetch_ads(links)
-        ad_fetcher.save_ads(maker)
+    def scrap_pages(
+        self,
+        maker: str,
+        pages: Iterable[int],
+        *,
+        output_name: Optional[str] = None,
+        output_directory: Optional[str] = None,
+        path: Optional[str] = None,
+        skip_urls: Iterable[str] = (),
+    ) -> Set[str]:
+        """Scrap adverts from selected listing pages of a manufacturer into a single output.
+        Progress is journaled under output_name, so an interrupted call resumes when repeated.
 
-        logger.info(f"End Scrapping maker: {maker}")
+        Args:
+            maker (str): Manufacturer name.
+            pages (Iterable[int]): Listing page numbers.
+            output_name (Optional[str]): Output file name without extension. Defaults to maker.
+            output_directory (Optional[str]): Output directory. Defaults to data_directory.
+            path (Optional[str]): Listing url, e.g. of a search slice. Defaults to all listings of the maker.
+            skip_urls (Iterable[str]): Adverts not to fetch, e.g. already written to outputs of other slices.
+
+        Returns:
+            Set[str]: Urls of adverts written to the output, along with skip_urls.
+
+        Raises:
+            requests.exceptions.RequestException: Error when obtaining listing page with the threaded engine.
+            aiohttp.ClientError: Error when obtaining listing page with the async engine.
+            asyncio.TimeoutError: Timeout of listing page request with the async engine.
+        """
+        path = path or f"{self.BASE_URL}/osobowe/{maker}"
+        output_name = output_name or maker
+        completed_pages = self.journal.completed_pages(output_name)
+        pages = [page for page in pages if page not in completed_pages]
+        if completed_pages:
+            logger.info(f"Resuming {output_name}: {len(completed_pages)} subpages already done")
+        self._listed_urls = self.journal.listed_urls(output_name)
+        self._written_urls = self.journal.written_urls(output_name) | set(skip_urls)
+        ad_fetcher = self._make_ad_fetcher(output_name, output_directory)
+        on_page_done = functools.partial(self._complete_page, output_name, ad_fetcher)
+        if self.engine == "async":
+            asyncio.run(self._scrap_pages_async(path, pages, output_name, ad_fetcher, on_page_done))
+        else:
+            AdvertPipeline(ad_fetcher, on_page_done=on_page_done).run(
+                pages, lambda page: self._get_cars_in_page(path, page, output_name)
+            )
+            logger.info(f"Transport stats: {self.transport.stats()}, concurrency: {self.controller.stats()}")
+        ad_fetcher.save_ads(output_name, keep_urls=self._listed_urls if self.seen_index else None)
+        # Collected before the journal drops entries of the finished output
+        written_urls = set(ad_fetcher.fetched_urls)
+        self.journal.mark_maker_done(output_name)
+        self._written_urls = set()
+        self.metrics_exporter.write_snapshot()
+        return written_urls
+
+    def _output_urls(self, directory: str, name: str) -> Set[str]:
+        """Urls of adverts in an output written by scrap_pages.
+
+        Args:
+            directory (str): Output directory.
+            name (str): Output file name without extension.
+
+        Returns:
+            Set[str]: Advert urls, empty if there is no such output.
+        """
+        path = os.path.join(directory, f"{name}.{SINKS[self.output_format].EXTENSION}")
+        if not os.path.exists(path):
+            return set()
+        return {url for batch in read_batches(path) for url in batch["Url"]}
+
+    async def _scrap_pages_async(self, path, pages, maker, ad_fetcher: AdvertisementFetcher, on_page_done) -> None:
+        """Scrap all listing pages of a maker and their adverts concurrently.
+        Listing pages and adverts share one transport and one limiter, so the number of requests in flight
+        follows the limit of the concurrency controller, never exceeding AdvertisementFetcher.MAX_CONCURRENT_REQUESTS.
+        """
+        from tqdm.asyncio import tqdm as async_tqdm  # pylint: disable=import-outside-toplevel
+
+        limiter = AsyncConcurrencyLimiter(ad_fetcher.controller)
+        async with ad_fetcher.make_async_transport() as transport:
+
+            async def scrap_page(page):
+                links = await self._get_cars_in_page_async(transport, limiter, path, page, maker)
+                await ad_fetcher.fetch_ads_async(links, transport, limiter)
+                on_page_done(page)
+
+            await async_tqdm.gather(*(scrap_page(page) for page in pages))
+        logger.info(f"Transport stats: {transport.stats()}, concurrency: {self.controller.stats()}")
+
+    def open_job(self, job_id: Optional[str] = None) -> None:
+        """Continues journaling under another scrape job, closing the current one's journal.
+
+        Args:
+            job_id (Optional[str]): Identifier of the job to start or resume. Defaults to a new job.
+        """
+        path = self.journal.path
+        self.journal.close()
+        self.journal = JobJournal(path, job_id)
 
     def scrap_all_makers(self):
-        """Scrap all models listed in resources/car_makes.txt file"""
+        """Scrap all models listed in resources/car_makes.txt file and finish the scrape job"""
         logger.info("Starting scrapping cars...")
         for maker in self.makers:
             self.scrap_maker(maker)
+        self.journal.finish()
         logger.info("End scrapping cars")
 
-    def combine_data(self, filename: str = "combined.csv") -> None:
+    def _maker_files(self, exclude: Iterable[str] = ()) -> List[str]:
+        extensions = tuple(f".{sink.EXTENSION}" for sink in SINKS.values())
+        return sorted(
+            os.path.join(self.data_directory, file)
+            for file in os.listdir(self.data_directory)
+            if file.endswith(extensions) and file not in exclude
+        )
+
+    def merge_shards(self, maker: str) -> str:
+        """Merges outputs of slices and page ranges of a manufacturer scraped in the current job into its output
+        file, dropping duplicated adverts, e.g. promoted ones listed on every page or ones whose price moved them
+        to another slice. Shards of other jobs are never merged.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            str: Path of the merged file.
+        """
+        shard_directory = os.path.join(self.shards_directory, maker)
+        extensions = tuple(f".{sink.EXTENSION}" for sink in SINKS.values())
+        shard_files = sorted(
+            os.path.join(shard_directory, name) for name in os.listdir(shard_directory) if name.endswith(extensions)
+        )
+        sink = make_sink(self.output_format, self.data_directory, maker, self.ad_fetcher.columns)
+        seen_urls = set()
+        for shard_file in shard_files:
+            for batch in read_batches(shard_file):
+                batch = batch[~batch["Url"].isin(seen_urls)].drop_duplicates(subset="Url")
+                seen_urls.update(batch["Url"])
+                sink.write_frame(batch)
+        sink.close()
+        logger.info(f"Merged {len(shard_files)} shards of {maker} into {sink.path}")
+        return sink.path
+
+    def combine_data(self, filename: str = COMBINED_FILENAME) -> None:
         """Combine scrapped data into single csv file.
+        Files are streamed in batches, so memory use does not depend on the amount of data.
 
         Args:
             filename (str, optional): Name for the file with combined data. Defaults to 'combined.csv'.
         """
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
         logger.info("Combining data...")
 
-        csv_files = [os.path.join(self.data_directory, file) for file in os.listdir(self.data_directory)]
-        combined_data = []
-        for csv_file in csv_files:
-            combined_data.append(pd.read_csv(csv_file))
-        df_all = pd.concat(combined_data, ignore_index=True)
         save_path = os.path.join(self.data_directory, filename)
-        df_all.to_csv(save_path, index=False)
+        temp_path = f"{save_path}.part"
+        with open(temp_path, "w", encoding="utf-8", newline="") as file:
+            pd.DataFrame(columns=self.ad_fetcher.columns).to_csv(file, index=False)
+            for maker_file in self._maker_files(exclude=[filename]):
+                for batch in read_batches(maker_file, self.COMBINE_BATCH_SIZE, raw=True):
+                    batch.reindex(columns=self.ad_fetcher.columns).to_csv(file, header=False, index=False)
+        os.replace(temp_path, save_path)
         logger.info(f"Combined data saved to {save_path}")
+
+    def write_dataset(self, dataset_directory: str = "dataset", scrape_date: Optional[datetime.date] = None) -> str:
+        """Write scrapped data into a Parquet dataset partitioned by maker and scrape date.
+        Files are streamed in batches, so memory use does not depend on the amount of data.
+        The dataset can be read with column and partition pruning, see modules.scrapers.dataset.read_dataset.
+
+        Args:
+            dataset_directory (str, optional): Dataset directory, next to data directory. Defaults to 'dataset'.
+            scrape_date (Optional[datetime.date], optional): Scrape date of the partitions.
+                Defaults to modification date of every maker file.
+
+        Returns:
+            str: Dataset directory path.
+        """
+        from modules.scrapers.dataset import DatasetWriter  # pylint: disable=import-outside-toplevel
+
+        root = os.path.join(os.path.dirname(self.data_directory), dataset_directory)
+        writer = DatasetWriter(root, self.ad_fetcher.columns)
+        for maker_file in self._maker_files(exclude=[self.COMBINED_FILENAME]):
+            maker = os.path.basename(maker_file).rsplit(".", 1)[0]
+            date = scrape_date or datetime.date.fromtimestamp(os.path.getmtime(maker_file))
+            writer.write(maker, read_batches(maker_file, self.COMBINE_BATCH_SIZE, raw=True), date)
+            logger.info(f"Written {maker} data to dataset partition {writer.partition_path(maker, date)}")
+        return root
@@ -0,0 +1,215 @@
+import asyncio
+import collections
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from loguru import logger
+from modules.scrapers.metrics import ScrapeMetrics
+
+# Statuses telling the site is overloaded or throttling us, responses without status (errors) count as well
+THROTTLE_STATUSES = frozenset({429, 503})
+
+
+class AimdController:
+    """
+    Limit of requests in flight adapted at runtime with additive increase / multiplicative decrease.
+    Every response which is neither throttled nor slow raises the limit by 1 / limit, i.e. by about one request
+    per round of responses. Until the first congestion signal the limit grows by one per response instead
+    (slow start), so it quickly reaches what the site tolerates.
+    A throttled response (THROTTLE_STATUSES or no response at all) or smoothed latency exceeding latency_tolerance
+    times the baseline (the lowest latency among recent responses) multiplies the limit by decrease_factor,
+    at most once per smoothed latency, so a burst of failures of requests sent together counts as one signal.
+    Args:
+        initial_limit: Limit before any response is observed
+        min_limit: Lowest limit
+        max_limit: Highest limit
+        decrease_factor: Factor the limit is multiplied by on congestion
+        latency_tolerance: Ratio of smoothed to baseline latency treated as congestion
+        metrics: Metrics the current limit is reported to as scraper_concurrency_limit gauge
+    """
+
+    INITIAL_LIMIT = 4
+    MIN_LIMIT = 1
+    MAX_LIMIT = 32
+    DECREASE_FACTOR = 0.7
+    LATENCY_TOLERANCE = 2.5
+    # Number of recent responses the baseline latency is taken from and weight of a response in smoothed latency
+    BASELINE_WINDOW = 200
+    SMOOTHING = 0.1
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        initial_limit: float = INITIAL_LIMIT,
+        *,
+        min_limit: int = MIN_LIMIT,
+        max_limit: int = MAX_LIMIT,
+        decrease_factor: float = DECREASE_FACTOR,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        metrics: Optional[ScrapeMetrics] = None,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.metrics = metrics
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._latencies = collections.deque(maxlen=self.BASELINE_WINDOW)
+        self._smoothed: Optional[float] = None
+        self._last_decrease = 0.0
+        self._slow_start = True
+        self._lock = threading.Lock()
+        self._report()
+
+    @property
+    def limit(self) -> int:
+        """Current limit of requests in flight."""
+        return int(self._limit)
+
+    def record(self, seconds: float, status: Optional[int]) -> None:
+        """Adapts the limit to a response.
+
+        Args:
+            seconds (float): Latency of the response.
+            status (Optional[int]): Response status or None when the request failed without response.
+        """
+        with self._lock:
+            previous = self.limit
+            throttled = status is None or status in THROTTLE_STATUSES
+            if not throttled:
+                self._latencies.append(seconds)
+                smoothed = seconds if self._smoothed is None else self._smoothed
+                self._smoothed = self.SMOOTHING * seconds + (1 - self.SMOOTHING) * smoothed
+            slow = self._smoothed is not None and self._smoothed > self.latency_tolerance * min(self._latencies)
+            now = time.monotonic()
+            if throttled or slow:
+                if now - self._last_decrease >= (self._smoothed or seconds):
+                    self._limit = max(self._limit * self.decrease_factor, self.min_limit)
+                    self._last_decrease = now
+                    self._slow_start = False
+            else:
+                self._limit = min(self._limit + (1 if self._slow_start else 1 / self._limit), self.max_limit)
+            changed = self.limit != previous
+        if changed:
+            logger.debug(f"Concurrency limit {previous} -> {self.limit} ({'throttled' if throttled else 'latency'})")
+            self._report()
+
+    def stats(self) -> Dict[str, float]:
+        """Current limit and latencies it is based on.
+
+        Returns:
+            Dict[str, float]: Limit, baseline and smoothed latency in seconds.
+        """
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "baseline_latency": min(self._latencies, default=0.0),
+                "smoothed_latency": self._smoothed or 0.0,
+            }
+
+    def _report(self) -> None:
+        if self.metrics is not None:
+            self.metrics.set("scraper_concurrency_limit", self.limit)
+
+
+class ConcurrencyLimiter:
+    """
+    Bounds number of threads inside the context manager by the current limit of a controller.
+    Args:
+        controller: Controller deciding the limit
+    """
+
+    def __init__(self, controller: AimdController):
+        self.controller = controller
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def __enter__(self) -> "ConcurrencyLimiter":
+        with self._condition:
+            while self.in_flight >= self.controller.limit:
+                self._condition.wait()
+            self.in_flight += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            # The limit could have grown meanwhile, so more than one waiting thread may proceed. Waking only those
+            # avoids a herd of threads competing for the GIL, which would inflate latencies the controller sees.
+            self._condition.notify(max(self.controller.limit - self.in_flight, 0))
+
+
+class AsyncConcurrencyLimiter:
+    """
+    Asyncio counterpart of ConcurrencyLimiter, a drop-in replacement of asyncio.Semaphore.
+    Must be created within the event loop it is used in.
+    Args:
+        controller: Controller deciding the limit
+    """
+
+    def __init__(self, controller: AimdController):
+        self.controller = controller
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> "AsyncConcurrencyLimiter":
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.controller.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify(max(self.controller.limit - self.in_flight, 0))
+
+
+class HostRateLimiter:
+    """
+    Ceiling of requests per second sent to every host. Requests are spaced evenly: each of them is scheduled
+    1 / max_rps seconds after the previous one to the same host.
+    Args:
+        max_rps: Maximum number of requests per second per host
+    """
+
+    def __init__(self, max_rps: float):
+        if max_rps <= 0:
+            raise ValueError(f"Requests per second ceiling must be positive, got {max_rps}")
+        self.interval = 1 / max_rps
+        self._next: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url: str) -> float:
+        """Reserves the next free slot of the url host.
+
+        Args:
+            url (str): Requested url.
+
+        Returns:
+            float: Number of seconds to wait before sending the request.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next.get(host, now), now)
+            self._next[host] = start + self.interval
+        return start - now
+
+    def wait(self, url: str) -> None:
+        """Blocks until a request to the url host may be sent.
+
+        Args:
+            url (str): Requested url.
+        """
+        if (delay := self.reserve(url)) > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, url: str) -> None:
+        """Waits until a request to the url host may be sent, without blocking the event loop.
+
+        Args:
+            url (str): Requested url.
+        """
+        if (delay := self.reserve(url)) > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,142 @@
+import datetime
+import os
+import shutil
+from typing import Any, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from utils.equipment import EQUIPMENT_COLUMN, MAIN_FEATURES
+from utils.normalization import NUMERIC_COLUMNS, parse_numbers
+
+PARTITIONING = ds.partitioning(pa.schema([("maker", pa.string()), ("scrape_date", pa.date32())]), flavor="hive")
+# Types of numeric features, parsed from values with units, e.g. "143 500 km". Other numeric features are doubles
+NUMERIC_TYPES = {"Rok produkcji": pa.int16()}
+
+
+def dataset_schema(columns: List[str]) -> pa.Schema:
+    """Typed schema of scraped adverts: numeric features (price, mileage, power, engine capacity, production year)
+    as numbers, other text features and equipment bitmask as strings, equipment flags as int8.
+
+    Args:
+        columns (List[str]): Column names, in order.
+
+    Returns:
+        pa.Schema: Arrow schema.
+    """
+    text_columns = (MAIN_FEATURES | {EQUIPMENT_COLUMN}) - set(NUMERIC_COLUMNS)
+    fields = []
+    for column in columns:
+        if column in NUMERIC_COLUMNS:
+            fields.append((column, NUMERIC_TYPES.get(column, pa.float64())))
+        else:
+            fields.append((column, pa.string() if column in text_columns else pa.int8()))
+    return pa.schema(fields)
+
+
+def to_table(frame: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    """Converts batch of scraped rows to an Arrow table with the given schema.
+    Numeric features are parsed with utils.normalization.parse_numbers, values which cannot be parsed
+    (or are not whole numbers in integer columns) are stored as nulls.
+
+    Args:
+        frame (pd.DataFrame): Scraped rows, as read from a sink output.
+        schema (pa.Schema): Target schema, see dataset_schema.
+
+    Returns:
+        pa.Table: Typed table.
+    """
+    frame = frame.reindex(columns=schema.names)
+    arrays = []
+    for field in schema:
+        if pa.types.is_string(field.type):
+            values = [None if pd.isna(value) else str(value) for value in frame[field.name]]
+            arrays.append(pa.array(values, type=field.type))
+        elif field.name in NUMERIC_COLUMNS:
+            values = parse_numbers(frame[field.name])
+            if pa.types.is_integer(field.type):
+                values = values.where(values % 1 == 0)
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+        else:
+            values = pd.to_numeric(frame[field.name], errors="coerce")
+            arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class DatasetWriter:
+    """
+    Writes scraped adverts into a Parquet dataset partitioned by maker and scrape date
+    (<root>/maker=<maker>/scrape_date=<YYYY-MM-DD>/part-0.parquet).
+    Rows are written batch by batch, one row group per batch, so memory use is bounded by the batch size.
+    Writing a partition again replaces it.
+    Args:
+        root: Dataset directory
+        columns: Column names, in order
+        compression: Parquet compression codec
+    """
+
+    COMPRESSION = "zstd"
+
+    def __init__(self, root: str, columns: List[str], compression: str = COMPRESSION):
+        self.root = root
+        self.schema = dataset_schema(columns)
+        self.compression = compression
+
+    def partition_path(self, maker: str, scrape_date: datetime.date) -> str:
+        """Directory of a partition.
+
+        Args:
+            maker (str): Manufacturer name.
+            scrape_date (datetime.date): Scrape date.
+
+        Returns:
+            str: Partition directory.
+        """
+        return os.path.join(self.root, f"maker={maker}", f"scrape_date={scrape_date.isoformat()}")
+
+    def write(self, maker: str, batches: Iterable[pd.DataFrame], scrape_date: datetime.date) -> Optional[str]:
+        """Writes batches of a maker into its partition.
+
+        Args:
+            maker (str): Manufacturer name.
+            batches (Iterable[pd.DataFrame]): Batches of scraped rows.
+            scrape_date (datetime.date): Scrape date.
+
+        Returns:
+            Optional[str]: Path of the written file or None if there were no rows.
+        """
+        partition_path = self.partition_path(maker, scrape_date)
+        temp_path = f"{partition_path}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+        file_path = os.path.join(temp_path, "part-0.parquet")
+        n_rows = 0
+        with pq.ParquetWriter(file_path, self.schema, compression=self.compression) as writer:
+            for batch in batches:
+                writer.write_table(to_table(batch, self.schema))
+                n_rows += len(batch)
+        shutil.rmtree(partition_path, ignore_errors=True)
+        if not n_rows:
+            shutil.rmtree(temp_path)
+            return None
+        os.replace(temp_path, partition_path)
+        return os.path.join(partition_path, "part-0.parquet")
+
+
+def read_dataset(
+    root: str, columns: Optional[List[str]] = None, filters: Optional[List[Tuple[str, str, Any]]] = None
+) -> pd.DataFrame:
+    """Reads selected columns and partitions of a dataset written by DatasetWriter.
+
+    Args:
+        root (str): Dataset directory.
+        columns (Optional[List[str]]): Columns to read, including partition columns maker and scrape_date.
+            Defaults to all columns.
+        filters (Optional[List[Tuple[str, str, Any]]]): Row filters in pyarrow format,
+            e.g. [("maker", "=", "opel")]. Filters on partition columns skip whole partitions.
+
+    Returns:
+        pd.DataFrame: Selected rows.
+    """
+    return pq.read_table(root, columns=columns, filters=filters, partitioning=PARTITIONING).to_pandas()
@@ -0,0 +1,208 @@
+import datetime
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional, Set
+
+
+class JobJournal:
+    """
+    Crash-resumable journal of a scrape job, stored in SQLite.
+    Records listing pages whose adverts have all been written, adverts already flushed to the maker output,
+    the output checkpoint matching them and makers which have been finished. A restarted job with the same
+    job_id skips finished makers and pages and continues appending to the interrupted output.
+    Jobs stay active until finish is called, entries of finished jobs are dropped only by drop_finished_jobs,
+    so processes sharing the journal never remove entries of a job which is still running.
+    Args:
+        path: Path to the SQLite database file
+        job_id: Identifier of the job to start or resume. Defaults to a new job named after the current time
+        resume: Whether to resume the most recently started job which has not been finished when job_id is not
+            given, so an interrupted crawl can be continued without knowing its id. A new job is started when
+            there is none
+    """
+
+    def __init__(self, path: str, job_id: Optional[str] = None, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (job_id TEXT PRIMARY KEY, started_at REAL, finished_at REAL);
+                CREATE TABLE IF NOT EXISTS makers (
+                    job_id TEXT, maker TEXT, sink_state INTEGER, completed_at REAL, PRIMARY KEY (job_id, maker)
+                );
+                CREATE TABLE IF NOT EXISTS pages (
+                    job_id TEXT, maker TEXT, page INTEGER, PRIMARY KEY (job_id, maker, page)
+                );
+                CREATE TABLE IF NOT EXISTS adverts (
+                    job_id TEXT, maker TEXT, url TEXT, PRIMARY KEY (job_id, maker, url)
+                );
+                CREATE TABLE IF NOT EXISTS listed (
+                    job_id TEXT, maker TEXT, url TEXT, PRIMARY KEY (job_id, maker, url)
+                );
+                """
+            )
+        self.job_id = self._start_job(job_id, resume)
+
+    def _start_job(self, job_id: Optional[str], resume: bool) -> str:
+        # Immediate transaction, so workers started together resume or create the same job
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            active = None
+            if job_id is None and resume:
+                active = self._connection.execute(
+                    "SELECT job_id FROM jobs WHERE finished_at IS NULL ORDER BY started_at DESC LIMIT 1"
+                ).fetchone()
+            if job_id is None:
+                # Microseconds keep jobs started in quick succession apart
+                job_id = active[0] if active else datetime.datetime.now().isoformat(timespec="microseconds")
+            self._connection.execute("INSERT OR IGNORE INTO jobs VALUES (?, ?, NULL)", (job_id, time.time()))
+        except sqlite3.Error:
+            self._connection.rollback()
+            raise
+        self._connection.commit()
+        return job_id
+
+    def _column(self, query: str, maker: str) -> Set:
+        with self._lock:
+            return {row[0] for row in self._connection.execute(query, (self.job_id, maker))}
+
+    def is_maker_done(self, maker: str) -> bool:
+        """Checks whether maker has been finished in this job.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            bool: True if the maker output has been saved.
+        """
+        return bool(
+            self._column("SELECT 1 FROM makers WHERE job_id = ? AND maker = ? AND completed_at IS NOT NULL", maker)
+        )
+
+    def sink_state(self, maker: str) -> Optional[int]:
+        """Output checkpoint of the last journaled flush.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            Optional[int]: Checkpoint or None if nothing has been written yet.
+        """
+        states = self._column("SELECT sink_state FROM makers WHERE job_id = ? AND maker = ?", maker)
+        return next(iter(states), None)
+
+    def completed_pages(self, maker: str) -> Set[int]:
+        """Listing pages whose adverts have all been written.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            Set[int]: Page numbers.
+        """
+        return self._column("SELECT page FROM pages WHERE job_id = ? AND maker = ?", maker)
+
+    def written_urls(self, maker: str) -> Set[str]:
+        """Adverts already flushed to the maker output.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            Set[str]: Advert urls.
+        """
+        return self._column("SELECT url FROM adverts WHERE job_id = ? AND maker = ?", maker)
+
+    def listed_urls(self, maker: str) -> Set[str]:
+        """Adverts seen on listing pages of the maker.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            Set[str]: Advert urls.
+        """
+        return self._column("SELECT url FROM listed WHERE job_id = ? AND maker = ?", maker)
+
+    def record_listed(self, maker: str, urls: Iterable[str]) -> None:
+        """Records adverts seen on a listing page.
+
+        Args:
+            maker (str): Manufacturer name.
+            urls (Iterable[str]): Advert urls.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO listed VALUES (?, ?, ?)", [(self.job_id, maker, url) for url in urls]
+            )
+
+    def record_flush(self, maker: str, urls: Iterable[str], sink_state: int) -> None:
+        """Records adverts flushed to the maker output together with the output checkpoint, atomically.
+
+        Args:
+            maker (str): Manufacturer name.
+            urls (Iterable[str]): Flushed advert urls.
+            sink_state (int): Output checkpoint after the flush.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO adverts VALUES (?, ?, ?)", [(self.job_id, maker, url) for url in urls]
+            )
+            self._connection.execute(
+                """INSERT INTO makers (job_id, maker, sink_state) VALUES (?, ?, ?)
+                ON CONFLICT (job_id, maker) DO UPDATE SET sink_state = excluded.sink_state""",
+                (self.job_id, maker, sink_state),
+            )
+
+    def mark_page_done(self, maker: str, page: int) -> None:
+        """Records listing page whose adverts have all been written.
+
+        Args:
+            maker (str): Manufacturer name.
+            page (int): Page number.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR IGNORE INTO pages VALUES (?, ?, ?)", (self.job_id, maker, page))
+
+    def mark_maker_done(self, maker: str) -> None:
+        """Records finished maker and drops its page and advert entries.
+
+        Args:
+            maker (str): Manufacturer name.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                """INSERT INTO makers (job_id, maker, completed_at) VALUES (?, ?, ?)
+                ON CONFLICT (job_id, maker) DO UPDATE SET completed_at = excluded.completed_at""",
+                (self.job_id, maker, time.time()),
+            )
+            for table in ("pages", "adverts", "listed"):
+                self._connection.execute(f"DELETE FROM {table} WHERE job_id = ? AND maker = ?", (self.job_id, maker))
+
+    def finish(self) -> None:
+        """Records finished job. Journals opened afterwards with resume do not resume it."""
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE jobs SET finished_at = ? WHERE job_id = ?", (time.time(), self.job_id))
+
+    def drop_finished_jobs(self) -> int:
+        """Drops entries of finished jobs other than this one. Entries of jobs still running are kept.
+
+        Returns:
+            int: Number of dropped jobs.
+        """
+        with self._lock, self._connection:
+            finished = [
+                row[0]
+                for row in self._connection.execute(
+                    "SELECT job_id FROM jobs WHERE finished_at IS NOT NULL AND job_id != ?", (self.job_id,)
+                )
+            ]
+            for table in ("makers", "pages", "adverts", "listed", "jobs"):
+                self._connection.executemany(f"DELETE FROM {table} WHERE job_id = ?", [(job,) for job in finished])
+        return len(finished)
+
+    def close(self) -> None:
+        """Closes database connection."""
+        self._connection.close()
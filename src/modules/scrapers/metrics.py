@@ -0,0 +1,339 @@
+import bisect
+import contextlib
+import http.server
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+# Upper bounds of histogram buckets in seconds, cover both sub-millisecond extractors and slow requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def status_class(status: Optional[int]) -> str:
+    """Class of an HTTP status, e.g. "2xx".
+
+    Args:
+        status (Optional[int]): Response status or None when there was no response.
+
+    Returns:
+        str: Status class or "error" when there was no response.
+    """
+    return f"{status // 100}xx" if status is not None else "error"
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, as in Prometheus.
+    Args:
+        buckets: Sorted upper bounds of buckets
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Records value.
+
+        Args:
+            value (float): Observed value.
+        """
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket containing a quantile.
+
+        Args:
+            q (float): Quantile in range [0, 1].
+
+        Returns:
+            float: Bucket bound, 0.0 when nothing was observed and inf above the last bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def as_dict(self) -> dict:
+        """Snapshot of the histogram.
+
+        Returns:
+            dict: Count, sum, mean, p50/p99 bucket bounds and cumulative bucket counts.
+        """
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in labels] + ([extra] if extra else [])
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class ScrapeMetrics:
+    """
+    Thread-safe registry of labelled counters, gauges and histograms describing a crawl. Metrics used by the scraper:
+    - scraper_fetches_total{kind, status_class}: listing and advert fetches by outcome
+    - scraper_fetch_seconds{kind}: latency of fetches, retries included
+    - scraper_bytes_downloaded_total{kind}: size of downloaded pages
+    - scraper_http_responses_total{status_class}: responses of every attempt, including retried ones
+    - scraper_parse_seconds{parser, extractor}: time spent in every extractor of an advert or listing parser
+    - scraper_adverts_total{outcome}: fetched adverts which were saved or skipped, e.g. for missing price
+    - scraper_rows_written_total{output}: rows flushed to output files
+    - scraper_concurrency_limit: current limit of requests in flight, see modules.scrapers.concurrency
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increments counter.
+
+        Args:
+            name (str): Counter name.
+            value (float): Increment. Defaults to 1.
+            **labels (str): Labels of the counter.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            counter = self._counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Sets gauge.
+
+        Args:
+            name (str): Gauge name.
+            value (float): Current value.
+            **labels (str): Labels of the gauge.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Records value in a histogram.
+
+        Args:
+            name (str): Histogram name.
+            value (float): Observed value, in seconds for durations.
+            **labels (str): Labels of the histogram.
+        """
+        key = _label_key(labels)
+        with self._lock:
+            histograms = self._histograms.setdefault(name, {})
+            if key not in histograms:
+                histograms[key] = Histogram()
+            histograms[key].observe(value)
+
+    @contextlib.contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Context manager recording its duration in a histogram.
+
+        Args:
+            name (str): Histogram name.
+            **labels (str): Labels of the histogram.
+
+        Yields:
+            None: Nothing, the body is timed.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def record_fetch(self, kind: str, seconds: float, status: Optional[int], n_bytes: int = 0) -> None:
+        """Records outcome, latency and size of a page fetch.
+
+        Args:
+            kind (str): Kind of the page, "listing" or "advert".
+            seconds (float): Time the fetch took, retries included.
+            status (Optional[int]): Status of the final response or None when there was no response.
+            n_bytes (int): Size of the downloaded page.
+        """
+        self.inc("scraper_fetches_total", kind=kind, status_class=status_class(status))
+        self.observe("scraper_fetch_seconds", seconds, kind=kind)
+        if n_bytes:
+            self.inc("scraper_bytes_downloaded_total", n_bytes, kind=kind)
+
+    def snapshot(self) -> dict:
+        """Snapshot of all metrics.
+
+        Returns:
+            dict: Time of the snapshot, uptime in seconds and values of counters, gauges and histograms by name,
+                as lists of {"labels": ..., "value": ...} entries.
+        """
+        with self._lock:
+            counters, gauges = (
+                {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in metrics.items()
+                }
+                for metrics in (self._counters, self._gauges)
+            )
+            histograms = {
+                name: [{"labels": dict(key), "value": histogram.as_dict()} for key, histogram in series.items()]
+                for name, series in self._histograms.items()
+            }
+        now = time.time()
+        return {
+            "time": now,
+            "uptime": now - self.started,
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": histograms,
+        }
+
+    def to_prometheus(self) -> str:
+        """All metrics in Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text.
+        """
+        lines = []
+        with self._lock:
+            for metric_type, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    lines.extend(f"{name}{_format_labels(key)} {value}" for key, value in series.items())
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        bucket = "+Inf" if bound == float("inf") else repr(bound)
+                        bucket_label = f'le="{bucket}"'
+                        lines.append(f"{name}_bucket{_format_labels(key, bucket_label)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """
+    Exposes metrics of a crawl while it runs: writes a JSON snapshot to a file every interval seconds
+    and optionally serves them over HTTP, in Prometheus format under /metrics and as JSON under /metrics.json.
+    Args:
+        metrics: Exported metrics
+        snapshot_path: Path of the JSON snapshot. No snapshots are written when not given
+        interval: Seconds between snapshots
+        port: Port of the HTTP endpoint, 0 picks a free one. No endpoint is served when not given
+        host: Interface of the HTTP endpoint
+    """
+
+    INTERVAL = 30.0
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        metrics: ScrapeMetrics,
+        snapshot_path: Optional[str] = None,
+        interval: float = INTERVAL,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+    ):
+        self.metrics = metrics
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.port = port
+        self.host = host
+        self._stopped = threading.Event()
+        self._server: Optional[http.server.ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> Optional[str]:
+        """Url of the metrics endpoint, None when it is not served."""
+        return f"http://{self.host}:{self._server.server_port}/metrics" if self._server is not None else None
+
+    def start(self) -> "MetricsExporter":
+        """Starts writing snapshots and serving the endpoint in background threads.
+
+        Returns:
+            MetricsExporter: The exporter itself.
+        """
+        if self.snapshot_path is not None:
+            threading.Thread(target=self._write_periodically, daemon=True).start()
+        if self.port is not None:
+            self._server = http.server.ThreadingHTTPServer((self.host, self.port), self._make_handler())
+            self._server.daemon_threads = True
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        """Stops background threads, writing a last snapshot."""
+        self._stopped.set()
+        self.write_snapshot()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def write_snapshot(self) -> None:
+        """Writes current JSON snapshot, atomically replacing the previous one."""
+        if self.snapshot_path is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_path)), exist_ok=True)
+        with open(f"{self.snapshot_path}.part", "w", encoding="utf-8") as snapshot_file:
+            json.dump(self.metrics.snapshot(), snapshot_file, indent=2)
+        os.replace(f"{self.snapshot_path}.part", self.snapshot_path)
+
+    def _write_periodically(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.write_snapshot()
+
+    def _make_handler(self):
+        metrics = self.metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            """Request handler of the metrics endpoint."""
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """Serves metrics."""
+                if self.path == "/metrics":
+                    body, content_type = metrics.to_prometheus(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                encoded = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+        return Handler
@@ -0,0 +1,433 @@
+import abc
+import contextlib
+import hashlib
+import json
+import re
+from typing import Any, ContextManager, Dict, List, NamedTuple, Optional, Union
+
+from loguru import logger
+from modules.scrapers.metrics import ScrapeMetrics
+
+
+class AdvertParser(abc.ABC):
+    """
+    Base class of advert parser backends.
+    Backends extract main features, extended (equipment) features, price and currency of an advert
+    and return them as a single dict. When metrics are set, time spent in every extractor is recorded
+    in scraper_parse_seconds.
+    """
+
+    NAME = ""
+    metrics: Optional[ScrapeMetrics] = None
+
+    def _timed(self, extractor: str) -> ContextManager:
+        if self.metrics is None:
+            return contextlib.nullcontext()
+        return self.metrics.time("scraper_parse_seconds", parser=self.NAME, extractor=extractor)
+
+    @abc.abstractmethod
+    def parse(self, path: str, html: str) -> Dict[str, str]:
+        """Extracts advert features from html.
+
+        Args:
+            path (str): Advert url, used for logging.
+            html (str): Advert page html.
+
+        Returns:
+            Dict[str, str]: Advert features.
+        """
+
+
+class SoupAdvertParser(AdvertParser):
+    """
+    Reference BeautifulSoup backend. Every extractor walks the parsed tree separately.
+    Args:
+        features: BeautifulSoup tree builder. Defaults to the best one available
+    """
+
+    NAME = "bs4"
+
+    def __init__(self, features: Optional[str] = None):
+        self.features = features
+
+    def parse(self, path: str, html: str) -> Dict[str, str]:
+        """Extracts advert features from html.
+
+        Args:
+            path (str): Advert url, used for logging.
+            html (str): Advert page html.
+
+        Returns:
+            Dict[str, str]: Advert features.
+        """
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
+        with self._timed("document"):
+            soup = BeautifulSoup(html, self.features)
+            if style_tags := soup.find_all("style"):
+                for style_tag in style_tags:
+                    style_tag.decompose()
+
+        with self._timed("main_features"):
+            features = self._get_main_features(soup)
+        with self._timed("extended_features"):
+            extendend_features = self._get_extended_features(path, soup)
+        features.update(extendend_features)
+        with self._timed("price"):
+            price_feat = self._get_price(soup)
+        features.update(price_feat)
+        with self._timed("currency"):
+            currency_feat = self._get_currency(soup)
+        features.update(currency_feat)
+        return features
+
+    def _get_main_features(self, soup) -> Dict[str, str]:
+        features = {}
+        if main_params := soup.find("div", {"data-testid": "content-details-section"}):
+            if advert_details := main_params.find_all("div", attrs={"data-testid": "advert-details-item"}):
+                for param in advert_details:
+                    el = [x.text for x in param]
+                    features.update({el[0]: el[1]})
+
+        else:
+            if main_params := soup.find_all(class_="offer-params__item"):
+                features = {
+                    param.find("span", class_="offer-params__label")
+                    .text.strip(): param.find("div", class_="offer-params__value")
+                    .text.strip()
+                    for param in main_params
+                }
+
+        return features
+
+    def _get_extended_features(self, path, soup) -> Dict[str, str]:
+        features = {}
+
+        try:
+            extendend_params = soup.find_all("div", attrs={"data-testid": "accordion-collapse-inner-content"})
+            for param in extendend_params:
+                for x in param.find_all("p"):
+                    features[x.text.strip()] = 1
+        except (IndexError, AttributeError) as e:
+            logger.info(
+                f"""Error while fetching extended features using accordion-collapse-inner-content: {e}.
+                Processing with parameter-feature-item"""
+            )
+            try:
+                extendend_params = soup.find_all("li", class_="parameter-feature-item")
+                for param in extendend_params:
+                    features[param.text.strip()] = 1
+            except (IndexError, AttributeError) as ee:
+                logger.info(f"Error {ee} while fetching extended features from {path}")
+        return features
+
+    def _get_price(self, soup) -> Dict[str, str]:
+        features = {}
+        try:
+            price = "".join(soup.select('h3[class^="offer-price__number"]')[0].text.strip().split())
+            features["Cena"] = price
+        except (IndexError, AttributeError) as e:
+            logger.info(
+                f"""Error while fetching price feature from h3 offer-price__number: {e}.
+            Processing with span offer-price__number"""
+            )
+            try:
+                price = "".join(soup.find("span", class_="offer-price__number").text.strip().split()[:-1])
+                features["Cena"] = price
+            except (IndexError, AttributeError) as ee:
+                logger.info(f"Error {ee} while fetching price feature.")
+                features["Cena"] = None
+        return features
+
+    def _get_currency(self, soup) -> Dict[str, str]:
+        features = {}
+
+        try:
+            currency = "".join(soup.select('p[class^="offer-price__currency"]')[0].text.strip().split())
+            features["Waluta"] = currency
+        except (IndexError, AttributeError) as e:
+            logger.info(
+                f"""Error while fetching currency feature from p offer-price__currency: {e}.
+            Processing with span offer-price__currency"""
+            )
+            try:
+                currency = soup.find("span", class_="offer-price__currency").text.strip()
+                features["Waluta"] = currency
+            except (IndexError, AttributeError) as ee:
+                logger.info(f"Error {ee} while fetching currency feature.")
+                features["Waluta"] = None
+        return features
+
+
+def _has_class(element, class_name: str) -> bool:
+    return class_name in element.get("class", "").split()
+
+
+def _text(element) -> str:
+    return element.text_content()
+
+
+class LxmlAdvertParser(AdvertParser):
+    """
+    Fast lxml backend. Visits the document once, remembering elements the BeautifulSoup extractors look for,
+    and emits the same dict as SoupAdvertParser.
+    """
+
+    NAME = "lxml"
+
+    def parse(self, path: str, html: str) -> Dict[str, str]:
+        """Extracts advert features from html.
+
+        Args:
+            path (str): Advert url, used for logging.
+            html (str): Advert page html.
+
+        Returns:
+            Dict[str, str]: Advert features.
+        """
+        # Imported on first use, so only crawls with the lxml backend load it
+        from lxml import etree, html as lxml_html  # pylint: disable=import-outside-toplevel
+
+        with self._timed("document"):
+            try:
+                root = lxml_html.document_fromstring(html)
+            except (etree.ParserError, ValueError) as e:
+                logger.info(f"Error {e} while parsing {path}")
+                return {"Cena": None, "Waluta": None}
+            etree.strip_elements(root, "style", with_tail=False)
+
+        with self._timed("scan"):
+            elements = self._scan(root)
+        details_section, offer_params, accordions, price_h3, price_span, currency_p, currency_span = elements
+
+        with self._timed("main_features"):
+            features = self._main_features(details_section, offer_params)
+        with self._timed("extended_features"):
+            for accordion in accordions:
+                for x in accordion.iter("p"):
+                    features[_text(x).strip()] = 1
+
+        with self._timed("price"):
+            if price_h3 is not None:
+                features["Cena"] = "".join(_text(price_h3).strip().split())
+            elif price_span is not None:
+                features["Cena"] = "".join(_text(price_span).strip().split()[:-1])
+            else:
+                features["Cena"] = None
+
+        with self._timed("currency"):
+            if currency_p is not None:
+                features["Waluta"] = "".join(_text(currency_p).strip().split())
+            elif currency_span is not None:
+                features["Waluta"] = _text(currency_span).strip()
+            else:
+                features["Waluta"] = None
+        return features
+
+    @staticmethod
+    def _scan(root) -> tuple:
+        """Single visit of the document remembering elements the extractors need."""
+        from lxml import etree  # pylint: disable=import-outside-toplevel
+
+        details_section = None
+        offer_params: List = []
+        accordions: List = []
+        price_h3 = price_span = currency_p = currency_span = None
+        for element in root.iter(etree.Element):
+            tag = element.tag
+            if tag == "div":
+                test_id = element.get("data-testid")
+                if test_id == "content-details-section" and details_section is None:
+                    details_section = element
+                elif test_id == "accordion-collapse-inner-content":
+                    accordions.append(element)
+            elif tag == "h3" and price_h3 is None and element.get("class", "").startswith("offer-price__number"):
+                price_h3 = element
+            elif tag == "p" and currency_p is None and element.get("class", "").startswith("offer-price__currency"):
+                currency_p = element
+            elif tag == "span":
+                if price_span is None and _has_class(element, "offer-price__number"):
+                    price_span = element
+                elif currency_span is None and _has_class(element, "offer-price__currency"):
+                    currency_span = element
+            if _has_class(element, "offer-params__item"):
+                offer_params.append(element)
+        return details_section, offer_params, accordions, price_h3, price_span, currency_p, currency_span
+
+    @staticmethod
+    def _main_features(details_section, offer_params) -> Dict[str, str]:
+        features = {}
+        if details_section is not None:
+            for param in details_section.iter("div"):
+                if param.get("data-testid") != "advert-details-item":
+                    continue
+                # Mirrors iterating over BeautifulSoup contents: leading text, then every child with its tail
+                el = [param.text] if param.text is not None else []
+                for child in param:
+                    if isinstance(child.tag, str):
+                        el.append(_text(child))
+                    if child.tail is not None:
+                        el.append(child.tail)
+                features.update({el[0]: el[1]})
+        else:
+            for param in offer_params:
+                label = next(x for x in param.iter("span") if _has_class(x, "offer-params__label"))
+                value = next(x for x in param.iter("div") if _has_class(x, "offer-params__value"))
+                features[_text(label).strip()] = _text(value).strip()
+        return features
+
+
+class ListingCard(NamedTuple):
+    """Advert as seen on a listing page: its url and a fingerprint of the card content (price, date, ...)."""
+
+    url: str
+    fingerprint: str
+
+
+def fingerprint(content: str) -> str:
+    """Hashes listing card content.
+
+    Args:
+        content (str): Card content, e.g. its text or serialized price and date.
+
+    Returns:
+        str: Hex digest of the content.
+    """
+    return hashlib.sha1(" ".join(content.split()).encode("utf-8")).hexdigest()
+
+
+LISTING_CARD_KEYS = ("price", "createdAt", "updatedAt")
+NEXT_DATA_PATTERN = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL)
+
+
+def extract_next_data(html: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+    """Reads structured page data embedded by Next.js in the __NEXT_DATA__ script tag, without parsing the html.
+
+    Args:
+        html (Union[str, bytes]): Page html.
+
+    Returns:
+        Optional[Dict[str, Any]]: Decoded page data or None if the page does not embed it.
+    """
+    if isinstance(html, bytes):
+        html = html.decode("utf-8", errors="replace")
+    if not (match := NEXT_DATA_PATTERN.search(html)):
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+def _find_key(data: Any, key: str) -> Any:
+    """Depth-first search for the first value stored under key in nested dicts and lists."""
+    stack = [data]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if key in node:
+                return node[key]
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+    return None
+
+
+def parse_listing_cards(content: Union[str, bytes]) -> Optional[List[ListingCard]]:
+    """Reads advert cards of a listing page from its embedded search results.
+
+    Args:
+        content (Union[str, bytes]): Listing page html.
+
+    Returns:
+        Optional[List[ListingCard]]: Advert cards or None if the page does not embed search results.
+    """
+    if not isinstance(urql_state := _find_key(extract_next_data(content), "urqlState"), dict):
+        return None
+    for entry in urql_state.values():
+        try:
+            search = _find_key(json.loads(entry["data"]), "advertSearch")
+        except (KeyError, TypeError, ValueError):
+            continue
+        if isinstance(search, dict):
+            nodes = [edge.get("node") or {} for edge in search.get("edges", [])]
+            return [
+                ListingCard(
+                    node["url"],
+                    fingerprint(json.dumps([node.get(key) for key in LISTING_CARD_KEYS], sort_keys=True)),
+                )
+                for node in nodes
+                if node.get("url")
+            ]
+    return None
+
+
+class NextDataAdvertParser(AdvertParser):
+    """
+    JSON-first backend. Reads only the __NEXT_DATA__ script of an advert page and maps its details, equipment
+    and price onto the same labels the DOM shows. Falls back to a DOM backend when the blob is missing.
+    Args:
+        fallback: Backend used for pages without embedded advert data. Defaults to LxmlAdvertParser
+    """
+
+    NAME = "json"
+
+    def __init__(self, fallback: Optional[AdvertParser] = None):
+        self.fallback = fallback or LxmlAdvertParser()
+
+    def parse(self, path: str, html: str) -> Dict[str, str]:
+        """Extracts advert features from html.
+
+        Args:
+            path (str): Advert url, used for logging.
+            html (str): Advert page html.
+
+        Returns:
+            Dict[str, str]: Advert features.
+        """
+        with self._timed("document"):
+            advert = _find_key(extract_next_data(html), "advert")
+        if not isinstance(advert, dict) or not advert.get("details"):
+            logger.debug(f"No embedded advert data in {path}. Falling back to DOM parser")
+            return self.fallback.parse(path, html)
+
+        features = {}
+        with self._timed("main_features"):
+            for detail in advert["details"]:
+                if detail.get("label") is not None and detail.get("value") is not None:
+                    features[detail["label"]] = str(detail["value"])
+        with self._timed("extended_features"):
+            for group in advert.get("equipment") or []:
+                for item in group.get("values") or []:
+                    features[item["label"].strip()] = 1
+
+        with self._timed("price"):
+            price = advert.get("price") or {}
+            features["Cena"] = "".join(str(price["value"]).split()) if price.get("value") is not None else None
+            features["Waluta"] = price.get("currency")
+        return features
+
+
+PARSERS = {"bs4": SoupAdvertParser, "lxml": LxmlAdvertParser, "json": NextDataAdvertParser}
+
+
+def get_parser(name: str, metrics: Optional[ScrapeMetrics] = None) -> AdvertParser:
+    """Creates advert parser backend.
+
+    Args:
+        name (str): Backend name, one of PARSERS.
+        metrics (Optional[ScrapeMetrics]): Metrics recording time spent in extractors of the backend.
+
+    Returns:
+        AdvertParser: Parser instance.
+
+    Raises:
+        ValueError: Error when backend name is unknown.
+    """
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser {name}. Expected one of: {', '.join(PARSERS)}")
+    parser = PARSERS[name]()
+    parser.metrics = metrics
+    if isinstance(parser, NextDataAdvertParser):
+        parser.fallback.metrics = metrics
+    return parser
@@ -0,0 +1,162 @@
+import collections
+import datetime
+import os
+from typing import Callable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+from loguru import logger
+
+# Query parameters of listing filters, bounds are inclusive
+YEAR_FROM_PARAM = "search[filter_float_year:from]"
+YEAR_TO_PARAM = "search[filter_float_year:to]"
+PRICE_FROM_PARAM = "search[filter_float_price:from]"
+PRICE_TO_PARAM = "search[filter_float_price:to]"
+
+
+class SearchSlice(NamedTuple):
+    """Listings of a maker narrowed down by model, production year and price. None bounds are open."""
+
+    maker: str
+    model: Optional[str] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    price_from: Optional[int] = None
+    price_to: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        """Unique name of the slice, used as output name. Name of a slice without filters is the maker."""
+        parts = [self.maker]
+        if self.model is not None:
+            parts.append(self.model)
+        if self.year_from is not None or self.year_to is not None:
+            parts.append(f"y{self.year_from or ''}-{self.year_to or ''}")
+        if self.price_from is not None or self.price_to is not None:
+            parts.append(f"p{self.price_from or ''}-{self.price_to or ''}")
+        return "__".join(parts)
+
+    def url(self, base_url: str) -> str:
+        """Url of the first listing page of the slice.
+
+        Args:
+            base_url (str): Url of the site, e.g. CarScraper.BASE_URL.
+
+        Returns:
+            str: Listing url, with filters in its query.
+        """
+        path = f"{base_url}/osobowe/{self.maker}" + (f"/{self.model}" if self.model is not None else "")
+        params = [
+            (param, value)
+            for param, value in (
+                (YEAR_FROM_PARAM, self.year_from),
+                (YEAR_TO_PARAM, self.year_to),
+                (PRICE_FROM_PARAM, self.price_from),
+                (PRICE_TO_PARAM, self.price_to),
+            )
+            if value is not None
+        ]
+        return f"{path}?{urlencode(params, safe='[]:')}" if params else path
+
+
+class SearchPartitioner:
+    """
+    Splits listings of a maker into slices small enough for the site to paginate through all of them.
+    The site shows at most max_pages listing pages of a query, so a slice with that many pages is split further:
+    into models of the maker (from src/resources/car_models/<maker>.txt), then into halves of production years
+    and finally into price bands and their halves. Adverts of models missing from the models file are not covered
+    by model slices. A slice which can not be split any further is kept, with its adverts beyond max_pages lost.
+    Args:
+        count_pages: Function returning number of listing pages of a slice
+        models_directory: Directory with models of every maker, see CarScraper._scrape_makes_models
+        max_pages: Number of listing pages the site shows at most
+        min_year: Lower bound of production years used for splitting, older cars fall into the first slice
+    """
+
+    MAX_PAGES = 500
+    MIN_YEAR = 1950
+    # Upper bounds of price bands a slice is split into first, in PLN
+    PRICE_BANDS = (10000, 20000, 30000, 40000, 50000, 60000, 80000, 100000, 150000, 200000, 300000, 500000)
+
+    def __init__(
+        self,
+        count_pages: Callable[[SearchSlice], int],
+        models_directory: str = os.path.join("src", "resources", "car_models"),
+        max_pages: int = MAX_PAGES,
+        min_year: int = MIN_YEAR,
+    ):
+        self.count_pages = count_pages
+        self.models_directory = models_directory
+        self.max_pages = max_pages
+        self.min_year = min_year
+
+    def models(self, maker: str) -> List[str]:
+        """Models of a maker.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            List[str]: Model names, empty when the maker has no models file.
+        """
+        path = os.path.join(self.models_directory, f"{maker}.txt")
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as models_file:
+            return [line.strip() for line in models_file if line.strip()]
+
+    def split(self, search: SearchSlice) -> List[SearchSlice]:
+        """Disjoint slices covering a slice.
+
+        Args:
+            search (SearchSlice): Slice to split.
+
+        Returns:
+            List[SearchSlice]: Narrower slices, empty when the slice can not be split any further.
+        """
+        if search.model is None and (models := self.models(search.maker)):
+            return [search._replace(model=model) for model in models]
+
+        year_from = search.year_from if search.year_from is not None else self.min_year
+        year_to = search.year_to if search.year_to is not None else datetime.date.today().year
+        if year_from < year_to:
+            middle = (year_from + year_to) // 2
+            return [search._replace(year_to=middle), search._replace(year_from=middle + 1)]
+
+        if search.price_from is None and search.price_to is None:
+            bounds = [None, *self.PRICE_BANDS, None]
+            return [
+                search._replace(price_from=low, price_to=high - 1 if high else None)
+                for low, high in zip(bounds[:-1], bounds[1:])
+            ]
+        price_from = search.price_from or 0
+        if search.price_to is None:
+            return [search._replace(price_to=2 * price_from - 1), search._replace(price_from=2 * price_from)]
+        if price_from < search.price_to:
+            middle = (price_from + search.price_to) // 2
+            return [search._replace(price_to=middle), search._replace(price_from=middle + 1)]
+        return []
+
+    def partition(self, maker: str) -> List[Tuple[SearchSlice, int]]:
+        """Slices covering all listings of a maker, each with fewer than max_pages listing pages when possible.
+
+        Args:
+            maker (str): Manufacturer name.
+
+        Returns:
+            List[Tuple[SearchSlice, int]]: Slices with their number of listing pages, capped at max_pages.
+                A single slice without filters when the maker fits under the cap.
+        """
+        pending = collections.deque([SearchSlice(maker)])
+        slices = []
+        while pending:
+            search = pending.popleft()
+            pages = self.count_pages(search)
+            if pages < self.max_pages:
+                slices.append((search, pages))
+            elif children := self.split(search):
+                logger.info(f"{search.name} has {pages} listing pages, splitting into {len(children)} slices")
+                pending.extend(children)
+            else:
+                logger.warning(f"{search.name} can not be split below {self.max_pages} listing pages")
+                slices.append((search, self.max_pages))
+        return slices
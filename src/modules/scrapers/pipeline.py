@@ -0,0 +1,145 @@
+import math
+import threading
+import time
+from queue import Queue
+from typing import Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+from modules.scrapers.adv_scraper import AdvertisementFetcher
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of a list of values.
+
+    Args:
+        values (List[float]): Values to compute percentile of.
+        q (float): Percentile in range [0, 100].
+
+    Returns:
+        float: Percentile value, 0.0 for empty input.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(q / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class PageLatencyTracker:
+    """
+    Tracks advert fetch latencies per listing page and logs a tail-latency report once every advert
+    from the page has been processed.
+    Args:
+        on_page_done: Called with page number once every advert from the page has been processed
+    """
+
+    def __init__(self, on_page_done: Optional[Callable[[int], None]] = None):
+        self.on_page_done = on_page_done
+        self._lock = threading.Lock()
+        self._pending: Dict[int, int] = {}
+        self._latencies: Dict[int, List[float]] = {}
+        self._started: Dict[int, float] = {}
+
+    def open_page(self, page: int, n_links: int) -> None:
+        """Registers listing page with number of adverts to be fetched from it.
+
+        Args:
+            page (int): Page number.
+            n_links (int): Number of advert links found on the page.
+        """
+        with self._lock:
+            self._pending[page] = n_links
+            self._latencies[page] = []
+            self._started[page] = time.perf_counter()
+        if n_links == 0:
+            self._report(page)
+
+    def record(self, page: int, seconds: float) -> None:
+        """Records latency of single advert fetch.
+
+        Args:
+            page (int): Page the advert was listed on.
+            seconds (float): Time it took to fetch and parse the advert.
+        """
+        with self._lock:
+            self._latencies[page].append(seconds)
+            self._pending[page] -= 1
+            done = self._pending[page] == 0
+        if done:
+            self._report(page)
+
+    def _report(self, page: int) -> None:
+        with self._lock:
+            latencies = self._latencies.pop(page)
+            wall_time = time.perf_counter() - self._started.pop(page)
+            del self._pending[page]
+        logger.info(
+            f"Page {page}: {len(latencies)} adverts in {wall_time:.2f}s | "
+            f"p50 {percentile(latencies, 50):.2f}s p90 {percentile(latencies, 90):.2f}s "
+            f"p99 {percentile(latencies, 99):.2f}s max {max(latencies, default=0.0):.2f}s"
+        )
+        if self.on_page_done is not None:
+            self.on_page_done(page)
+
+
+class AdvertPipeline:
+    """
+    Producer/consumer pipeline overlapping listing-page discovery with advert fetching.
+    Listing pages are fetched in the calling thread and their advert links are put on a bounded queue,
+    which is drained by a long-lived pool of workers, so the pool does not go idle between pages.
+    Args:
+        ad_fetcher: Fetcher used by the workers, results are stored in ad_fetcher.cars or streamed to its sink
+        n_workers: Number of worker threads, an upper bound of advert requests in flight, whose actual number
+            is adapted by the fetcher at runtime. Defaults to AdvertisementFetcher.MAX_THREADS
+        queue_size: Maximum number of advert links waiting in the queue
+        on_page_done: Called with page number once every advert from the page has been processed
+    """
+
+    QUEUE_SIZE = 100
+
+    def __init__(
+        self,
+        ad_fetcher: AdvertisementFetcher,
+        n_workers: Optional[int] = None,
+        queue_size: int = QUEUE_SIZE,
+        on_page_done: Optional[Callable[[int], None]] = None,
+    ):
+        self.ad_fetcher = ad_fetcher
+        self.n_workers = n_workers or ad_fetcher.MAX_THREADS
+        self.queue: Queue = Queue(maxsize=queue_size)
+        self.tracker = PageLatencyTracker(on_page_done)
+
+    def _worker(self) -> None:
+        while (item := self.queue.get()) is not None:
+            page, link = item
+            start = time.perf_counter()
+            try:
+                self.ad_fetcher.fetch_ad(link)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logger.exception(f"Error {e} while processing {link}")
+            finally:
+                self.tracker.record(page, time.perf_counter() - start)
+
+    def run(self, pages: Iterable[int], get_links: Callable[[int], List[str]]) -> None:
+        """Runs the pipeline until all adverts from all pages are fetched.
+
+        Args:
+            pages (Iterable[int]): Listing pages to process.
+            get_links (Callable[[int], List[str]]): Function returning advert links found on a listing page.
+        """
+        from tqdm import tqdm  # pylint: disable=import-outside-toplevel
+
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.n_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for page in tqdm(pages):
+                links = get_links(page)
+                self.tracker.open_page(page, len(links))
+                for link in links:
+                    self.queue.put((page, link))
+        finally:
+            for _ in workers:
+                self.queue.put(None)
+            for worker in workers:
+                worker.join()
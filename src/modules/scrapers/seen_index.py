@@ -0,0 +1,104 @@
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List
+
+from modules.scrapers.parsers import ListingCard
+
+ADVERT_ID_PATTERN = re.compile(r"-(ID\w+)\.html")
+
+
+def advert_id(url: str) -> str:
+    """Extracts otomoto advert ID from url, falling back to the url itself.
+
+    Args:
+        url (str): Advert url.
+
+    Returns:
+        str: Advert ID.
+    """
+    match = ADVERT_ID_PATTERN.search(url)
+    return match.group(1) if match else url
+
+
+class SeenAdvertIndex:
+    """
+    Persistent SQLite index of already scraped adverts used for incremental re-scrapes.
+    Stores advert ID, url, time it was last seen on a listing page and fingerprint of its listing card.
+    An advert is fetched again only when it is new or its card changed. The fingerprint is committed
+    only after the fetched advert has been durably written, so failed or lost adverts are retried on the next run.
+    Args:
+        path: Path to the SQLite database file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending: Dict[str, str] = {}
+        self._connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS adverts (
+                    advert_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    last_seen REAL NOT NULL,
+                    content_hash TEXT NOT NULL
+                )"""
+            )
+
+    def select_changed(self, cards: Iterable[ListingCard]) -> List[str]:
+        """Marks cards as seen and selects adverts which have to be fetched.
+
+        Args:
+            cards (Iterable[ListingCard]): Cards found on a listing page.
+
+        Returns:
+            List[str]: Urls of new adverts and adverts whose card changed since they were last fetched.
+        """
+        cards = {advert_id(card.url): card for card in cards}
+        if not cards:
+            return []
+        now = time.time()
+        with self._lock, self._connection:
+            placeholders = ",".join("?" * len(cards))
+            stored = dict(
+                self._connection.execute(
+                    f"SELECT advert_id, content_hash FROM adverts WHERE advert_id IN ({placeholders})",
+                    list(cards),
+                ).fetchall()
+            )
+            self._connection.executemany(
+                "UPDATE adverts SET last_seen = ? WHERE advert_id = ?", [(now, key) for key in stored]
+            )
+            changed = []
+            for key, card in cards.items():
+                if stored.get(key) != card.fingerprint:
+                    self._pending[card.url] = card.fingerprint
+                    changed.append(card.url)
+        return changed
+
+    def mark_fetched(self, urls: Iterable[str]) -> None:
+        """Commits fingerprints of fetched adverts once their rows are written.
+        Urls not returned by select_changed are ignored.
+
+        Args:
+            urls (Iterable[str]): Advert urls, as returned by select_changed.
+        """
+        now = time.time()
+        with self._lock:
+            rows = [
+                (advert_id(url), url, now, content_hash)
+                for url in urls
+                if (content_hash := self._pending.pop(url, None)) is not None
+            ]
+            if not rows:
+                return
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO adverts (advert_id, url, last_seen, content_hash) VALUES (?, ?, ?, ?)", rows
+                )
+
+    def close(self) -> None:
+        """Closes database connection."""
+        self._connection.close()
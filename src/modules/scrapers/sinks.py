@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import abc
+import os
+import shutil
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class RowSink(abc.ABC):
+    """
+    Streams scraped rows to disk in bounded batches, so memory use does not grow with number of adverts.
+    Rows are written to a temporary ".part" output which replaces the target file on close.
+    Writing is thread-safe.
+    After every flush the sink reports flushed rows with a checkpoint of the ".part" output, which can be passed
+    back as resume_state to continue an interrupted output from that point.
+    Args:
+        path: Target file path
+        columns: Column names, in order
+        batch_size: Number of rows buffered before they are flushed to disk
+        on_flush: Called with every flushed batch and the checkpoint after it
+        resume_state: Checkpoint of an interrupted ".part" output to continue from. By default output starts anew
+    """
+
+    EXTENSION = ""
+    BATCH_SIZE = 500
+
+    def __init__(
+        self,
+        path: str,
+        columns: List[str],
+        batch_size: int = BATCH_SIZE,
+        on_flush: Optional[Callable[[pd.DataFrame, int], None]] = None,
+        resume_state: Optional[int] = None,
+    ):
+        self.path = path
+        self.part_path = f"{path}.part"
+        self.columns = columns
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.resume_state = resume_state if os.path.exists(self.part_path) else None
+        self.rows_written = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """Buffers row, flushing the buffer once it is full.
+
+        Args:
+            row (Dict[str, Any]): Row with keys matching columns.
+        """
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._flush()
+
+    def write_frame(self, frame: pd.DataFrame) -> None:
+        """Writes frame directly, bypassing the buffer.
+
+        Args:
+            frame (pd.DataFrame): Rows with columns matching columns.
+        """
+        if frame.empty:
+            return
+        with self._lock:
+            self._flush()
+            self._write_batch(frame.reindex(columns=self.columns))
+            self.rows_written += len(frame)
+
+    def flush(self) -> None:
+        """Writes buffered rows to disk."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._buffer:
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+
+            frame = pd.DataFrame(self._buffer, columns=self.columns)
+            self._write_batch(frame)
+            self.rows_written += len(self._buffer)
+            self._buffer = []
+            if self.on_flush is not None:
+                self.on_flush(frame, self.state())
+
+    def close(self) -> None:
+        """Flushes remaining rows and moves written output to the target path."""
+        with self._lock:
+            self._flush()
+            self._close()
+
+    @abc.abstractmethod
+    def state(self) -> int:
+        """Checkpoint of the ".part" output.
+
+        Returns:
+            int: Checkpoint, valid as resume_state.
+        """
+
+    @abc.abstractmethod
+    def read_saved(self) -> Iterator[pd.DataFrame]:
+        """Reads rows previously saved under the target path in batches.
+
+        Yields:
+            pd.DataFrame: Batch of saved rows.
+        """
+
+    @abc.abstractmethod
+    def _write_batch(self, frame: pd.DataFrame) -> None:
+        """Appends frame to the ".part" output."""
+
+    @abc.abstractmethod
+    def _close(self) -> None:
+        """Moves the ".part" output to the target path."""
+
+
+class CsvSink(RowSink):
+    """Streams rows to a csv file, formatted the same way as DataFrame.to_csv. Checkpoint is the file size."""
+
+    EXTENSION = "csv"
+
+    def __init__(self, path: str, columns: List[str], **kwargs):
+        super().__init__(path, columns, **kwargs)
+        if self.resume_state is not None:
+            # Drops a batch which might have been partially written after the checkpoint
+            os.truncate(self.part_path, self.resume_state)
+            self._file = open(self.part_path, "a", encoding="utf-8", newline="")  # pylint: disable=consider-using-with
+        else:
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+
+            self._file = open(self.part_path, "w", encoding="utf-8", newline="")  # pylint: disable=consider-using-with
+            pd.DataFrame(columns=columns).to_csv(self._file, index=False)
+            self._file.flush()
+
+    def state(self) -> int:
+        """Checkpoint of the ".part" output.
+
+        Returns:
+            int: Size of the ".part" file in bytes.
+        """
+        return os.path.getsize(self.part_path)
+
+    def read_saved(self) -> Iterator[pd.DataFrame]:
+        """Reads rows previously saved under the target path in batches.
+
+        Yields:
+            pd.DataFrame: Batch of saved rows.
+        """
+        yield from read_batches(self.path, self.batch_size)
+
+    def _write_batch(self, frame: pd.DataFrame) -> None:
+        frame.to_csv(self._file, header=False, index=False)
+        self._file.flush()
+
+    def _close(self) -> None:
+        self._file.close()
+        os.replace(self.part_path, self.path)
+
+
+class ParquetSink(RowSink):
+    """
+    Streams rows to a parquet file, one row group per batch. Values are stored as strings.
+    Every batch is written to a separate file in the ".part" directory, so a crash never leaves a file without
+    its footer. Files are merged into the target on close. Checkpoint is the number of written batch files.
+    """
+
+    EXTENSION = "parquet"
+
+    def __init__(self, path: str, columns: List[str], **kwargs):
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+
+        super().__init__(path, columns, **kwargs)
+        self.schema = pa.schema([(column, pa.string()) for column in columns])
+        if self.resume_state is None:
+            shutil.rmtree(self.part_path, ignore_errors=True)
+        os.makedirs(self.part_path, exist_ok=True)
+        self._n_batches = self.resume_state or 0
+        for batch_file in self._batch_files()[self._n_batches :]:
+            os.remove(batch_file)
+
+    def _batch_files(self) -> List[str]:
+        return [os.path.join(self.part_path, name) for name in sorted(os.listdir(self.part_path))]
+
+    def state(self) -> int:
+        """Checkpoint of the ".part" output.
+
+        Returns:
+            int: Number of batch files written.
+        """
+        return self._n_batches
+
+    def read_saved(self) -> Iterator[pd.DataFrame]:
+        """Reads rows previously saved under the target path in batches.
+
+        Yields:
+            pd.DataFrame: Batch of saved rows.
+        """
+        yield from read_batches(self.path, self.batch_size)
+
+    def _write_batch(self, frame: pd.DataFrame) -> None:
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        import pyarrow as pa  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+        arrays = [
+            pa.array([None if pd.isna(value) else str(value) for value in frame[column]], type=pa.string())
+            for column in self.columns
+        ]
+        pq.write_table(
+            pa.Table.from_arrays(arrays, schema=self.schema),
+            os.path.join(self.part_path, f"{self._n_batches:08d}.parquet"),
+        )
+        self._n_batches += 1
+
+    def _close(self) -> None:
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+        temp_path = f"{self.path}.tmp"
+        with pq.ParquetWriter(temp_path, self.schema, compression="zstd") as writer:
+            for batch_file in self._batch_files():
+                writer.write_table(pq.read_table(batch_file, schema=self.schema))
+        os.replace(temp_path, self.path)
+        shutil.rmtree(self.part_path)
+
+
+SINKS = {"csv": CsvSink, "parquet": ParquetSink}
+
+
+def read_batches(path: str, batch_size: int = RowSink.BATCH_SIZE, raw: bool = False) -> Iterator[pd.DataFrame]:
+    """Reads csv or parquet file written by a sink in batches.
+
+    Args:
+        path (str): File path, format is inferred from its extension.
+        batch_size (int): Number of rows per batch.
+        raw (bool): Whether to read csv values as written, without inferring types. Parquet values are always read
+            as written. Defaults to False.
+
+    Yields:
+        pd.DataFrame: Batch of rows.
+    """
+    if path.endswith(f".{ParquetSink.EXTENSION}"):
+        import pyarrow.parquet as pq  # pylint: disable=import-outside-toplevel
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        yield from pd.read_csv(path, chunksize=batch_size, low_memory=False, dtype=str if raw else None)
+
+
+def make_sink(output_format: str, directory: str, name: str, columns: List[str], **kwargs) -> RowSink:
+    """Creates sink writing to directory/name.<format extension>.
+
+    Args:
+        output_format (str): Output format, one of SINKS.
+        directory (str): Output directory.
+        name (str): File name without extension.
+        columns (List[str]): Column names, in order.
+        **kwargs: Other RowSink arguments.
+
+    Returns:
+        RowSink: Sink instance.
+
+    Raises:
+        ValueError: Error when output format is unknown.
+    """
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output format {output_format}. Expected one of: {', '.join(SINKS)}")
+    sink_class = SINKS[output_format]
+    os.makedirs(directory, exist_ok=True)
+    return sink_class(os.path.join(directory, f"{name}.{sink_class.EXTENSION}"), columns, **kwargs)
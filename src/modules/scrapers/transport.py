@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from modules.scrapers.concurrency import AimdController, HostRateLimiter
+from modules.scrapers.metrics import ScrapeMetrics, status_class
+from resources.headers import ADVERT_HEADERS
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# Advertises gzip/deflate always and brotli whenever urllib3 is able to decode it (brotli package installed)
+ACCEPT_ENCODING = make_headers(accept_encoding=True)["accept-encoding"]
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class TransportStats:
+    """Thread-safe counters describing traffic of a transport."""
+
+    FIELDS = ("requests", "retries", "failures", "bytes_received", "connections_opened", "connections_reused")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, name: str, value: int = 1) -> None:
+        """Increments counter.
+
+        Args:
+            name (str): Counter name, one of TransportStats.FIELDS.
+            value (int): Increment. Defaults to 1.
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def as_dict(self) -> Dict[str, int]:
+        """Snapshot of counters.
+
+        Returns:
+            Dict[str, int]: Counter values.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[str] = None) -> float:
+    """Exponential backoff with full jitter, honouring numeric Retry-After header.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting from 0.
+        base (float): Base delay in seconds.
+        cap (float): Maximum delay in seconds.
+        retry_after (Optional[str]): Value of Retry-After header, if any.
+
+    Returns:
+        float: Number of seconds to wait before next attempt.
+    """
+    delay = random.uniform(0, min(cap, base * 2**attempt))
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), cap))
+    return delay
+
+
+class HttpTransport:
+    """
+    Pooled HTTP transport shared by scrapers.
+    Keeps connections alive between requests, asks for compressed responses, rotates advert headers
+    on every request and retries throttled or failed requests with jittered exponential backoff.
+    Args:
+        headers: Headers to rotate between requests. Defaults to ADVERT_HEADERS
+        pool_size: Maximum number of connections kept alive per host
+        max_retries: Number of retries of a request on connection errors and RETRY_STATUSES
+        backoff_base: Base delay of the exponential backoff in seconds
+        backoff_cap: Maximum delay of the exponential backoff in seconds
+        timeout: Request timeout in seconds
+        metrics: Metrics counting responses of every attempt by status class in scraper_http_responses_total
+        rate_limiter: Per-host ceiling of requests per second, applied to every attempt
+        controller: Concurrency controller fed with latency and status of every attempt
+    """
+
+    POOL_SIZE = 16
+    MAX_RETRIES = 3
+    BACKOFF_BASE = 0.5
+    BACKOFF_CAP = 30.0
+    TIMEOUT = 30.0
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        *,
+        headers: Optional[List[Dict[str, str]]] = None,
+        pool_size: int = POOL_SIZE,
+        max_retries: int = MAX_RETRIES,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_cap: float = BACKOFF_CAP,
+        timeout: float = TIMEOUT,
+        metrics: Optional[ScrapeMetrics] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        controller: Optional[AimdController] = None,
+    ):
+        self.headers = headers or ADVERT_HEADERS
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.controller = controller
+        self._stats = TransportStats()
+
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def _request_headers(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        request_headers = dict(headers or random.choice(self.headers))
+        request_headers["Accept-Encoding"] = ACCEPT_ENCODING
+        return request_headers
+
+    def _record_response(self, status: Optional[int], start: float) -> None:
+        if self.metrics is not None:
+            self.metrics.inc("scraper_http_responses_total", status_class=status_class(status))
+        if self.controller is not None:
+            self.controller.record(time.perf_counter() - start, status)
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+        """Sends GET request, retrying on connection errors and RETRY_STATUSES.
+
+        Args:
+            url (str): Requested url.
+            headers (Optional[Dict[str, str]]): Headers to send. Defaults to random headers from the rotation.
+
+        Returns:
+            requests.Response: Response of the last attempt.
+
+        Raises:
+            requests.exceptions.RequestException: Error when all attempts failed without response.
+        """
+        attempt = 0
+        while True:
+            self._stats.add("requests")
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait(url)
+            start = time.perf_counter()
+            try:
+                res = self.session.get(url, headers=self._request_headers(headers), timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record_response(None, start)
+                if attempt == self.max_retries:
+                    self._stats.add("failures")
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                logger.debug(f"Retrying {url} in {delay:.2f}s after error: {e}")
+            else:
+                self._record_response(res.status_code, start)
+                self._stats.add("bytes_received", res.raw.tell() or len(res.content))
+                if res.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    if res.status_code >= 400:
+                        self._stats.add("failures")
+                    return res
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, res.headers.get("Retry-After"))
+                logger.debug(f"Retrying {url} in {delay:.2f}s after status {res.status_code}")
+            self._stats.add("retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of transport counters, including connection reuse of the pool.
+
+        Returns:
+            Dict[str, int]: Counter values.
+        """
+        stats = self._stats.as_dict()
+        # Derived from urllib3 pool counters: a dropped keep-alive connection re-established in place counts as reused
+        pools = self._adapter.poolmanager.pools
+        opened = sum(pools[key].num_connections for key in pools.keys())
+        sent = sum(pools[key].num_requests for key in pools.keys())
+        stats["connections_opened"] = opened
+        stats["connections_reused"] = max(sent - opened, 0)
+        return stats
+
+    def close(self) -> None:
+        """Closes pooled connections."""
+        self.session.close()
+
+
+class Page(NamedTuple):
+    """Fully read response of AsyncHttpTransport."""
+
+    status: int
+    content: bytes
+    encoding: str
+
+    @property
+    def text(self) -> str:
+        """Decoded response body."""
+        return self.content.decode(self.encoding, errors="replace")
+
+
+class AsyncHttpTransport:
+    """
+    Asyncio counterpart of HttpTransport based on aiohttp. Must be used as an async context manager.
+    Args:
+        limit: Maximum number of open connections
+        headers: Headers to rotate between requests. Defaults to ADVERT_HEADERS
+        max_retries: Number of retries of a request on connection errors and RETRY_STATUSES
+        backoff_base: Base delay of the exponential backoff in seconds
+        backoff_cap: Maximum delay of the exponential backoff in seconds
+        timeout: Request timeout in seconds
+        metrics: Metrics counting responses of every attempt by status class in scraper_http_responses_total
+        rate_limiter: Per-host ceiling of requests per second, applied to every attempt
+        controller: Concurrency controller fed with latency and status of every attempt
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        limit: int,
+        *,
+        headers: Optional[List[Dict[str, str]]] = None,
+        max_retries: int = HttpTransport.MAX_RETRIES,
+        backoff_base: float = HttpTransport.BACKOFF_BASE,
+        backoff_cap: float = HttpTransport.BACKOFF_CAP,
+        timeout: float = HttpTransport.TIMEOUT,
+        metrics: Optional[ScrapeMetrics] = None,
+        rate_limiter: Optional[HostRateLimiter] = None,
+        controller: Optional[AimdController] = None,
+    ):
+        self.limit = limit
+        self.headers = headers or ADVERT_HEADERS
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.metrics = metrics
+        self.rate_limiter = rate_limiter
+        self.controller = controller
+        self._stats = TransportStats()
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncHttpTransport":
+        import aiohttp  # pylint: disable=import-outside-toplevel
+
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_connection_create_end(*_):
+            self._stats.add("connections_opened")
+
+        async def on_connection_reuseconn(*_):
+            self._stats.add("connections_reused")
+
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.limit),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace_config],
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    def _request_headers(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        request_headers = dict(headers or random.choice(self.headers))
+        request_headers["Accept-Encoding"] = ACCEPT_ENCODING
+        return request_headers
+
+    def _record_response(self, status: Optional[int], start: float) -> None:
+        if self.metrics is not None:
+            self.metrics.inc("scraper_http_responses_total", status_class=status_class(status))
+        if self.controller is not None:
+            self.controller.record(time.perf_counter() - start, status)
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None, raise_for_status: bool = False) -> Page:
+        """Sends GET request, retrying on connection errors and RETRY_STATUSES.
+
+        Args:
+            url (str): Requested url.
+            headers (Optional[Dict[str, str]]): Headers to send. Defaults to random headers from the rotation.
+            raise_for_status (bool): Whether to raise on 4xx/5xx status of the last attempt. Defaults to False.
+
+        Returns:
+            Page: Response of the last attempt.
+
+        Raises:
+            aiohttp.ClientError: Error when all attempts failed without response or status check failed.
+            asyncio.TimeoutError: Error when the last attempt timed out.
+        """
+        import aiohttp  # pylint: disable=import-outside-toplevel
+
+        attempt = 0
+        while True:
+            self._stats.add("requests")
+            if self.rate_limiter is not None:
+                await self.rate_limiter.wait_async(url)
+            start = time.perf_counter()
+            try:
+                async with self.session.get(url, headers=self._request_headers(headers)) as res:
+                    self._record_response(res.status, start)
+                    if res.status not in RETRY_STATUSES or attempt == self.max_retries:
+                        if res.status >= 400:
+                            self._stats.add("failures")
+                        if raise_for_status:
+                            res.raise_for_status()
+                        content = await res.read()
+                        self._stats.add("bytes_received", len(content))
+                        return Page(res.status, content, res.get_encoding())
+                    delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap, res.headers.get("Retry-After"))
+                    logger.debug(f"Retrying {url} in {delay:.2f}s after status {res.status}")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._record_response(None, start)
+                if attempt == self.max_retries:
+                    self._stats.add("failures")
+                    raise
+                delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+                logger.debug(f"Retrying {url} in {delay:.2f}s after error: {e}")
+            self._stats.add("retries")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of transport counters.
+
+        Returns:
+            Dict[str, int]: Counter values.
+        """
+        return self._stats.as_dict()
@@ -0,0 +1,479 @@
+import abc
+import json
+import multiprocessing
+import os
+import pathlib
+import shutil
+import socket
+import sqlite3
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from loguru import logger
+from modules.scrapers.car_scraper import CarScraper
+from modules.scrapers.partition import SearchSlice
+
+
+class WorkUnit(NamedTuple):
+    """
+    Range of listing pages of a single manufacturer or its search slice, scraped into its own shard output.
+    Units belong to the scrape job which published them, so a queue can be planned again once a job is done.
+    """
+
+    maker: str
+    first_page: int
+    last_page: int
+    search: Optional[SearchSlice] = None
+    job_id: Optional[str] = None
+
+    @property
+    def unit_id(self) -> str:
+        """Unique name of the unit, used as shard output name."""
+        name = self.search.name if self.search is not None else self.maker
+        return f"{name}__{self.first_page:04d}-{self.last_page:04d}"
+
+    @property
+    def key(self) -> str:
+        """Name of the unit in the queue, unique across jobs."""
+        return f"{self.job_id}/{self.unit_id}" if self.job_id is not None else self.unit_id
+
+    def to_json(self) -> str:
+        """Serializes unit.
+
+        Returns:
+            str: JSON representation.
+        """
+        return json.dumps(dict(zip(WorkUnit._fields, self)))
+
+    @classmethod
+    def from_json(cls, data: str) -> "WorkUnit":
+        """Deserializes unit.
+
+        Args:
+            data (str): JSON representation.
+
+        Returns:
+            WorkUnit: Unit.
+        """
+        unit = json.loads(data)
+        if unit.get("search") is not None:
+            unit["search"] = SearchSlice(*unit["search"])
+        return cls(**unit)
+
+
+class WorkQueue(abc.ABC):
+    """
+    Queue of work units shared by coordinator and workers.
+    Claimed units which are neither completed nor failed within lease_seconds are handed out again,
+    so units of crashed workers are not lost. Failed units are retried up to max_attempts times.
+    Args:
+        lease_seconds: Time after which a claimed unit is considered abandoned
+        max_attempts: Number of times a unit is handed out before it is dropped
+    """
+
+    LEASE_SECONDS = 3600
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, lease_seconds: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @abc.abstractmethod
+    def put(self, units: Iterable[WorkUnit]) -> None:
+        """Adds units to the queue. Units already present are left untouched.
+
+        Args:
+            units (Iterable[WorkUnit]): Units to add.
+        """
+
+    @abc.abstractmethod
+    def claim(self, worker_id: str) -> Optional[WorkUnit]:
+        """Claims next pending unit.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+
+        Returns:
+            Optional[WorkUnit]: Claimed unit or None if there is nothing left to do.
+        """
+
+    @abc.abstractmethod
+    def complete(self, unit: WorkUnit) -> None:
+        """Marks claimed unit as done.
+
+        Args:
+            unit (WorkUnit): Claimed unit.
+        """
+
+    @abc.abstractmethod
+    def fail(self, unit: WorkUnit) -> None:
+        """Returns claimed unit to the queue, or drops it once it has been attempted max_attempts times.
+
+        Args:
+            unit (WorkUnit): Claimed unit.
+        """
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Number of units by status.
+
+        Returns:
+            Dict[str, int]: Number of pending, claimed, done and failed units.
+        """
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    Work queue stored in a local SQLite file, shared by worker processes of a single machine
+    (or machines sharing a file system with working locks).
+    Args:
+        path: Path to the SQLite database file
+        **kwargs: WorkQueue arguments
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS units (
+                unit_key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                claimed_at REAL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+
+    def put(self, units: Iterable[WorkUnit]) -> None:
+        """Adds units to the queue. Units already present are left untouched.
+
+        Args:
+            units (Iterable[WorkUnit]): Units to add.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO units (unit_key, data) VALUES (?, ?)",
+                [(unit.key, unit.to_json()) for unit in units],
+            )
+
+    def claim(self, worker_id: str) -> Optional[WorkUnit]:
+        """Claims next pending unit.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+
+        Returns:
+            Optional[WorkUnit]: Claimed unit or None if there is nothing left to do.
+        """
+        self._connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._connection.execute(
+                """SELECT unit_key, data FROM units
+                WHERE status = 'pending' OR (status = 'claimed' AND claimed_at < ?)
+                ORDER BY unit_key LIMIT 1""",
+                (time.time() - self.lease_seconds,),
+            ).fetchone()
+            if row is not None:
+                self._connection.execute(
+                    """UPDATE units SET status = 'claimed', worker = ?, claimed_at = ?, attempts = attempts + 1
+                    WHERE unit_key = ?""",
+                    (worker_id, time.time(), row[0]),
+                )
+            self._connection.execute("COMMIT")
+        except sqlite3.Error:
+            self._connection.execute("ROLLBACK")
+            raise
+        return WorkUnit.from_json(row[1]) if row is not None else None
+
+    def complete(self, unit: WorkUnit) -> None:
+        """Marks claimed unit as done.
+
+        Args:
+            unit (WorkUnit): Claimed unit.
+        """
+        self._connection.execute("UPDATE units SET status = 'done' WHERE unit_key = ?", (unit.key,))
+
+    def fail(self, unit: WorkUnit) -> None:
+        """Returns claimed unit to the queue, or drops it once it has been attempted max_attempts times.
+
+        Args:
+            unit (WorkUnit): Claimed unit.
+        """
+        self._connection.execute(
+            "UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END WHERE unit_key = ?",
+            (self.max_attempts, unit.key),
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of units by status.
+
+        Returns:
+            Dict[str, int]: Number of pending, claimed, done and failed units.
+        """
+        counts = dict.fromkeys(("pending", "claimed", "done", "failed"), 0)
+        counts.update(self._connection.execute("SELECT status, COUNT(*) FROM units GROUP BY status").fetchall())
+        return counts
+
+
+class RedisWorkQueue(WorkQueue):
+    """
+    Work queue stored in Redis (or any server speaking its protocol), shared by workers on several machines.
+    Pending units are kept in a list, claimed ones in a hash with their claim time. A unit is moved from the list
+    to the hash by a single Lua script, so it cannot be lost or handed out twice when a worker dies mid-claim.
+    Args:
+        client: redis.Redis compatible client
+        name: Prefix of the keys used by the queue
+        **kwargs: WorkQueue arguments
+    """
+
+    # KEYS: pending, claimed, attempts, units. ARGV: claim time, claim time of abandoned units
+    CLAIM_SCRIPT = """
+    local claimed = redis.call('HGETALL', KEYS[2])
+    for i = 1, #claimed, 2 do
+        if tonumber(claimed[i + 1]) < tonumber(ARGV[2]) then
+            redis.call('HDEL', KEYS[2], claimed[i])
+            redis.call('RPUSH', KEYS[1], claimed[i])
+        end
+    end
+    local unit_key = redis.call('LPOP', KEYS[1])
+    if not unit_key then
+        return false
+    end
+    redis.call('HSET', KEYS[2], unit_key, ARGV[1])
+    redis.call('HINCRBY', KEYS[3], unit_key, 1)
+    return redis.call('HGET', KEYS[4], unit_key)
+    """
+
+    def __init__(self, client, name: str = "otomoto", **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.name = name
+        self._keys = {key: f"{name}:{key}" for key in ("units", "pending", "claimed", "attempts", "done", "failed")}
+        self._claim_script = client.register_script(self.CLAIM_SCRIPT)
+
+    def put(self, units: Iterable[WorkUnit]) -> None:
+        """Adds units to the queue. Units already present are left untouched.
+
+        Args:
+            units (Iterable[WorkUnit]): Units to add.
+        """
+        for unit in units:
+            if self.client.hsetnx(self._keys["units"], unit.key, unit.to_json()):
+                self.client.rpush(self._keys["pending"], unit.key)
+
+    def claim(self, worker_id: str) -> Optional[WorkUnit]:
+        """Claims next pending unit.
+
+        Args:
+            worker_id (str): Identifier of the claiming worker.
+
+        Returns:
+            Optional[WorkUnit]: Claimed unit or None if there is nothing left to do.
+        """
+        now = time.time()
+        data = self._claim_script(
+            keys=[self._keys["pending"], self._keys["claimed"], self._keys["attempts"], self._keys["units"]],
+            args=[repr(now), repr(now - self.lease_seconds)],
+        )
+        if data is None:
+            return None
+        unit = WorkUnit.from_json(data)
+        logger.debug(f"Unit {unit.key} claimed by {worker_id}")
+        return unit
+
+    def complete(self, unit: WorkUnit) -> None:
+        """Marks claimed unit as done.
+
+        Args:
+            unit (WorkUnit): Claimed unit.
+        """
+        with self.client.pipeline() as pipeline:
+            pipeline.hdel(self._keys["claimed"], unit.key)
+            pipeline.sadd(self._keys["done"], unit.key)
+            pipeline.execute()
+
+    def fail(self, unit: WorkUnit) -> None:
+        """Returns claimed unit to the queue, or drops it once it has been attempted max_attempts times.
+
+        Args:
+            unit (WorkUnit): Claimed unit.
+        """
+        exhausted = int(self.client.hget(self._keys["attempts"], unit.key) or 0) >= self.max_attempts
+        with self.client.pipeline() as pipeline:
+            pipeline.hdel(self._keys["claimed"], unit.key)
+            if exhausted:
+                pipeline.sadd(self._keys["failed"], unit.key)
+            else:
+                pipeline.rpush(self._keys["pending"], unit.key)
+            pipeline.execute()
+
+    def counts(self) -> Dict[str, int]:
+        """Number of units by status.
+
+        Returns:
+            Dict[str, int]: Number of pending, claimed, done and failed units.
+        """
+        return {
+            "pending": self.client.llen(self._keys["pending"]),
+            "claimed": self.client.hlen(self._keys["claimed"]),
+            "done": self.client.scard(self._keys["done"]),
+            "failed": self.client.scard(self._keys["failed"]),
+        }
+
+
+def open_queue(url: str, **kwargs) -> WorkQueue:
+    """Opens work queue from url: "sqlite:///path/to/queue.sqlite" or "redis://host:port/db".
+
+    Args:
+        url (str): Queue url.
+        **kwargs: WorkQueue arguments.
+
+    Returns:
+        WorkQueue: Queue instance.
+
+    Raises:
+        ValueError: Error when url scheme is not supported.
+    """
+    if url.startswith("sqlite:///"):
+        return SqliteWorkQueue(url[len("sqlite:///") :], **kwargs)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis  # pylint: disable=import-outside-toplevel
+
+        return RedisWorkQueue(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+    raise ValueError(f"Unsupported work queue url {url}. Use sqlite:/// or redis://")
+
+
+class Coordinator:
+    """
+    Splits manufacturers into page ranges, publishes them as work units and merges shard outputs once done.
+    Manufacturers with more listing pages than the site shows are split into search slices first,
+    see CarScraper.partitioner.
+    Args:
+        scraper: Scraper used to read number of listing pages of manufacturers
+        queue: Work queue
+        pages_per_unit: Number of listing pages in a single work unit
+    """
+
+    PAGES_PER_UNIT = 20
+
+    def __init__(self, scraper: CarScraper, queue: WorkQueue, pages_per_unit: int = PAGES_PER_UNIT):
+        self.scraper = scraper
+        self.queue = queue
+        self.pages_per_unit = pages_per_unit
+
+    def plan(self, makers: Optional[List[str]] = None) -> List[WorkUnit]:
+        """Publishes work units covering all listing pages of manufacturers.
+
+        Args:
+            makers (Optional[List[str]]): Manufacturers to scrap. Defaults to all from resources/car_makes.txt.
+
+        Returns:
+            List[WorkUnit]: Published units.
+        """
+        units = []
+        for maker in makers or self.scraper.makers:
+            maker = maker.strip()
+            slices = self.scraper.partitioner.partition(maker)
+            for search, last_page_num in slices:
+                search = search if len(slices) > 1 else None
+                for first_page in range(1, last_page_num + 1, self.pages_per_unit):
+                    last_page = min(first_page + self.pages_per_unit - 1, last_page_num)
+                    units.append(WorkUnit(maker, first_page, last_page, search, self.scraper.journal.job_id))
+        self.queue.put(units)
+        logger.info(f"Published {len(units)} work units")
+        return units
+
+    def merge(self) -> List[str]:
+        """Merges shard outputs of every manufacturer scraped in the current job into its output file, dropping
+        duplicated adverts, finishes the job, removes its shards and starts a new job, so the next plan publishes
+        units of the new one.
+
+        Returns:
+            List[str]: Paths of merged files.
+        """
+        shards_directory = self.scraper.shards_directory
+        makers = sorted(os.listdir(shards_directory)) if os.path.isdir(shards_directory) else []
+        merged = [self.scraper.merge_shards(maker) for maker in makers]
+        self.scraper.journal.finish()
+        self.scraper.journal.drop_finished_jobs()
+        shutil.rmtree(shards_directory, ignore_errors=True)
+        self.scraper.open_job()
+        return merged
+
+
+def run_worker(queue: WorkQueue, scraper: CarScraper, worker_id: Optional[str] = None) -> int:
+    """Claims and scrapes work units until the queue is drained.
+    Units are scraped into data_directory/shards/<job_id>/<maker>/<unit_id> outputs.
+
+    Args:
+        queue (WorkQueue): Work queue.
+        scraper (CarScraper): Scraper used by the worker.
+        worker_id (Optional[str]): Identifier of the worker. Defaults to host name and process id.
+
+    Returns:
+        int: Number of completed units.
+
+    Raises:
+        ValueError: Error when the scraper is incremental, which sharded scraping does not support.
+    """
+    if scraper.seen_index is not None:
+        raise ValueError("Sharded scraping does not support incremental scrapers.")
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    completed = 0
+    while (unit := queue.claim(worker_id)) is not None:
+        if unit.job_id is not None and unit.job_id != scraper.journal.job_id:
+            # Progress of the unit is journaled under the job which published it
+            scraper.open_job(unit.job_id)
+        if scraper.journal.is_maker_done(unit.unit_id):
+            # Scraped by a worker which crashed before it completed the unit
+            queue.complete(unit)
+            completed += 1
+            continue
+        logger.info(f"Worker {worker_id} scrapping {unit.unit_id}")
+        try:
+            scraper.scrap_pages(
+                unit.maker,
+                range(unit.first_page, unit.last_page + 1),
+                output_name=unit.unit_id,
+                output_directory=os.path.join(scraper.shards_directory, unit.maker),
+                path=unit.search.url(scraper.BASE_URL) if unit.search is not None else None,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            logger.exception(f"Worker {worker_id} failed on {unit.unit_id}: {e}")
+            queue.fail(unit)
+        else:
+            queue.complete(unit)
+            completed += 1
+    logger.info(f"Worker {worker_id} finished after {completed} units. Queue: {queue.counts()}")
+    return completed
+
+
+def _worker_process(queue_url: str, data_directory: str, scraper_kwargs: dict) -> None:
+    # Workers share the logs directory, every one of them keeps its own metrics snapshot. They join the job
+    # started by the coordinator, the last unfinished one
+    scraper = CarScraper(
+        data_directory, **{"metrics_file": f"metrics-{os.getpid()}.json", "resume": True, **scraper_kwargs}
+    )
+    run_worker(open_queue(queue_url), scraper)
+
+
+def run_local_workers(queue_url: str, data_directory: str, n_workers: int, **scraper_kwargs) -> None:
+    """Runs worker processes on this machine and waits for them to drain the queue.
+
+    Args:
+        queue_url (str): Work queue url, see open_queue.
+        data_directory (str): Scraper data directory.
+        n_workers (int): Number of worker processes.
+        **scraper_kwargs: Other CarScraper arguments.
+    """
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(queue_url, data_directory, scraper_kwargs))
+        for _ in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import json
+import os
+from botocore.exceptions import ClientError
+
+CATALOG_KEY = "catalog.json"
+CATALOG_VERSION = 1
+LEGACY_LOADER_WORKERS = 16
+
+
+def build_catalog(models: Dict[str, List[str]], row_counts: Optional[Dict[str, Dict[str, int]]] = None) -> dict:
+    """Build catalog of car makes, their models and number of records of every model.
+
+    Args:
+        models (Dict[str, List[str]]): Models of every make, in order of makes.
+        row_counts (Optional[Dict[str, Dict[str, int]]]): Number of records by make and model. Defaults to none.
+
+    Returns:
+        dict: Catalog with "version", "makes", "models" and "row_counts" keys.
+    """
+    return {
+        "version": CATALOG_VERSION,
+        "makes": list(models),
+        "models": models,
+        "row_counts": row_counts or {},
+    }
+
+
+def read_resources_models(resources_directory: str) -> Dict[str, List[str]]:
+    """Read makes and models scraped into car_makes.txt and car_models directory.
+
+    Args:
+        resources_directory (str): Directory with car_makes.txt file and car_models directory.
+
+    Returns:
+        Dict[str, List[str]]: Models of every make, in order of car_makes.txt. Makes without models file have none.
+    """
+    with open(os.path.join(resources_directory, "car_makes.txt"), "r", encoding="utf-8") as makes_file:
+        makes = [line.strip() for line in makes_file if not line.isspace()]
+    models = {}
+    for make in makes:
+        models_path = os.path.join(resources_directory, "car_models", f"{make}.txt")
+        if os.path.exists(models_path):
+            with open(models_path, "r", encoding="utf-8") as models_file:
+                models[make] = [line.strip() for line in models_file if not line.isspace()]
+        else:
+            models[make] = []
+    return models
+
+
+def write_catalog(path: str, catalog: dict) -> None:
+    """Write catalog to a json file.
+
+    Args:
+        path (str): Path to json file.
+        catalog (dict): Catalog, see build_catalog.
+    """
+    with open(path, "w", encoding="utf-8") as catalog_file:
+        json.dump(catalog, catalog_file, ensure_ascii=False, indent=1)
+
+
+def load_catalog(s3_client, bucket_name: str, key: str = CATALOG_KEY) -> Optional[dict]:
+    """Load catalog from S3 in a single request.
+
+    Args:
+        s3_client (s3.Client): boto3 client of s3 service.
+        bucket_name (str): Name of the bucket with the catalog.
+        key (str): Catalog key. Defaults to CATALOG_KEY.
+
+    Returns:
+        Optional[dict]: Catalog or None if there is no catalog.
+
+    Raises:
+        ClientError: Error when catalog could not be downloaded for reason other than it does not exist.
+    """
+    try:
+        catalog_object = s3_client.get_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+            raise
+        return None
+    return json.loads(catalog_object["Body"].read())
+
+
+def load_legacy_catalog(
+    s3_client, makes_bucket_name: str, models_bucket_name: str, max_workers: int = LEGACY_LOADER_WORKERS
+) -> dict:
+    """Load catalog from legacy layout: car_makes.txt and one car_models/{make}.txt object per make,
+    downloading models of several makes at a time.
+
+    Args:
+        s3_client (s3.Client): boto3 client of s3 service, which is safe to share between threads.
+        makes_bucket_name (str): Name of the bucket with car_makes.txt.
+        models_bucket_name (str): Name of the bucket with car_models objects.
+        max_workers (int): Number of concurrent downloads. Defaults to LEGACY_LOADER_WORKERS.
+
+    Returns:
+        dict: Catalog without row counts.
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    makes_data = s3_client.get_object(Bucket=makes_bucket_name, Key="car_makes.txt")
+    makes = pd.read_csv(makes_data["Body"], header=None, low_memory=False)[0].to_list()
+
+    def load_models(make: str) -> List[str]:
+        """Downloads models of a make.
+
+        Args:
+            make (str): Car make.
+
+        Returns:
+            List[str]: Models of the make.
+        """
+        models_data = s3_client.get_object(Bucket=models_bucket_name, Key=f"car_models/{make}.txt")
+        return pd.read_csv(models_data["Body"], header=None, low_memory=False)[0].to_list()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        models = dict(zip(makes, executor.map(load_models, makes)))
+    return build_catalog(models)
@@ -0,0 +1,190 @@
+from typing import Dict, Iterable, Optional
+import pandas as pd
+
+MODEL_COLUMN = "Model pojazdu"
+FUEL_COLUMN = "Rodzaj paliwa"
+TOTAL = "total"
+# Dimensions summarized by the dashboard, besides totals of every (model, fuel) pair
+YEAR_DIMENSION = "Rok produkcji"
+MILEAGE_DIMENSION = "Przebieg"
+CATEGORY_DIMENSIONS = ["Kraj pochodzenia", "Kolor", "Typ nadwozia", "Napęd", "Skrzynia biegów"]
+# Mileage is summarized in bins, exact mileages are nearly unique per advert, so a cube keyed by them would be as
+# large as the data. The Mileage / Price chart plots mean price per bin, keyed by its lower edge, instead of mean
+# price per exact mileage. 10 000 km keeps a few dozen points per model over typical mileages of 0-400 000 km.
+MILEAGE_BIN_KM = 10000
+KEYS = [MODEL_COLUMN, FUEL_COLUMN, "dimension", "value"]
+MEASURES = ["count", "price_count", "price_sum", "mileage_sum", "year_sum"]
+CUBE_DTYPES = {MODEL_COLUMN: str, FUEL_COLUMN: str, "dimension": str, "value": str}
+
+
+def cube_key(maker: str) -> str:
+    """S3 key of the cube of a maker.
+
+    Args:
+        maker (str): Name of the maker.
+
+    Returns:
+        str: Object key.
+    """
+    return f"cubes/{maker}.csv"
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Summarize processed adverts into counts and sums per (model, fuel) and per value of every dimension.
+    Rows without mileage, power or production year are left out, as they are in the dashboard.
+
+    Args:
+        df (pd.DataFrame): Processed adverts with numeric price, mileage, power and production year.
+
+    Returns:
+        pd.DataFrame: Cube with KEYS and MEASURES columns. Value of TOTAL rows is missing.
+    """
+    df = df.dropna(subset=["Przebieg", "Moc", "Rok produkcji"])
+    measures = pd.DataFrame(
+        {
+            MODEL_COLUMN: df[MODEL_COLUMN].astype(str),
+            FUEL_COLUMN: df[FUEL_COLUMN],
+            "count": 1,
+            "price_count": df["Cena"].notna().astype("int64"),
+            "price_sum": df["Cena"].fillna(0),
+            "mileage_sum": df["Przebieg"],
+            "year_sum": df["Rok produkcji"],
+        },
+        index=df.index,
+    )
+    values = {
+        TOTAL: pd.Series(None, index=df.index, dtype=object),
+        YEAR_DIMENSION: df["Rok produkcji"].astype("int64").astype(str),
+        MILEAGE_DIMENSION: (df["Przebieg"] // MILEAGE_BIN_KM * MILEAGE_BIN_KM).astype("int64").astype(str),
+    }
+    values.update({dimension: df[dimension] for dimension in CATEGORY_DIMENSIONS if dimension in df.columns})
+    parts = [
+        measures.assign(dimension=dimension, value=value).groupby(KEYS, dropna=False).sum().reset_index()
+        for dimension, value in values.items()
+    ]
+    return pd.concat(parts, ignore_index=True)
+
+
+def combine_cubes(cubes: Iterable[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    """Sum cubes of parts of the same data, e.g. of chunks of a file.
+
+    Args:
+        cubes (Iterable[pd.DataFrame]): Cubes built with build_cube.
+
+    Returns:
+        Optional[pd.DataFrame]: Combined cube, sorted by keys, or None if there were no cubes.
+    """
+    cubes = list(cubes)
+    if not cubes:
+        return None
+    return pd.concat(cubes, ignore_index=True).groupby(KEYS, dropna=False).sum().reset_index()
+
+
+def select_model(cube: pd.DataFrame, model: Optional[str] = None) -> pd.DataFrame:
+    """Rows of the cube describing a single model.
+
+    Args:
+        cube (pd.DataFrame): Cube of a maker.
+        model (Optional[str]): Model name. Defaults to all models.
+
+    Returns:
+        pd.DataFrame: Selected rows.
+    """
+    return cube if model is None else cube[cube[MODEL_COLUMN] == model]
+
+
+def models(cube: pd.DataFrame) -> list:
+    """Models summarized in the cube, most common first.
+
+    Args:
+        cube (pd.DataFrame): Cube of a maker.
+
+    Returns:
+        list: Model names.
+    """
+    totals = cube[cube["dimension"] == TOTAL].groupby(MODEL_COLUMN)["count"].sum()
+    return totals.sort_values(ascending=False, kind="stable").index.to_list()
+
+
+def averages(cube: pd.DataFrame) -> Dict[str, float]:
+    """Average price, production year and mileage.
+
+    Args:
+        cube (pd.DataFrame): Cube, optionally narrowed with select_model.
+
+    Returns:
+        Dict[str, float]: Averages keyed by "Cena", "Rok produkcji" and "Przebieg".
+    """
+    totals = cube.loc[cube["dimension"] == TOTAL, MEASURES].sum()
+    return {
+        "Cena": totals["price_sum"] / totals["price_count"],
+        "Rok produkcji": totals["year_sum"] / totals["count"],
+        "Przebieg": totals["mileage_sum"] / totals["count"],
+    }
+
+
+def value_counts(cube: pd.DataFrame, dimension: str) -> pd.Series:
+    """Number of adverts with every value of a categorical dimension or of fuel type, most common first.
+
+    Args:
+        cube (pd.DataFrame): Cube, optionally narrowed with select_model.
+        dimension (str): One of CATEGORY_DIMENSIONS or FUEL_COLUMN.
+
+    Returns:
+        pd.Series: Counts indexed by value, missing values are left out.
+    """
+    if dimension == FUEL_COLUMN:
+        rows, column = cube[cube["dimension"] == TOTAL], FUEL_COLUMN
+    else:
+        rows, column = cube[cube["dimension"] == dimension], "value"
+    counts = rows.groupby(column)["count"].sum()
+    return counts.sort_values(ascending=False, kind="stable").rename_axis(dimension)
+
+
+def total_count(cube: pd.DataFrame) -> int:
+    """Number of adverts.
+
+    Args:
+        cube (pd.DataFrame): Cube, optionally narrowed with select_model.
+
+    Returns:
+        int: Number of adverts.
+    """
+    return int(cube.loc[cube["dimension"] == TOTAL, "count"].sum())
+
+
+def year_range(cube: pd.DataFrame) -> tuple:
+    """Oldest and newest production year.
+
+    Args:
+        cube (pd.DataFrame): Cube, optionally narrowed with select_model.
+
+    Returns:
+        tuple: Minimum and maximum production year.
+    """
+    years = cube.loc[cube["dimension"] == YEAR_DIMENSION, "value"].astype(int)
+    return int(years.min()), int(years.max())
+
+
+def mean_by_fuel(cube: pd.DataFrame, dimension: str, measure: str) -> pd.DataFrame:
+    """Average price or mileage per value of production year or mileage bin and fuel type.
+
+    Args:
+        cube (pd.DataFrame): Cube, optionally narrowed with select_model.
+        dimension (str): YEAR_DIMENSION or MILEAGE_DIMENSION.
+        measure (str): "Cena" or "Przebieg".
+
+    Returns:
+        pd.DataFrame: Averages rounded down to integers, indexed by dimension value, one column per fuel type.
+            Production years are kept as strings and mileage bins as integers, as the dashboard plots them.
+    """
+    rows = cube[cube["dimension"] == dimension]
+    sums = rows.groupby(["value", FUEL_COLUMN])[MEASURES].sum()
+    if measure == "Cena":
+        means = sums["price_sum"] / sums["price_count"]
+    else:
+        means = sums["mileage_sum"] / sums["count"]
+    means = means.dropna().astype(int).unstack(FUEL_COLUMN)
+    if dimension == MILEAGE_DIMENSION:
+        means.index = means.index.astype(int)
+    return means.sort_index().rename_axis(index=dimension)
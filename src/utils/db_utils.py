@@ -1,31 +1,272 @@
-from typing import List, Union
+from collections import Counter, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+import contextlib
+import functools
+import gzip
+import hashlib
+import io
+import json
 import os
 from dotenv import load_dotenv
 import pandas as pd
 import boto3
-from tqdm.auto import tqdm, trange
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from tqdm.auto import tqdm
+from .catalog import CATALOG_KEY, build_catalog, read_resources_models
+from .cubes import KEYS, build_cube, combine_cubes, cube_key
+from .equipment import EQUIPMENT_COLUMN, EquipmentCodec
+from .normalization import normalize_dataframe
+from .price_models import model_key, serialize_model, train_price_model, training_data
 
 pd.options.mode.chained_assignment = None  # Disable Pandas SettingWithCopyWarning
 
+UPLOAD_WORKERS = 4
+# Number of rows read at a time by the process pool preprocessing
+CHUNK_SIZE = 20000
+# Objects larger than multipart_threshold are uploaded in parts, several parts at a time
+TRANSFER_CONFIG = TransferConfig(multipart_threshold=8 * 1024**2, multipart_chunksize=8 * 1024**2, max_concurrency=4)
+HASH_METADATA_KEY = "content-sha256"
 
-def upload_to_db(
+DROPPED_COLUMNS = [
+    "Wersja",
+    "Pokaż oferty z numerem VIN",
+    "Kategoria",
+    "Generacja",
+    "Emisja CO2",
+    "Rodzaj własności baterii",
+    "Pojemność baterii",
+    "Spalanie W Mieście",
+    "Metalik",
+    "Leasing",
+    "VAT marża",
+    "Faktura VAT",
+    "Okres gwarancji producenta",
+    "Możliwość finansowania",
+    "Pierwsza rejestracja",
+    "Pierwszy właściciel",
+    "Ma numer rejestracyjny",
+    "Autonomia",
+]
+
+
+class ChunkSchema(NamedTuple):
+    """Schema of chunks of a scraped file, giving the same data as processing the whole file at once."""
+
+    models: pd.Index
+    float_columns: List[str]
+    binary_columns: List[str]
+    dtype: Dict[str, type]
+
+
+class PreparedCollection(NamedTuple):
+    """Collection processed for upload."""
+
+    name: str
+    body: Optional[bytes]
+    model_counts: Dict[str, int]
+    cube: Optional[bytes]
+
+
+def upload_to_db(  # pylint: disable=too-many-arguments
     csv_files: List[str],
     features: Union[List[str], str],
+    *,
     min_n_records: int = 100,
     s3_bucket_name: str = "otomoto-scrapper",
-) -> None:
+    compact_equipment: bool = True,
+    compress: bool = True,
+    max_workers: int = UPLOAD_WORKERS,
+    processes: int = 0,
+    resources_directory: Optional[str] = None,
+    train_price_models: bool = False,
+    s3_resource=None,
+) -> Dict[str, str]:
     """Function for uploading scraped csv files to S3.
+    Files are processed and uploaded concurrently from in-memory buffers. Objects whose content did not change
+    since the last upload are not uploaded again. Next to every collection its aggregate cube, summaries used by
+    the dashboard, is uploaded under cubes/ prefix.
 
     Args:
         csv_files (List[str]): List of csv files.
         features (Union[List[str],str]): List of features or path to text file with features.
         min_n_records (int): Minimum number of records for car model for it to be uploaded. Defaults to 100.
         s3_bucket_name (str): Name of the AWS S3 bucket to which data will be uploaded.
+        compact_equipment (bool): Whether to upload equipment flags as a single bitmask column instead of one column
+            per equipment feature. See utils.equipment. Defaults to True.
+        compress (bool): Whether to upload gzip compressed objects, marked with gzip Content-Encoding.
+            Defaults to True.
+        max_workers (int): Number of collections uploaded at a time. Defaults to UPLOAD_WORKERS.
+        processes (int): Number of processes preprocessing files in chunks, see preprocess_collections.
+            Defaults to 0, which preprocesses whole files in threads.
+        resources_directory (Optional[str]): Directory with car_makes.txt file and car_models directory. When given,
+            catalog of makes, models and number of uploaded records of every model is uploaded as catalog.json.
+        train_price_models (bool): Whether to train price model of every uploaded car model and upload it to
+            the model registry, see utils.price_models. Defaults to False.
+        s3_resource (s3, optional): Instance of boto3 resource with s3 service. Defaults to one created with
+            credentials from .env file.
+
+    Returns:
+        Dict[str, str]: Upload status of every collection: "uploaded", "unchanged" or "skipped" when no model meets
+            minimum number of records condition.
+    """
+
+    bucket = (s3_resource or _s3_resource_from_env()).Bucket(s3_bucket_name)
+    features = _read_features(features)
+    equipment_codec = EquipmentCodec(features) if compact_equipment else None
+
+    statuses = {}
+    row_counts = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        uploads = {}
+        summary_uploads = []
+        for collection in tqdm(
+            preprocess_collections(
+                csv_files,
+                features,
+                min_n_records=min_n_records,
+                compact_equipment=compact_equipment,
+                compress=compress,
+                processes=processes,
+            ),
+            total=len(csv_files),
+        ):
+            if collection.body is None:
+                tqdm.write(
+                    f"Skipping uploading {collection.name} data - no model meets minimum number of records condition."
+                )
+                statuses[collection.name] = "skipped"
+                continue
+            row_counts[collection.name] = collection.model_counts
+            uploads[executor.submit(_upload_object, bucket, f"{collection.name}.txt", collection.body, compress)] = (
+                collection.name
+            )
+            summary_uploads.append(
+                executor.submit(_upload_object, bucket, cube_key(collection.name), collection.cube, compress)
+            )
+            if train_price_models:
+                summary_uploads.append(
+                    executor.submit(
+                        _upload_price_models, bucket, collection.name, collection.body, compress, equipment_codec
+                    )
+                )
+        statuses.update(_wait_for_uploads(uploads, summary_uploads))
+
+    if resources_directory is not None:
+        _upload_catalog(bucket, resources_directory, row_counts)
+    return statuses
+
+
+def _s3_resource_from_env():
+    """Create boto3 s3 resource with credentials from .env file.
+
+    Returns:
+        s3: Instance of boto3 resource with s3 service.
+    """
+    load_dotenv()
+    return boto3.resource(
+        service_name="s3",
+        region_name=os.environ["REGION_NAME"],
+        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+    )
+
+
+def _wait_for_uploads(uploads: Dict[Future, str], summary_uploads: List[Future]) -> Dict[str, str]:
+    """Wait for uploads of collections and their summaries.
+
+    Args:
+        uploads (Dict[Future, str]): Uploads of collections, returning whether the object was uploaded,
+            with collection names.
+        summary_uploads (List[Future]): Uploads of cubes and price models.
+
+    Returns:
+        Dict[str, str]: Upload status of every collection: "uploaded" or "unchanged".
+    """
+    statuses = {}
+    for future in as_completed(uploads):
+        collection_name = uploads[future]
+        if future.result():
+            tqdm.write(f"Uploaded {collection_name} data")
+            statuses[collection_name] = "uploaded"
+        else:
+            tqdm.write(f"Skipping uploading {collection_name} data - unchanged since last upload.")
+            statuses[collection_name] = "unchanged"
+    for future in summary_uploads:
+        future.result()
+    return statuses
+
+
+def _upload_catalog(bucket, resources_directory: str, row_counts: Dict[str, Dict[str, int]]) -> None:
+    """Upload catalog of makes, models and number of uploaded records of every model as catalog.json.
+
+    Args:
+        bucket (s3.Bucket): Target bucket.
+        resources_directory (str): Directory with car_makes.txt file and car_models directory.
+        row_counts (Dict[str, Dict[str, int]]): Number of uploaded records of every model by collection.
+    """
+    catalog = build_catalog(read_resources_models(resources_directory), row_counts)
+    body = json.dumps(catalog, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    if _upload_object(bucket, CATALOG_KEY, body, False, content_type="application/json"):
+        tqdm.write(f"Uploaded catalog of {len(catalog['makes'])} makes")
+
+
+def preprocess_collections(
+    csv_files: List[str],
+    features: Union[List[str], str],
+    *,
+    min_n_records: int = 100,
+    compact_equipment: bool = True,
+    compress: bool = True,
+    processes: int = 0,
+) -> Iterator[PreparedCollection]:
+    """Process scraped csv files into csv bodies ready for upload, in order of completion.
+    By default whole files are read and processed in UPLOAD_WORKERS threads. With processes, files are spread across
+    a process pool and every file is read in chunks of CHUNK_SIZE rows, so memory use does not grow with its size.
+    Both modes produce the same data.
+
+    Args:
+        csv_files (List[str]): List of csv files.
+        features (Union[List[str],str]): List of features or path to text file with features.
+        min_n_records (int): Minimum number of records for car model for it to be uploaded. Defaults to 100.
+        compact_equipment (bool): Whether to pack equipment flags into the bitmask column. Defaults to True.
+        compress (bool): Whether to gzip the csv bodies. Defaults to True.
+        processes (int): Number of processes. Defaults to 0, which processes whole files in threads.
+
+    Yields:
+        PreparedCollection: Collection name, csv body, or None if no model meets minimum number of records condition,
+            number of records of every model and csv body of aggregate cube, see utils.cubes.
 
     Raises:
         TypeError: Error when provided features do not match expected format.
     """
+    prepare = functools.partial(
+        _prepare_collection,
+        features=_read_features(features),
+        min_n_records=min_n_records,
+        compact_equipment=compact_equipment,
+        compress=compress,
+        chunk_size=CHUNK_SIZE if processes else None,
+    )
+    with ProcessPoolExecutor(max_workers=processes) if processes else ThreadPoolExecutor(UPLOAD_WORKERS) as executor:
+        futures = [executor.submit(prepare, csv_file) for csv_file in csv_files]
+        for future in as_completed(futures):
+            yield future.result()
+
 
+def _read_features(features: Union[List[str], str]) -> List[str]:
+    """Read features given as a list or as a path to text file with one feature per line.
+
+    Args:
+        features (Union[List[str],str]): List of features or path to text file with features.
+
+    Returns:
+        List[str]: List of features.
+
+    Raises:
+        TypeError: Error when provided features do not match expected format.
+    """
     if not isinstance(features, list):
         if os.path.isfile(features):
             with open(features, "r", encoding="utf-8") as feats_file:
@@ -33,93 +274,346 @@ def upload_to_db(
             features = [x.strip() for x in features]
         else:
             raise TypeError("Provided features should be a list of strings or path to text file.")
+    return features
 
-    load_dotenv()
-    region_name = os.environ["REGION_NAME"]
-    aws_access_key_id = os.environ["AWS_ACCESS_KEY_ID"]
-    aws_secret_access_key = os.environ["AWS_SECRET_ACCESS_KEY"]
-    s3 = boto3.resource(
-        service_name="s3",
-        region_name=region_name,
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
+
+def _prepare_collection(  # pylint: disable=too-many-arguments
+    csv_file: str,
+    *,
+    features: List[str],
+    min_n_records: int,
+    compact_equipment: bool,
+    compress: bool,
+    chunk_size: Optional[int],
+) -> PreparedCollection:
+    """Process scraped csv file into csv body ready for upload.
+
+    Args:
+        csv_file (str): Path to csv file.
+        features (List[str]): List of features.
+        min_n_records (int): Minimum number of records for car model for it to be uploaded.
+        compact_equipment (bool): Whether to pack equipment flags into the bitmask column.
+        compress (bool): Whether to gzip the csv body.
+        chunk_size (Optional[int]): Number of rows read at a time. Whole file is read when None.
+
+    Returns:
+        PreparedCollection: Collection name, csv body, or None if there are no rows left, number of records
+            of every model and csv body of aggregate cube, see utils.cubes.
+    """
+    collection_name = os.path.split(csv_file)[1].split(".")[0]
+    equipment_codec = EquipmentCodec(features) if compact_equipment else None
+    if chunk_size is None:
+        data = _read_collection(csv_file, features, collection_name)
+        chunks = [_process_dataframe(data, min_n_records, equipment_codec)]
+    else:
+        chunks = _process_file_in_chunks(csv_file, features, min_n_records, equipment_codec, chunk_size)
+
+    model_counts = Counter()
+    cubes = []
+
+    def summarize(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        """Count records of every model and build cubes of chunks while they are serialized.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Processed chunks.
+
+        Yields:
+            pd.DataFrame: Unchanged chunk.
+        """
+        for chunk in chunks:
+            model_counts.update(chunk["Model pojazdu"].value_counts().to_dict())
+            cubes.append(build_cube(chunk))
+            yield chunk
+
+    body = _serialize_chunks(summarize(chunks), compress)
+    cube = combine_cubes(cubes)
+    return PreparedCollection(
+        collection_name,
+        body,
+        {str(model): int(n) for model, n in model_counts.items()},
+        _serialize_chunks([cube.set_index(KEYS)], compress) if body is not None else None,
     )
 
-    temp_data_path = os.path.join(os.getcwd(), "temp_data.csv")
-    progress_bar = trange(len(csv_files))
-    for n in progress_bar:
-        collection_name = os.path.split(csv_files[n])[1].split(".")[0]
-
-        data = pd.read_csv(csv_files[n], low_memory=False)[features]
-        processed_data = _process_dataframe(data, min_n_records)
-        if not processed_data.empty:
-            tqdm.write(f"Uploading {collection_name} data...")
-            processed_data.to_csv(temp_data_path)
-            s3.Bucket(s3_bucket_name).upload_file(Filename="temp_data.csv", Key=f"{collection_name}.txt")
-        else:
-            tqdm.write(
-                f"Skipping uploading {collection_name} data - no model meets minimum number of records condition."
-            )
 
-    if os.path.exists(temp_data_path):
-        os.remove(temp_data_path)
+def _select_columns(columns: Iterable[str], features: List[str]) -> List[str]:
+    """Features to read from a scraped csv file, depending on whether its equipment is compact.
 
+    Args:
+        columns (Iterable[str]): Columns of the file.
+        features (List[str]): List of features.
+
+    Returns:
+        List[str]: Columns to read.
+    """
+    return EquipmentCodec(features).columns(features) if EQUIPMENT_COLUMN in columns else features
 
-def _process_dataframe(df: pd.DataFrame, min_n_records: int) -> pd.DataFrame:
-    """Process dataframe.
+
+def _report_invalid_values(collection_name: str, invalid: Dict[str, pd.Series]) -> None:
+    """Report values which could not be normalized.
 
     Args:
-        df (pd.DataFrame): DataFrame to be processed
+        collection_name (str): Name of the collection.
+        invalid (Dict[str, pd.Series]): Counts of invalid values by column, see normalize_dataframe.
+    """
+    for column, invalid_values in invalid.items():
+        examples = ", ".join(repr(value) for value in invalid_values.index[:3])
+        tqdm.write(f"{collection_name}: {invalid_values.sum()} invalid values in {column} column, e.g. {examples}")
+
+
+def _read_collection(csv_file: str, features: List[str], collection_name: str) -> pd.DataFrame:
+    """Read scraped csv file and normalize its values, reporting values which could not be parsed.
+
+    Args:
+        csv_file (str): Path to csv file.
+        features (List[str]): List of features.
+        collection_name (str): Name of the collection, used in reports.
+
+    Returns:
+        pd.DataFrame: Normalized data.
+    """
+    data = pd.read_csv(csv_file, low_memory=False)
+    data = data[_select_columns(data.columns, features)]
+    _report_invalid_values(collection_name, normalize_dataframe(data))
+    return data
+
+
+def _serialize_chunks(chunks: Iterable[pd.DataFrame], compress: bool) -> Optional[bytes]:
+    """Serialize processed chunks into csv bytes.
+
+    Args:
+        chunks (Iterable[pd.DataFrame]): Processed chunks of a single collection.
+        compress (bool): Whether to gzip the csv. Compressed bytes do not depend on time of compression.
+
+    Returns:
+        Optional[bytes]: Serialized data or None if there are no rows.
+    """
+    buffer = io.BytesIO()
+    n_rows = 0
+    with gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0) if compress else contextlib.nullcontext(buffer) as file:
+        for i, chunk in enumerate(chunks):
+            file.write(chunk.to_csv(header=i == 0).encode("utf-8"))
+            n_rows += len(chunk)
+    return buffer.getvalue() if n_rows else None
+
+
+def _upload_object(bucket, key: str, body: bytes, compressed: bool, content_type: str = "text/csv") -> bool:
+    """Upload object unless an object with the same content is already stored under the key.
+    Content is compared by SHA-256 stored in object metadata, or by ETag, which is MD5 of the content for objects
+    uploaded in a single part.
+
+    Args:
+        bucket (s3.Bucket): Target bucket.
+        key (str): Object key.
+        body (bytes): Object content.
+        compressed (bool): Whether the content is gzip compressed.
+        content_type (str): Content type of the object. Defaults to "text/csv".
+
+    Returns:
+        bool: True if the object was uploaded, False if it was unchanged.
+    """
+    digest = hashlib.sha256(body).hexdigest()
+    try:
+        head = bucket.meta.client.head_object(Bucket=bucket.name, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+            raise
+    else:
+        # ETag of single part uploads, not used for security. usedforsecurity needs Python 3.9
+        md5 = hashlib.md5(body).hexdigest()  # nosec B324
+        if head["Metadata"].get(HASH_METADATA_KEY) == digest or head["ETag"].strip('"') == md5:
+            return False
+
+    extra_args = {"Metadata": {HASH_METADATA_KEY: digest}, "ContentType": content_type}
+    if compressed:
+        extra_args["ContentEncoding"] = "gzip"
+    bucket.upload_fileobj(io.BytesIO(body), key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+    return True
+
+
+def _upload_price_models(
+    bucket, collection_name: str, body: bytes, compressed: bool, equipment_codec: Optional[EquipmentCodec]
+) -> int:
+    """Train price model of every car model of an uploaded collection and upload it to the model registry.
+
+    Args:
+        bucket (s3.Bucket): Target bucket.
+        collection_name (str): Name of the collection, i.e. car maker.
+        body (bytes): Uploaded csv body of the collection.
+        compressed (bool): Whether the body is gzip compressed.
+        equipment_codec (Optional[EquipmentCodec]): Codec of the equipment bitmask, None if equipment is not compact.
+
+    Returns:
+        int: Number of uploaded models.
+    """
+    data = pd.read_csv(io.BytesIO(body), compression="gzip" if compressed else None, low_memory=False)
+    data = training_data(data, equipment_codec)
+    n_uploaded = 0
+    for model, model_data in data.groupby("Model pojazdu"):
+        pipeline = train_price_model(model_data)
+        model_body = serialize_model(pipeline, len(model_data))
+        n_uploaded += _upload_object(
+            bucket, model_key(collection_name, model), model_body, False, content_type="application/octet-stream"
+        )
+    tqdm.write(f"Uploaded {n_uploaded} price models of {collection_name}")
+    return n_uploaded
+
+
+def _frequent_models(model_counts: pd.Series, min_n_records: int) -> pd.Index:
+    """Car models with at least min_n_records records.
+
+    Args:
+        model_counts (pd.Series): Number of records by car model.
         min_n_records (int): Minimum number of records for car model for it to be uploaded.
 
     Returns:
-        pd.DataFrame: Processed DataFrame
+        pd.Index: Car models.
     """
+    return model_counts.index[model_counts >= min_n_records]
+
+
+def _transform_dataframe(
+    df: pd.DataFrame, models: Optional[pd.Index], equipment_codec: Optional[EquipmentCodec]
+) -> pd.DataFrame:
+    """Packs equipment, keeps records of selected car models and drops unused columns.
 
-    df.reset_index(inplace=True)
+    Args:
+        df (pd.DataFrame): Normalized data or a chunk of it.
+        models (Optional[pd.Index]): Car models to keep. All records are kept when None.
+        equipment_codec (Optional[EquipmentCodec]): Codec packing equipment flag columns, if any.
+
+    Returns:
+        pd.DataFrame: Transformed data.
+    """
+    if equipment_codec is not None and EQUIPMENT_COLUMN not in df.columns:
+        df = equipment_codec.encode_frame(df)
+    # Row number in the source file, so chunks and whole files give the same column
+    df.insert(0, "index", df.index)
     df.columns = df.columns.str.replace(",", "")
-    df = df[df.groupby("Model pojazdu")["Model pojazdu"].transform("size") >= min_n_records]
-    df.drop(
-        columns=[
-            "Wersja",
-            "Pokaż oferty z numerem VIN",
-            "Kategoria",
-            "Generacja",
-            "Emisja CO2",
-            "Rodzaj własności baterii",
-            "Pojemność baterii",
-            "Spalanie W Mieście",
-            "Metalik",
-            "Leasing",
-            "VAT marża",
-            "Faktura VAT",
-            "Okres gwarancji producenta",
-            "Możliwość finansowania",
-            "Pierwsza rejestracja",
-            "Pierwszy właściciel",
-            "Ma numer rejestracyjny",
-            "Autonomia",
-        ],
-        inplace=True,
-    )
+    if models is not None:
+        df = df[df["Model pojazdu"].isin(models)]
+    return df.drop(columns=DROPPED_COLUMNS)
 
-    binary_str_columns = [
-        "Kierownica po prawej (Anglik)",
-        "Zarejestrowany w Polsce",
-        "Bezwypadkowy",
-        "Serwisowany w ASO",
-    ]
-
-    for column_name in binary_str_columns:
-        df.loc[df[column_name] == "Tak", column_name] = 1.0
-        df[column_name].fillna(0.0, inplace=True)
-
-    binary_columns = [
-        column
-        for column in df.columns
-        if ((df[column].nunique() == 1 or df[column].nunique() == 0) and df[column].dtype == "float64")
-    ]
-
-    for column in binary_columns:
-        df[column].fillna(0.0, inplace=True)
+
+def _fill_binary_columns(df: pd.DataFrame, binary_columns: List[str]) -> pd.DataFrame:
+    """Fill missing values of float columns holding at most one distinct value with 0.0.
+
+    Args:
+        df (pd.DataFrame): Transformed data.
+        binary_columns (List[str]): Columns to fill.
+
+    Returns:
+        pd.DataFrame: Filled data.
+    """
+    if binary_columns:
+        df[binary_columns] = df[binary_columns].fillna(0.0)
     return df
+
+
+def _process_dataframe(
+    df: pd.DataFrame, min_n_records: int, equipment_codec: Optional[EquipmentCodec] = None
+) -> pd.DataFrame:
+    """Process dataframe. Numeric and flag columns are expected to be normalized with normalize_dataframe.
+
+    Args:
+        df (pd.DataFrame): DataFrame to be processed
+        min_n_records (int): Minimum number of records for car model for it to be uploaded.
+        equipment_codec (Optional[EquipmentCodec]): When given, equipment flag columns are packed into the bitmask
+            column. Data already scraped with compact equipment keeps its bitmask column either way.
+
+    Returns:
+        pd.DataFrame: Processed DataFrame
+    """
+    models = _frequent_models(df["Model pojazdu"].value_counts(), min_n_records)
+    df = _transform_dataframe(df, models, equipment_codec)
+    float_columns = df.columns[df.dtypes == "float64"]
+    n_unique = df[float_columns].nunique()
+    return _fill_binary_columns(df, n_unique.index[n_unique <= 1].to_list())
+
+
+def _process_file_in_chunks(
+    csv_file: str,
+    features: List[str],
+    min_n_records: int,
+    equipment_codec: Optional[EquipmentCodec],
+    chunk_size: int,
+) -> Iterator[pd.DataFrame]:
+    """Process scraped csv file chunk by chunk, giving the same data as _process_dataframe on the whole file.
+    The first pass over the file collects number of records by car model, column types and value ranges
+    of numeric columns by car model, which decide which columns are binary. The second pass transforms chunks.
+
+    Args:
+        csv_file (str): Path to csv file.
+        features (List[str]): List of features.
+        min_n_records (int): Minimum number of records for car model for it to be uploaded.
+        equipment_codec (Optional[EquipmentCodec]): Codec packing equipment flag columns, if any.
+        chunk_size (int): Number of rows read at a time.
+
+    Yields:
+        pd.DataFrame: Processed chunk.
+    """
+    columns = _select_columns(pd.read_csv(csv_file, nrows=0).columns, features)
+    schema = _scan_chunks(csv_file, columns, min_n_records, equipment_codec, chunk_size)
+    if schema is None:
+        return
+
+    invalid = {}
+    for chunk in pd.read_csv(csv_file, usecols=columns, chunksize=chunk_size, dtype=schema.dtype):
+        chunk = chunk[columns]
+        for column, invalid_values in normalize_dataframe(chunk).items():
+            previous = invalid.get(column, pd.Series(dtype="int64"))
+            invalid[column] = invalid_values.add(previous, fill_value=0).astype("int64")
+        chunk = _transform_dataframe(chunk, schema.models, equipment_codec)
+        chunk[schema.float_columns] = chunk[schema.float_columns].astype("float64")
+        yield _fill_binary_columns(chunk, schema.binary_columns)
+    _report_invalid_values(os.path.split(csv_file)[1].split(".")[0], invalid)
+
+
+def _scan_chunks(
+    csv_file: str,
+    columns: List[str],
+    min_n_records: int,
+    equipment_codec: Optional[EquipmentCodec],
+    chunk_size: int,
+) -> Optional[ChunkSchema]:
+    """First pass of _process_file_in_chunks, collecting number of records by car model, column types and value
+    ranges of numeric columns by car model over all chunks of the file.
+
+    Args:
+        csv_file (str): Path to csv file.
+        columns (List[str]): Columns to read.
+        min_n_records (int): Minimum number of records for car model for it to be uploaded.
+        equipment_codec (Optional[EquipmentCodec]): Codec packing equipment flag columns, if any.
+        chunk_size (int): Number of rows read at a time.
+
+    Returns:
+        Optional[ChunkSchema]: Schema of processed chunks or None if the file has no rows.
+    """
+    model_counts = pd.Series(dtype="float64")
+    kinds = defaultdict(set)
+    minimums, maximums = [], []
+    for chunk in pd.read_csv(csv_file, usecols=columns, chunksize=chunk_size):
+        chunk = chunk[columns]
+        normalize_dataframe(chunk)
+        chunk = _transform_dataframe(chunk, None, equipment_codec)
+        model_counts = model_counts.add(chunk["Model pojazdu"].value_counts(), fill_value=0)
+        for column, dtype in chunk.dtypes.items():
+            kinds[column].add(dtype.kind)
+        numeric = chunk.select_dtypes("number").groupby(chunk["Model pojazdu"])
+        minimums.append(numeric.min())
+        maximums.append(numeric.max())
+    if not minimums:
+        return None
+
+    models = _frequent_models(model_counts, min_n_records)
+    # Whole-file reads give float columns where a chunk without missing values gives ints
+    float_columns = [column for column, found in kinds.items() if "f" in found and found <= {"i", "f"}]
+    minimum = pd.concat(minimums).groupby(level=0).min().reindex(models).min()
+    maximum = pd.concat(maximums).groupby(level=0).max().reindex(models).max()
+    varying = maximum.reindex(float_columns) > minimum.reindex(float_columns)
+    return ChunkSchema(
+        models,
+        float_columns,
+        varying.index[~varying].to_list(),
+        # Columns which are not numeric in every chunk are read as text, as whole-file reads do
+        {column: str for column in columns if "O" in kinds.get(column.replace(",", ""), ())},
+    )
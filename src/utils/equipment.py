@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Features holding text values. Remaining features of features_names.txt are equipment flags (1 when present)
+MAIN_FEATURES = frozenset(
+    {
+        "Oferta od",
+        "Kategoria",
+        "Pokaż oferty z numerem VIN",
+        "Ma numer rejestracyjny",
+        "Marka pojazdu",
+        "Model pojazdu",
+        "Wersja",
+        "Generacja",
+        "Rok produkcji",
+        "Przebieg",
+        "Pojemność skokowa",
+        "Rodzaj paliwa",
+        "Moc",
+        "Skrzynia biegów",
+        "Autonomia",
+        "Napęd",
+        "Pojemność baterii",
+        "Rodzaj własności baterii",
+        "Emisja CO2",
+        "Filtr cząstek stałych",
+        "Spalanie W Mieście",
+        "Typ nadwozia",
+        "Liczba drzwi",
+        "Liczba miejsc",
+        "Kolor",
+        "Metalik",
+        "Rodzaj koloru",
+        "Kierownica po prawej (Anglik)",
+        "Kraj pochodzenia",
+        "Leasing",
+        "VAT marża",
+        "Faktura VAT",
+        "Okres gwarancji producenta",
+        "Możliwość finansowania",
+        "Pierwsza rejestracja",
+        "Zarejestrowany w Polsce",
+        "Pierwszy właściciel",
+        "Bezwypadkowy",
+        "Serwisowany w ASO",
+        "Stan",
+        "Cena",
+        "Waluta",
+        "Url",
+    }
+)
+
+EQUIPMENT_COLUMN = "Wyposażenie"
+BITMASK_PREFIX = "0x"
+
+
+class EquipmentCodec:
+    """
+    Packs equipment flags of an advert into a single bitmask column instead of one mostly empty column per flag.
+    Bit i of the mask is set when equipment feature with ID i is present. IDs are positions of equipment features
+    in the features list, so new features have to be appended after existing ones to keep stored masks valid.
+    Masks are stored as hex strings prefixed with "0x", so csv readers do not mistake them for numbers.
+    Args:
+        features: All feature names, in order, e.g. read from features_names.txt
+    """
+
+    def __init__(self, features: Iterable[str]):
+        self.features: List[str] = [feature for feature in features if feature not in MAIN_FEATURES]
+        self.ids = {feature: i for i, feature in enumerate(self.features)}
+        self.n_bytes = (len(self.features) + 7) // 8
+        self.empty_mask = BITMASK_PREFIX + "00" * self.n_bytes
+
+    @classmethod
+    def from_file(cls, features_file_path: str) -> "EquipmentCodec":
+        """Creates codec from features file.
+
+        Args:
+            features_file_path (str): Path to file with one feature name per line.
+
+        Returns:
+            EquipmentCodec: Codec instance.
+        """
+        with open(features_file_path, "r", encoding="utf-8") as feats_file:
+            return cls(line.strip() for line in feats_file if not line.isspace())
+
+    def columns(self, features: Iterable[str]) -> List[str]:
+        """Compact columns of the features: main features followed by the bitmask column.
+
+        Args:
+            features (Iterable[str]): All feature names, in order.
+
+        Returns:
+            List[str]: Column names.
+        """
+        return [feature for feature in features if feature not in self.ids] + [EQUIPMENT_COLUMN]
+
+    def encode(self, present: Iterable[str]) -> str:
+        """Encodes equipment of a single advert.
+
+        Args:
+            present (Iterable[str]): Names of present features. Names which are not equipment features are ignored.
+
+        Returns:
+            str: Bitmask.
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        flags = np.zeros(self.n_bytes * 8, dtype=np.uint8)
+        flags[[self.ids[name] for name in present if name in self.ids]] = 1
+        return BITMASK_PREFIX + np.packbits(flags).tobytes().hex()
+
+    def encode_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replaces equipment flag columns of a frame with the bitmask column. A flag is present when its value is
+        not missing. Missing flag columns are treated as absent.
+
+        Args:
+            df (pd.DataFrame): Frame with one column per equipment feature.
+
+        Returns:
+            pd.DataFrame: Frame with the bitmask column instead of equipment columns.
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        flags = df.reindex(columns=self.features).notna().to_numpy(dtype=np.uint8)
+        packed = np.packbits(flags, axis=1)
+        masks = [BITMASK_PREFIX + row.tobytes().hex() for row in packed]
+        df = df.drop(columns=[column for column in df.columns if column in self.ids])
+        df[EQUIPMENT_COLUMN] = pd.Series(masks, index=df.index, dtype=object)
+        return df
+
+    def decode(self, masks: pd.Series, features: Optional[List[str]] = None) -> pd.DataFrame:
+        """Decodes bitmasks into flag columns.
+
+        Args:
+            masks (pd.Series): Bitmasks, missing masks are treated as empty. Masks written before features were
+                appended to the list are shorter and decode them as absent, bits of features unknown to this codec
+                are ignored.
+            features (Optional[List[str]]): Features to decode. Defaults to all equipment features.
+
+        Returns:
+            pd.DataFrame: One 0.0/1.0 column per feature, indexed like masks.
+        """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+
+        features = features or self.features
+        width = 2 * self.n_bytes
+        hex_masks = masks.fillna(self.empty_mask).str.removeprefix(BITMASK_PREFIX).str.ljust(width, "0").str[:width]
+        packed = np.frombuffer(bytes.fromhex("".join(hex_masks)), dtype=np.uint8).reshape(len(masks), self.n_bytes)
+        flags = np.unpackbits(packed, axis=1)[:, [self.ids[feature] for feature in features]]
+        return pd.DataFrame(flags.astype("float64"), index=masks.index, columns=features)
@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+MODEL_COLUMN = "Model pojazdu"
+# Text columns with at most this ratio of distinct values to rows are stored as categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Reduce memory of a maker frame: low-cardinality text columns become categoricals, integral float columns
+    without missing values become the smallest fitting integers and remaining floats become float32.
+    Float columns with values exceeding float32 precision are kept as they are.
+
+    Args:
+        df (pd.DataFrame): Maker data, as read from csv.
+
+    Returns:
+        pd.DataFrame: Compact frame with the same values.
+    """
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            if values.nunique() <= CATEGORY_MAX_RATIO * len(values):
+                columns[column] = values.astype("category")
+        elif pd.api.types.is_float_dtype(values):
+            finite = values.dropna().to_numpy()
+            if len(finite) == len(values) and np.array_equal(finite, np.trunc(finite)):
+                columns[column] = pd.to_numeric(values, downcast="integer")
+            elif np.array_equal(finite, finite.astype("float32")):
+                columns[column] = values.astype("float32")
+        elif pd.api.types.is_integer_dtype(values):
+            columns[column] = pd.to_numeric(values, downcast="integer")
+    return df.assign(**columns)
+
+
+class MakerFrame:
+    """
+    Data of a single maker, compacted with compact_frame and sorted by model, with precomputed row range of every
+    model, so rows of a model are selected without scanning the whole frame.
+    Args:
+        data: Maker data, as read from csv
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        if MODEL_COLUMN in data.columns:
+            data = data.sort_values(MODEL_COLUMN, kind="stable", ignore_index=True)
+        self.data = compact_frame(data)
+        self.model_slices: Dict[str, slice] = {}
+        if MODEL_COLUMN in data.columns:
+            models = data[MODEL_COLUMN].astype(str).to_numpy()
+            starts = np.flatnonzero(np.r_[True, models[1:] != models[:-1]]) if len(models) else np.array([], int)
+            stops = np.r_[starts[1:], len(models)]
+            self.model_slices = {models[start]: slice(start, stop) for start, stop in zip(starts, stops)}
+
+    @property
+    def empty(self) -> bool:
+        """Whether there is no data."""
+        return self.data.empty
+
+    @property
+    def models(self) -> List[str]:
+        """Models of the maker."""
+        return list(self.model_slices)
+
+    def select(self, model: Optional[str] = None) -> pd.DataFrame:
+        """Rows of a single model.
+
+        Args:
+            model (Optional[str]): Model name. Defaults to all models.
+
+        Returns:
+            pd.DataFrame: Selected rows, empty if there is no such model.
+        """
+        if model is None:
+            return self.data
+        return self.data.iloc[self.model_slices.get(model, slice(0, 0))]
+
+    def memory_usage(self, deep: bool = True) -> pd.Series:
+        """Memory used by columns of the data, see pd.DataFrame.memory_usage.
+
+        Args:
+            deep (bool): Whether to count memory of objects referenced by text columns. Defaults to True.
+
+        Returns:
+            pd.Series: Bytes used by every column and the index.
+        """
+        return self.data.memory_usage(deep=deep)
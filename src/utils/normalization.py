@@ -0,0 +1,76 @@
+from typing import Dict
+import pandas as pd
+
+# Leading number of a value, after whitespace is removed, e.g. "1598" from "1 598 cm3" or "123000,50" from "123 000,50"
+NUMBER_PATTERN = r"^(\d+(?:[.,]\d+)?)"
+
+NUMERIC_COLUMNS = ["Cena", "Przebieg", "Moc", "Pojemność skokowa", "Rok produkcji"]
+
+FLAG_COLUMNS = [
+    "Ma numer rejestracyjny",
+    "Filtr cząstek stałych",
+    "Metalik",
+    "Kierownica po prawej (Anglik)",
+    "Leasing",
+    "VAT marża",
+    "Faktura VAT",
+    "Możliwość finansowania",
+    "Zarejestrowany w Polsce",
+    "Pierwszy właściciel",
+    "Bezwypadkowy",
+    "Serwisowany w ASO",
+]
+FLAG_VALUES = {"Tak": 1.0, "Nie": 0.0}
+
+
+def parse_numbers(values: pd.Series) -> pd.Series:
+    """Parses raw values with units and thousands separators, e.g. "123 000 km" or "150 KM", into floats.
+
+    Args:
+        values (pd.Series): Raw values.
+
+    Returns:
+        pd.Series: Parsed values, NaN where value is missing or could not be parsed.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float64")
+    numbers = values.astype("string").str.replace(r"\s", "", regex=True).str.extract(NUMBER_PATTERN, expand=False)
+    return pd.to_numeric(numbers.str.replace(",", ".", regex=False), errors="coerce").astype("float64")
+
+
+def parse_flags(values: pd.Series) -> pd.Series:
+    """Parses "Tak"/"Nie" values into 1.0/0.0. Missing values are treated as "Nie".
+
+    Args:
+        values (pd.Series): Raw values.
+
+    Returns:
+        pd.Series: Parsed values, NaN where value could not be parsed.
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype("float64").fillna(0.0)
+    return values.map(FLAG_VALUES).astype("float64").where(values.notna(), 0.0)
+
+
+def normalize_dataframe(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Converts numeric and flag columns of scraped data into float columns in place.
+    Columns which are not present are skipped.
+
+    Args:
+        df (pd.DataFrame): Scraped data.
+
+    Returns:
+        Dict[str, pd.Series]: Counts of raw values which could not be parsed, by column. Only columns with
+            invalid values are included.
+    """
+    invalid = {}
+    for columns, parse in ((NUMERIC_COLUMNS, parse_numbers), (FLAG_COLUMNS, parse_flags)):
+        for column in columns:
+            if column not in df.columns:
+                continue
+            raw = df[column]
+            parsed = parse(raw)
+            if (failed := parsed.isna() & raw.notna()).any():
+                invalid[column] = raw[failed].value_counts()
+            df[column] = parsed
+    return invalid
@@ -0,0 +1,210 @@
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Optional
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+from botocore.exceptions import ClientError
+
+
+def size_of(value: Any) -> int:
+    """Approximate memory used by a cached value.
+
+    Args:
+        value (Any): Cached value.
+
+    Returns:
+        int: Size in bytes.
+    """
+    if hasattr(value, "memory_usage"):
+        # Frames, series and objects wrapping them, e.g. MakerFrame
+        return int(np.sum(value.memory_usage(deep=True)))
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    """Value kept in memory together with validators of the object it was parsed from."""
+
+    def __init__(self, value: Any, size: int, validators: dict):
+        self.value = value
+        self.size = size
+        self.validators = validators
+        self.checked_at = time.monotonic()
+
+
+class TieredObjectCache:
+    """
+    Cache of S3 objects shared by all users of a process, with two tiers:
+    - memory: parsed values evicted in least recently used order once their total size exceeds max_memory_bytes.
+      Values larger than the ceiling are not kept in memory at all. Entries older than revalidate_seconds are
+      checked against S3 before being served.
+    - disk: raw object bodies with their ETag and Last-Modified, revalidated with a conditional request, so an
+      unchanged object is not downloaded again, also after a restart of the process.
+    Values are shared, callers must not modify them. Every key has to be always parsed with the same function.
+    Args:
+        s3_client: boto3 client of s3 service
+        bucket_name: Name of the bucket
+        directory: Directory of the disk tier
+        max_memory_bytes: Memory ceiling of the memory tier
+        revalidate_seconds: Time after which values in memory are checked against S3
+    """
+
+    MAX_MEMORY_BYTES = 512 * 1024**2
+    REVALIDATE_SECONDS = 300
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        s3_client,
+        bucket_name: str,
+        directory: str,
+        max_memory_bytes: int = MAX_MEMORY_BYTES,
+        revalidate_seconds: float = REVALIDATE_SECONDS,
+    ):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self._entries: Dict[str, _Entry] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = defaultdict(threading.Lock)
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def get(self, key: str, parse: Callable[[bytes, dict], Any]) -> Any:
+        """Value of an object, from memory, from disk or downloaded from S3.
+
+        Args:
+            key (str): Object key.
+            parse (Callable[[bytes, dict], Any]): Function parsing object body, given its validators, with
+                "content_encoding" among them.
+
+        Returns:
+            Any: Parsed value.
+
+        Raises:
+            ClientError: Error when object could not be downloaded, e.g. it does not exist.
+        """
+        entry = self._fresh_entry(key)
+        if entry is not None:
+            return entry.value
+
+        with self._key_locks[key]:
+            # Another thread could have loaded the object meanwhile
+            entry = self._fresh_entry(key)
+            if entry is not None:
+                return entry.value
+            with self._lock:
+                entry = self._entries.get(key)
+            validators = entry.validators if entry is not None else self._read_validators(key)
+
+            downloaded = self._download(key, validators)
+            if downloaded is None and entry is not None:
+                entry.checked_at = time.monotonic()
+                self._count("memory_hits")
+                return entry.value
+            if downloaded is None:
+                body = self._read_body(key)
+                self._count("disk_hits")
+            else:
+                body, validators = downloaded
+                self._write_disk(key, body, validators)
+                self._count("misses")
+
+            value = parse(body, validators)
+            self._store(key, _Entry(value, size_of(value), validators))
+            return value
+
+    def stats(self) -> Dict[str, float]:
+        """Hit counts and rates of both tiers and current memory use.
+
+        Returns:
+            Dict[str, float]: Statistics of the cache.
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            stats["entries"] = len(self._entries)
+            stats["memory_bytes"] = self._memory_bytes
+        stats["requests"] = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["memory_hit_rate"] = stats["memory_hits"] / stats["requests"] if stats["requests"] else 0.0
+        stats["disk_hit_rate"] = stats["disk_hits"] / stats["requests"] if stats["requests"] else 0.0
+        stats["max_memory_bytes"] = self.max_memory_bytes
+        return stats
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] += 1
+
+    def _fresh_entry(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry.checked_at > self.revalidate_seconds:
+                return None
+            self._entries.move_to_end(key)
+            self._counts["memory_hits"] += 1
+            return entry
+
+    def _store(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= previous.size
+            if entry.size > self.max_memory_bytes:
+                return
+            self._entries[key] = entry
+            self._memory_bytes += entry.size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._memory_bytes -= evicted.size
+
+    def _download(self, key: str, validators: Optional[dict]) -> Optional[tuple]:
+        """Conditional download of an object.
+
+        Returns:
+            Optional[tuple]: Body and validators of the object or None if it did not change since validators.
+        """
+        conditions = {}
+        if validators and validators.get("etag"):
+            conditions["IfNoneMatch"] = validators["etag"]
+        elif validators and validators.get("last_modified"):
+            conditions["IfModifiedSince"] = datetime.datetime.fromisoformat(validators["last_modified"])
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=key, **conditions)
+        except ClientError as e:
+            if conditions and e.response["Error"]["Code"] in ("304", "NotModified"):
+                return None
+            raise
+        validators = {
+            "etag": response.get("ETag"),
+            "last_modified": response["LastModified"].isoformat() if response.get("LastModified") else None,
+            "content_encoding": response.get("ContentEncoding"),
+        }
+        return response["Body"].read(), validators
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, self.bucket_name, key)
+
+    def _read_validators(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        if not os.path.exists(path) or not os.path.exists(f"{path}.meta.json"):
+            return None
+        with open(f"{path}.meta.json", "r", encoding="utf-8") as meta_file:
+            return json.load(meta_file)
+
+    def _read_body(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as body_file:
+            return body_file.read()
+
+    def _write_disk(self, key: str, body: bytes, validators: dict) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Validators are removed first and written last, so a body is never served with validators of another one
+        if os.path.exists(f"{path}.meta.json"):
+            os.remove(f"{path}.meta.json")
+        for file_path, content in ((path, body), (f"{path}.meta.json", json.dumps(validators).encode("utf-8"))):
+            with open(f"{file_path}.part", "wb") as part_file:
+                part_file.write(content)
+            os.replace(f"{file_path}.part", file_path)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional
+import datetime
+import io
+import threading
+import pandas as pd
+from botocore.exceptions import ClientError
+from .equipment import EQUIPMENT_COLUMN, EquipmentCodec
+
+# scikit-learn and joblib take over a second to import, they are loaded once a model is trained or loaded
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+# Bumped whenever features or layout of serialized models change, models of older versions are not loaded
+REGISTRY_VERSION = 1
+NUMERIC_FEATURES = ["Rok produkcji", "Przebieg", "Moc", "Bezwypadkowy", "Hak"]
+SCALED_FEATURES = ["Rok produkcji", "Przebieg", "Moc"]
+CATEGORICAL_FEATURES = ["Rodzaj paliwa", "Skrzynia biegów", "Napęd", "Typ nadwozia", "Kolor"]
+PARAM_DISTRIBUTIONS = {
+    "n_estimators": [50, 100],
+    "max_depth": [None, 10, 20],
+    "min_samples_split": [2, 5],
+    "min_samples_leaf": [1, 2, 4],
+}
+RANDOM_STATE = 2137
+
+
+def model_key(maker: str, model: str) -> str:
+    """S3 key of the price model of a car model.
+
+    Args:
+        maker (str): Name of the maker.
+        model (str): Name of the car model.
+
+    Returns:
+        str: Object key.
+    """
+    return f"price_models/v{REGISTRY_VERSION}/{maker}/{model}.joblib"
+
+
+def training_data(data: pd.DataFrame, equipment_codec: Optional[EquipmentCodec] = None) -> pd.DataFrame:
+    """Prepare uploaded data the way the app processes it: drop rows without mileage, power or production year
+    and decode tow hitch flag from the equipment bitmask.
+
+    Args:
+        data (pd.DataFrame): Data of a single car model, as uploaded to S3.
+        equipment_codec (Optional[EquipmentCodec]): Codec of the equipment bitmask, needed when data is compact.
+
+    Returns:
+        pd.DataFrame: Data ready for train_price_model.
+    """
+    data = data.dropna(subset=["Przebieg", "Moc", "Rok produkcji"])
+    if EQUIPMENT_COLUMN in data.columns and equipment_codec is not None:
+        data = data.drop(columns=EQUIPMENT_COLUMN).join(equipment_codec.decode(data[EQUIPMENT_COLUMN], ["Hak"]))
+    return data
+
+
+def train_price_model(data: pd.DataFrame) -> Pipeline:
+    """Train price model of a single car model: random forest with hyperparameters chosen by randomized search.
+
+    Args:
+        data (pd.DataFrame): Processed data with price and NUMERIC_FEATURES and CATEGORICAL_FEATURES columns.
+
+    Returns:
+        Pipeline: Fitted pipeline predicting price from a frame of features.
+    """
+    from sklearn.compose import ColumnTransformer  # pylint: disable=import-outside-toplevel
+    from sklearn.ensemble import RandomForestRegressor  # pylint: disable=import-outside-toplevel
+    from sklearn.model_selection import RandomizedSearchCV  # pylint: disable=import-outside-toplevel
+    from sklearn.pipeline import Pipeline  # pylint: disable=import-outside-toplevel
+    from sklearn.preprocessing import MinMaxScaler, OneHotEncoder  # pylint: disable=import-outside-toplevel
+
+    features = data.reindex(columns=NUMERIC_FEATURES + CATEGORICAL_FEATURES)
+    features[CATEGORICAL_FEATURES] = features[CATEGORICAL_FEATURES].astype(object)
+    for column in features.columns:
+        if features[column].isna().any():
+            mode = features[column].mode()
+            features[column] = features[column].fillna(mode.iloc[0] if not mode.empty else 0)
+
+    preprocessor = ColumnTransformer(
+        transformers=[
+            ("num", "passthrough", NUMERIC_FEATURES),
+            ("cat", OneHotEncoder(handle_unknown="ignore"), CATEGORICAL_FEATURES),
+            ("min_max", MinMaxScaler(), SCALED_FEATURES),
+        ]
+    )
+    random_search = RandomizedSearchCV(
+        RandomForestRegressor(random_state=RANDOM_STATE),
+        param_distributions=PARAM_DISTRIBUTIONS,
+        n_iter=5,
+        cv=2,
+        scoring="neg_mean_squared_error",
+        random_state=RANDOM_STATE,
+    )
+    random_search.fit(preprocessor.fit_transform(features), data["Cena"])
+    return Pipeline([("preprocessor", preprocessor), ("model", random_search.best_estimator_)])
+
+
+def predict_price(pipeline: Pipeline, feature_dict: dict) -> int:
+    """Predict price of a car, rounded down to hundreds.
+
+    Args:
+        pipeline (Pipeline): Fitted price model.
+        feature_dict (dict): Car features (keys) and their values, numeric ones may be given as text.
+
+    Returns:
+        int: Estimated price.
+    """
+    features = pd.DataFrame([feature_dict]).reindex(columns=NUMERIC_FEATURES + CATEGORICAL_FEATURES)
+    features[NUMERIC_FEATURES] = features[NUMERIC_FEATURES].apply(pd.to_numeric)
+    result = int(pipeline.predict(features)[0])
+    return result - result % 100
+
+
+def serialize_model(pipeline: Pipeline, n_records: int) -> bytes:
+    """Serialize price model together with versions it was trained with.
+
+    Args:
+        pipeline (Pipeline): Fitted price model.
+        n_records (int): Number of records the model was trained on.
+
+    Returns:
+        bytes: Serialized model.
+    """
+    import joblib  # pylint: disable=import-outside-toplevel
+    import sklearn  # pylint: disable=import-outside-toplevel
+
+    buffer = io.BytesIO()
+    joblib.dump(
+        {
+            "registry_version": REGISTRY_VERSION,
+            "sklearn_version": sklearn.__version__,
+            "trained_on": datetime.date.today().isoformat(),
+            "n_records": n_records,
+            "pipeline": pipeline,
+        },
+        buffer,
+        compress=3,
+    )
+    return buffer.getvalue()
+
+
+def deserialize_model(body: bytes) -> Optional[Pipeline]:
+    """Deserialize price model.
+
+    Args:
+        body (bytes): Model serialized with serialize_model.
+
+    Returns:
+        Optional[Pipeline]: Price model or None if it was serialized by a different registry or scikit-learn version.
+    """
+    import joblib  # pylint: disable=import-outside-toplevel
+    import sklearn  # pylint: disable=import-outside-toplevel
+
+    entry = joblib.load(io.BytesIO(body))
+    if entry["registry_version"] != REGISTRY_VERSION or entry["sklearn_version"] != sklearn.__version__:
+        return None
+    return entry["pipeline"]
+
+
+class PriceModelRegistry:
+    """
+    Pretrained price models stored in S3, loaded on first use and kept in memory in least recently used order.
+    Lookups of models which are not available are remembered as well, so they do not hit S3 again.
+    Args:
+        s3_client: boto3 client of s3 service
+        bucket_name: Name of the bucket with price models
+        max_models: Maximum number of models kept in memory
+    """
+
+    MAX_MODELS = 16
+
+    def __init__(self, s3_client, bucket_name: str = "otomoto-scrapper", max_models: int = MAX_MODELS):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.max_models = max_models
+        self._models: Dict[tuple, Optional[Pipeline]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, maker: str, model: str) -> Optional[Pipeline]:
+        """Price model of a car model.
+
+        Args:
+            maker (str): Name of the maker.
+            model (str): Name of the car model.
+
+        Returns:
+            Optional[Pipeline]: Price model or None if there is no compatible pretrained model.
+
+        Raises:
+            ClientError: Error when model could not be downloaded for reason other than it does not exist.
+        """
+        key = (maker, model)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+
+        try:
+            body = self.s3_client.get_object(Bucket=self.bucket_name, Key=model_key(maker, model))["Body"].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                raise
+            pipeline = None
+        else:
+            pipeline = deserialize_model(body)
+
+        with self._lock:
+            self._models[key] = pipeline
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return pipeline
@@ -0,0 +1,215 @@
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import contextlib
+import datetime
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# Set to a directory to profile functions decorated with profiled, e.g. in the streamlit app
+PROFILE_DIRECTORY_VARIABLE = "PROFILE_DIRECTORY"
+TIMINGS_FILENAME = "timings.jsonl"
+
+_write_lock = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler. A background thread records call stacks of profiled threads every interval
+    seconds, so profiled code runs unmodified and threads waiting on network or locks show up as well.
+    Stacks are aggregated in folded format, one "thread;module:function;...;module:function count" line per stack,
+    which flamegraph.pl, inferno-flamegraph and speedscope render as a flamegraph.
+    Args:
+        interval: Seconds between samples
+        thread_ids: Identifiers of profiled threads. Defaults to all threads
+    """
+
+    INTERVAL = 0.005
+
+    def __init__(self, interval: float = INTERVAL, thread_ids: Optional[Iterable[int]] = None):
+        self.interval = interval
+        self.thread_ids = set(thread_ids) if thread_ids is not None else None
+        self.stacks: Counter = Counter()
+        self.seconds = 0.0
+        self._labels: Dict[object, str] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    @property
+    def n_samples(self) -> int:
+        """Number of recorded stacks, one per sampled thread in every sample."""
+        return sum(self.stacks.values())
+
+    def start(self) -> "SamplingProfiler":
+        """Starts sampling in a background thread.
+
+        Returns:
+            SamplingProfiler: The profiler itself.
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops sampling."""
+        self._stopped.set()
+        self._thread.join()
+        self.seconds += time.perf_counter() - self._started
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        if (label := self._labels.get(code)) is None:
+            name = getattr(code, "co_qualname", code.co_name)
+            label = f"{frame.f_globals.get('__name__', '?')}:{name}".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def sample(self) -> None:
+        """Records current stacks of profiled threads."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_id = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+            if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            # Numbered threads of a pool share one root, e.g. "ThreadPoolExecutor-0_3" becomes "ThreadPoolExecutor-N_N"
+            stack.append(re.sub(r"\d+", "N", names.get(thread_id, "unknown")).replace(";", ","))
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        """Recorded stacks in folded format.
+
+        Returns:
+            str: One line per stack with its number of samples.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def hottest(self, n: int = 5) -> List[Tuple[str, int]]:
+        """Functions most often on top of recorded stacks, i.e. where the time was spent.
+
+        Args:
+            n (int): Number of functions.
+
+        Returns:
+            List[Tuple[str, int]]: Functions with their number of samples, most sampled first.
+        """
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(n)
+
+
+def write_profile(directory: str, stage: str, profiler: SamplingProfiler) -> str:
+    """Appends stacks of a profiled stage to <directory>/<stage>.folded and its timing to timings.jsonl.
+    Repeated runs of a stage accumulate in the same file, flamegraph tools sum equal stacks.
+
+    Args:
+        directory (str): Profiles directory.
+        stage (str): Name of the stage.
+        profiler (SamplingProfiler): Stopped profiler of the stage.
+
+    Returns:
+        str: Path of the folded stacks file.
+    """
+    path = os.path.join(directory, f"{stage}.folded")
+    timing = {
+        "stage": stage,
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "seconds": profiler.seconds,
+        "samples": profiler.n_samples,
+        "hottest": profiler.hottest(),
+    }
+    with _write_lock:
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as folded_file:
+            folded_file.write(profiler.folded())
+        with open(os.path.join(directory, TIMINGS_FILENAME), "a", encoding="utf-8") as timings_file:
+            timings_file.write(json.dumps(timing) + "\n")
+    return path
+
+
+@contextlib.contextmanager
+def profile_stage(
+    stage: str, directory: str, interval: float = SamplingProfiler.INTERVAL, current_thread: bool = False
+) -> Iterator[SamplingProfiler]:
+    """Context manager profiling its body, see write_profile. The profile is written even when the body raises.
+
+    Args:
+        stage (str): Name of the stage, used as file name.
+        directory (str): Profiles directory.
+        interval (float): Seconds between samples.
+        current_thread (bool): Whether to sample only the calling thread, e.g. one session of a server.
+            By default all threads are sampled.
+
+    Yields:
+        SamplingProfiler: Profiler of the stage, stopped and written once the body is done.
+    """
+    profiler = SamplingProfiler(interval, [threading.get_ident()] if current_thread else None).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        write_profile(directory, stage, profiler)
+
+
+def profiled(stage: str, interval: float = 0.001) -> Callable[[Callable], Callable]:
+    """Decorator profiling every call of a function in the calling thread when the PROFILE_DIRECTORY environment
+    variable is set, see profile_stage. Otherwise the function is called directly.
+
+    Args:
+        stage (str): Name of the stage, used as file name.
+        interval (float): Seconds between samples, shorter than the default as single calls are short.
+
+    Returns:
+        Callable[[Callable], Callable]: Decorator.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        """Wraps a function.
+
+        Args:
+            function (Callable): Profiled function.
+
+        Returns:
+            Callable: Function profiled when PROFILE_DIRECTORY is set.
+        """
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            """Calls the function, profiled when PROFILE_DIRECTORY is set.
+
+            Args:
+                *args: Positional arguments of the function.
+                **kwargs: Keyword arguments of the function.
+
+            Returns:
+                Any: Result of the function.
+            """
+            if not (directory := os.environ.get(PROFILE_DIRECTORY_VARIABLE)):
+                return function(*args, **kwargs)
+            with profile_stage(stage, directory, interval, current_thread=True):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
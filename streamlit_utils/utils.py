@@ -1,16 +1,32 @@
 # pylint: disable=W9011
+import functools
+import io
+
+# pandas, numpy and botocore stay module imports, unlike boto3: the app renders pandas frames and opens its S3
+# session on every boot, and pandas imports numpy, so importing them on first use would not shorten the boot
 import pandas as pd
 import numpy as np
 from typing import List
-import boto3
 from botocore.exceptions import ClientError
 import streamlit as st
 from dotenv import load_dotenv
 import os
-from sklearn.model_selection import RandomizedSearchCV
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import OneHotEncoder, MinMaxScaler
-from sklearn.compose import ColumnTransformer
+from src.utils.catalog import load_catalog, load_legacy_catalog
+from src.utils.cubes import CUBE_DTYPES, build_cube, cube_key
+from src.utils.equipment import EQUIPMENT_COLUMN, EquipmentCodec
+from src.utils.maker_frame import MakerFrame
+from src.utils.normalization import parse_numbers
+from src.utils.object_cache import TieredObjectCache
+from src.utils.price_models import PriceModelRegistry, predict_price, train_price_model
+from src.utils.profiling import profiled
+
+FEATURES_FILE_PATH = os.path.join("src", "resources", "features_names.txt")
+OBJECT_CACHE_DIRECTORY = os.path.join(".cache", "s3")
+OBJECT_CACHE_MEMORY_MB = 512
+# Bounds of st.cache_data caches, least recently used entries are evicted and all expire after the TTL,
+# so memory does not grow with the number of makers, models and chart variants seen by the process
+DATA_CACHE_MAX_ENTRIES = 32
+DATA_CACHE_TTL_SECONDS = 3600
 
 
 @st.cache_resource(show_spinner=False)
@@ -20,6 +36,8 @@ def get_session_state() -> tuple:
     Returns:
         tuple[boto3.s3, list, dict]: Tuple with S3 session, list of car makes and dict of car models
     """
+    import boto3  # pylint: disable=import-outside-toplevel
+
     # Preparing access to S3 resources
     load_dotenv()
     region_name = os.environ["REGION_NAME"]
@@ -32,45 +50,125 @@ def get_session_state() -> tuple:
         aws_secret_access_key=aws_secret_access_key,
     )
 
-    # Preparing data on car makes
-    car_makes_data = s3.Bucket("otomoto-scrapper-car-makes").Object("car_makes.txt").get()
-    car_makes = pd.read_csv(car_makes_data["Body"], header=None, low_memory=False)[0].to_list()
-
-    # Preparing data on car models
-    car_models = {}
-    for make in car_makes:
-        models_data = s3.Bucket("otomoto-scrapper-car-models").Object(f"car_models/{make}.txt").get()
-        car_models[make] = pd.read_csv(models_data["Body"], header=None, low_memory=False)[0].to_list()
+    # Catalog of car makes and models is a single object, older deployments keep one object per make
+    catalog = load_catalog(s3.meta.client, "otomoto-scrapper")
+    if catalog is None:
+        catalog = load_legacy_catalog(s3.meta.client, "otomoto-scrapper-car-makes", "otomoto-scrapper-car-models")
+    car_makes = catalog["makes"]
+    car_models = catalog["models"]
 
     return s3, car_makes, car_models
 
 
-def get_maker_data(s3_resource, maker: str) -> pd.DataFrame:
-    """Function for downloading data on single car manufacturer
+@st.cache_resource(show_spinner=False)
+def get_object_cache(_s3_resource) -> TieredObjectCache:
+    """Cache of objects of the data bucket shared by all sessions of the app, see src.utils.object_cache.
+    Disk tier directory and memory ceiling are read from OBJECT_CACHE_DIRECTORY and OBJECT_CACHE_MEMORY_MB
+    environment variables. Objects are read with the client of the boto3 s3 resource passed, which is not hashed
+    by the cache.
+
+    Returns:
+        TieredObjectCache: Object cache
+    """
+    load_dotenv()
+    return TieredObjectCache(
+        _s3_resource.meta.client,
+        "otomoto-scrapper",
+        os.environ.get("OBJECT_CACHE_DIRECTORY", OBJECT_CACHE_DIRECTORY),
+        int(os.environ.get("OBJECT_CACHE_MEMORY_MB", OBJECT_CACHE_MEMORY_MB)) * 1024**2,
+    )
+
+
+def read_csv_body(body: bytes, validators: dict, **kwargs) -> pd.DataFrame:
+    """Function for parsing csv object downloaded from S3
+
+    Args:
+        body (bytes): Object content
+        validators (dict): Object validators, gzip compressed content is marked by "content_encoding"
+        **kwargs: Arguments passed to pd.read_csv
+
+    Returns:
+        pd.DataFrame: Parsed dataframe
+    """
+    compression = "gzip" if validators.get("content_encoding") == "gzip" else None
+    return pd.read_csv(io.BytesIO(body), low_memory=False, compression=compression, **kwargs)
+
+
+def read_maker_frame(body: bytes, validators: dict) -> MakerFrame:
+    """Function for parsing maker data object downloaded from S3 into compact frame indexed by model
+
+    Args:
+        body (bytes): Object content
+        validators (dict): Object validators, see read_csv_body
+
+    Returns:
+        MakerFrame: Maker data
+    """
+    return MakerFrame(read_csv_body(body, validators))
+
+
+def get_maker_data(s3_resource, maker: str) -> MakerFrame:
+    """Function for downloading data on single car manufacturer.
+    Data is shared by all sessions and must not be modified.
 
     Args:
         s3_resource (s3): Instance of boto3 resource with s3 service
         maker (str): Name of the maker
 
     Returns:
-        pd.DataFrame: Dataframe with maker data
+        MakerFrame: Maker data with categorical text columns and row ranges of models, empty if there is no data
+
+    Raises:
+        ClientError: Error when the object cannot be downloaded for other reasons than its absence.
     """
+    try:
+        return get_object_cache(s3_resource).get(f"{maker}.txt", read_maker_frame)
+    except ClientError as e:
+        if not e.response["Error"]["Code"] == "NoSuchKey":
+            raise
+        return MakerFrame(pd.DataFrame())
 
-    @st.cache_data(show_spinner=False)
-    def download_maker_data(maker: str) -> pd.DataFrame:
-        try:
-            maker_data = s3_resource.Bucket("otomoto-scrapper").Object(f"{maker}.txt").get()
-            maker_data = pd.read_csv(maker_data["Body"], low_memory=False)
-            return maker_data
-        except ClientError as e:
-            if not e.response["Error"]["Code"] == "NoSuchKey":
-                raise
-            return pd.DataFrame()
 
-    return download_maker_data(maker)
+def get_maker_cube(s3_resource, maker: str) -> pd.DataFrame:
+    """Function for downloading aggregate cube of single car manufacturer, see src.utils.cubes.
+    Cube is built from maker data when it has not been uploaded along with it.
+    Dataframe is shared by all sessions and must not be modified.
+
+    Args:
+        s3_resource (s3): Instance of boto3 resource with s3 service
+        maker (str): Name of the maker
+
+    Returns:
+        pd.DataFrame: Dataframe with maker cube, empty if there is no data on the maker
+
+    Raises:
+        ClientError: Error when the object cannot be downloaded for other reasons than its absence.
+    """
+    try:
+        return get_object_cache(s3_resource).get(cube_key(maker), functools.partial(read_csv_body, dtype=CUBE_DTYPES))
+    except ClientError as e:
+        if not e.response["Error"]["Code"] == "NoSuchKey":
+            raise
+        return build_maker_cube(s3_resource, maker)
+
+
+@st.cache_data(show_spinner=False, max_entries=DATA_CACHE_MAX_ENTRIES, ttl=DATA_CACHE_TTL_SECONDS)
+def build_maker_cube(_s3_resource, maker: str) -> pd.DataFrame:
+    """Function for building aggregate cube from data on single car manufacturer uploaded without it.
+    The boto3 s3 resource passed first is not hashed by the cache.
+
+    Args:
+        maker (str): Name of the maker
+
+    Returns:
+        pd.DataFrame: Dataframe with maker cube, empty if there is no data on the maker
+    """
+    maker_data = get_maker_data(_s3_resource, maker)
+    return pd.DataFrame() if maker_data.empty else build_cube(process_data(maker_data.data.copy()))
 
 
-@st.cache_data(show_spinner=False)
+@st.cache_data(show_spinner=False, max_entries=DATA_CACHE_MAX_ENTRIES, ttl=DATA_CACHE_TTL_SECONDS)
+@profiled("process_data")
 def process_data(data: pd.DataFrame) -> pd.DataFrame:
     """Function for processing data for streamlit app
 
@@ -81,26 +179,22 @@ def process_data(data: pd.DataFrame) -> pd.DataFrame:
         pd.DataFrame: Processed data
     """
 
-    # Price processing
-    data["Cena"] = data["Cena"].astype(str).str.replace(",", ".").astype(float)
+    # Data uploaded with db_upload.py is already typed, parsing is only needed for data uploaded before
+    for column in ["Cena", "Przebieg", "Moc", "Rok produkcji"]:
+        data[column] = parse_numbers(data[column])
+    data.dropna(subset=["Przebieg", "Moc", "Rok produkcji"], inplace=True)
+    data["Rok produkcji"] = data["Rok produkcji"].astype(int)
 
-    # Mileage processing
-    data.dropna(subset=["Przebieg"], inplace=True)
-    data["Przebieg"] = (
-        data["Przebieg"].astype(str).apply(lambda x: (x.replace("km", "").replace(" ", ""))).astype(float)
-    )
-
-    # Power processing
-    data.dropna(subset=["Moc"], inplace=True)
-    data["Moc"] = data["Moc"].astype(str).apply(lambda x: (x.replace("KM", "").replace(" ", ""))).astype(float)
-
-    # Production year processing
-    data.dropna(subset=["Rok produkcji"], inplace=True)
+    # Equipment uploaded as a bitmask, only flags used by the app are decoded
+    if EQUIPMENT_COLUMN in data.columns:
+        equipment = EquipmentCodec.from_file(FEATURES_FILE_PATH).decode(data[EQUIPMENT_COLUMN], ["Hak"])
+        data = data.drop(columns=EQUIPMENT_COLUMN).join(equipment)
 
     return data
 
 
-@st.cache_resource(show_spinner=False)
+@st.cache_data(show_spinner=False, max_entries=DATA_CACHE_MAX_ENTRIES, ttl=DATA_CACHE_TTL_SECONDS)
+@profiled("smoothen_plot")
 def smoothen_plot(data: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
     """Function for fitting exponential decay to the column data in order to generate smooth plot from it.
 
@@ -110,6 +204,7 @@ def smoothen_plot(data: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Dataframe extended by columns with extrapolated data
     """
+    data = data.copy()
     coeffs_array = []
     x = data["Przebieg"].to_numpy()
     for column in columns:
@@ -128,71 +223,24 @@ def smoothen_plot(data: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
     return data
 
 
+@st.cache_resource(show_spinner=False)
+def get_price_model_registry(_s3_resource) -> PriceModelRegistry:
+    """Registry of pretrained price models shared by all sessions of the app, reading from the bucket of the
+    boto3 s3 resource passed. The resource is not hashed by the cache.
+
+    Returns:
+        PriceModelRegistry: Registry loading models from the data bucket
+    """
+    return PriceModelRegistry(_s3_resource.meta.client, "otomoto-scrapper")
+
+
+@profiled("estimate_price")
 def estimate_price(feature_dict: dict, data: pd.DataFrame) -> float:
-    """Function for estimating price of a car based on its features.
+    """Function for estimating price of a car based on its features, training price model on the spot.
+    Used for car models without a pretrained model, see get_price_model_registry.
 
     Args:
         feature_dict (dict): Dictionary with car features (keys) and their values.
         data (pd.DataFrame): Processed dataframe with car data.
     """
-    columns_to_drop = [
-        "Marka pojazdu",
-        "Model pojazdu",
-        "Kraj pochodzenia",
-        "Stan",
-        "Waluta",
-        "Url",
-        "Oferta od",
-        "Pojemność skokowa",
-        "Rodzaj koloru",
-    ]
-    columns_min_max = ["Rok produkcji", "Przebieg", "Moc"]
-    columns_one_hot = ["Rodzaj paliwa", "Skrzynia biegów", "Napęd", "Typ nadwozia", "Kolor"]
-    binary_columns_to_drop = [
-        column
-        for column in data.select_dtypes(include=["float64"]).columns.to_list()
-        if column not in ["Hak", "Bezwypadkowy", "Cena", "Przebieg", "Moc"]
-    ]
-
-    data = data.drop(binary_columns_to_drop, axis=1)
-    data = data.drop(columns_to_drop, axis=1)
-    # data = process_data(data)
-
-    target = data["Cena"]
-    data.drop(["Cena"], axis=1, inplace=True)
-    features = data.drop([column for column in data.columns if column not in feature_dict.keys()], axis=1)
-
-    print(features.columns)
-
-    for column in features.columns:
-        if features[column].isna().sum() > 0:
-            features[column].fillna(features[column].value_counts().index[0], inplace=True)
-
-    transformers = [
-        ("num", "passthrough", features.select_dtypes(exclude=["object"]).columns),
-        ("cat", OneHotEncoder(), columns_one_hot),
-        ("min_max", MinMaxScaler(), columns_min_max),
-    ]
-
-    preprocessor = ColumnTransformer(transformers=transformers)
-    features = preprocessor.fit_transform(features)
-
-    model = RandomForestRegressor(random_state=2137)
-
-    param_dist = {
-        "n_estimators": [50, 100],
-        "max_depth": [None, 10, 20],
-        "min_samples_split": [2, 5],
-        "min_samples_leaf": [1, 2, 4],
-    }
-
-    random_search = RandomizedSearchCV(
-        model, param_distributions=param_dist, n_iter=5, cv=2, scoring="neg_mean_squared_error", random_state=2137
-    )
-    random_search.fit(features, target)
-
-    prediction_features = preprocessor.transform(pd.DataFrame([feature_dict]))
-    result = int(random_search.predict(prediction_features))
-    result -= result % 100
-
-    return result
+    return predict_price(train_price_model(data), feature_dict)
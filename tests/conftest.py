@@ -0,0 +1,84 @@
+"""Shared setup of the test suite. The scraper imports its modules relative to src, as when run from src/main.py."""
+import io
+import os
+import shutil
+import sys
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+REPO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_DIRECTORY, "src"))
+
+from modules.scrapers.car_scraper import CarScraper  # pylint: disable=wrong-import-position
+
+FIXTURES_DIRECTORY = os.path.join(REPO_DIRECTORY, "benchmarks", "fixtures")
+
+
+class ReplaySession:
+    """
+    Stand-in for requests.Session of the scraper transport, answering every listing url with the same page.
+    Args:
+        base_url: Url of the site linked from listing pages
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.requested = []
+        self._lock = threading.Lock()
+        self._fixtures = {}
+        for name in ("listing_current", "advert_current"):
+            with open(os.path.join(FIXTURES_DIRECTORY, f"{name}.html"), "r", encoding="utf-8") as fixture_file:
+                self._fixtures[name] = fixture_file.read()
+
+    def get(self, url: str, **_) -> requests.Response:
+        """Replays a listing or advert page.
+
+        Args:
+            url (str): Requested url.
+            **_: Other request arguments, ignored.
+
+        Returns:
+            requests.Response: Page, listing pages of every search link to the same adverts.
+        """
+        with self._lock:
+            self.requested.append(url)
+        if "/oferta/" in url:
+            html = self._fixtures["advert_current"]
+        else:
+            page = parse_qs(urlsplit(url).query).get("page", ["1"])[0]
+            html = self._fixtures["listing_current"]
+            for placeholder, value in (("BASE", self.base_url), ("MAKER", "opel"), ("PAGE", page), ("LAST_PAGE", "1")):
+                html = html.replace(f"{{{{{placeholder}}}}}", value)
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.encoding = "utf-8"
+        response.raw = io.BytesIO()
+        response._content = html.encode("utf-8")  # pylint: disable=protected-access
+        return response
+
+
+@pytest.fixture(name="scraper")
+def fixture_scraper(tmp_path, monkeypatch):
+    """Scraper of a single maker working in a temporary directory, with its transport replaying fixtures.
+
+    Args:
+        tmp_path (pathlib.Path): Temporary directory.
+        monkeypatch (pytest.MonkeyPatch): Patching helper.
+
+    Yields:
+        CarScraper: Scraper.
+    """
+    resources = tmp_path / "src" / "resources"
+    resources.mkdir(parents=True)
+    shutil.copy(os.path.join(REPO_DIRECTORY, "src", "resources", "features_names.txt"), resources)
+    (resources / "car_makes.txt").write_text("opel\n", encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    scraper = CarScraper("output", metrics_file=None, max_requests_per_second=None)
+    monkeypatch.setattr(scraper.transport, "session", ReplaySession(scraper.BASE_URL))
+    yield scraper
+    scraper.metrics_exporter.stop()
+    scraper.journal.close()
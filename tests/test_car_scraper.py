@@ -0,0 +1,93 @@
+"""Tests of modules.scrapers.car_scraper against pages replayed from benchmarks/fixtures, without network."""
+import os
+
+import pandas as pd
+from modules.scrapers.journal import JobJournal
+from modules.scrapers.partition import SearchSlice
+
+
+def test_scrap_maker_fetches_advert_shared_by_slices_once(scraper, monkeypatch):
+    """Adverts listed in two slices of a maker are downloaded for the first slice only and merged once.
+
+    Args:
+        scraper (CarScraper): Scraper replaying fixtures.
+        monkeypatch (pytest.MonkeyPatch): Patching helper.
+    """
+    slices = [(SearchSlice("opel", year_to=2010), 1), (SearchSlice("opel", year_from=2011), 1)]
+    monkeypatch.setattr(scraper.partitioner, "partition", lambda maker: slices)
+
+    scraper.scrap_maker("opel")
+
+    requested = scraper.transport.session.requested
+    adverts = [url for url in requested if "/oferta/" in url]
+    assert len([url for url in requested if "/oferta/" not in url]) == 2
+    assert adverts
+    assert len(adverts) == len(set(adverts))
+    merged = pd.read_csv(os.path.join(scraper.data_directory, "opel.csv"))
+    assert sorted(merged["Url"]) == sorted(adverts)
+
+
+def test_scrap_maker_resumed_skips_adverts_of_finished_slices(scraper, monkeypatch):
+    """Adverts written by a slice finished before a restart are not downloaded again by the next slices.
+
+    Args:
+        scraper (CarScraper): Scraper replaying fixtures.
+        monkeypatch (pytest.MonkeyPatch): Patching helper.
+    """
+    slices = [(SearchSlice("opel", year_to=2010), 1), (SearchSlice("opel", year_from=2011), 1)]
+    monkeypatch.setattr(scraper.partitioner, "partition", lambda maker: slices)
+    first, _ = slices[0]
+    scraper.scrap_pages(
+        "opel",
+        [1],
+        output_name=first.name,
+        output_directory=os.path.join(scraper.shards_directory, "opel"),
+        path=first.url(scraper.BASE_URL),
+    )
+
+    scraper.scrap_maker("opel")
+
+    adverts = [url for url in scraper.transport.session.requested if "/oferta/" in url]
+    assert adverts
+    assert len(adverts) == len(set(adverts))
+
+
+def test_scrap_all_makers_finishes_job(scraper):
+    """Once all makers are scraped the job is finished, so the next run scrapes them again in a new job.
+
+    Args:
+        scraper (CarScraper): Scraper replaying fixtures.
+    """
+    scraper.scrap_all_makers()
+
+    journal = JobJournal(scraper.journal.path, resume=True)
+    assert journal.job_id != scraper.journal.job_id
+    assert not journal.is_maker_done("opel")
+    journal.close()
+
+
+def test_scrap_maker_ignores_and_removes_shards_outside_current_job(scraper, monkeypatch):
+    """Shards left by other jobs or runs are not merged, shards of the current job are removed once merged.
+
+    Args:
+        scraper (CarScraper): Scraper replaying fixtures.
+        monkeypatch (pytest.MonkeyPatch): Patching helper.
+    """
+    slices = [(SearchSlice("opel", year_to=2010), 1), (SearchSlice("opel", year_from=2011), 1)]
+    monkeypatch.setattr(scraper.partitioner, "partition", lambda maker: slices)
+    stale = pd.DataFrame({"Url": ["https://www.otomoto.pl/osobowe/oferta/stale.html"], "Cena": ["1"]})
+    stale_directories = [
+        os.path.join(scraper.data_directory, "shards", "stale-job", "opel"),
+        os.path.join(scraper.data_directory, "shards", "opel"),
+    ]
+    for stale_directory in stale_directories:
+        os.makedirs(stale_directory)
+        stale.to_csv(os.path.join(stale_directory, "opel__0000-0000.csv"), index=False)
+
+    scraper.scrap_maker("opel")
+
+    merged = pd.read_csv(os.path.join(scraper.data_directory, "opel.csv"))
+    assert not merged.empty
+    assert stale["Url"][0] not in set(merged["Url"])
+    assert not os.path.exists(os.path.join(scraper.shards_directory, "opel"))
+    assert all(os.path.exists(stale_directory) for stale_directory in stale_directories)
@@ -0,0 +1,61 @@
+"""Tests of modules.scrapers.dataset typed schema and partitioned round trip."""
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+from modules.scrapers.dataset import DatasetWriter, dataset_schema, read_dataset, to_table
+
+COLUMNS = ["Url", "Marka pojazdu", "Cena", "Przebieg", "Rok produkcji", "Moc", "Pojemność skokowa", "ABS"]
+FRAME = pd.DataFrame(
+    [
+        ["https://www.otomoto.pl/oferta/1", "Opel", "45900", "143 500 km", "2017", "136 KM", "1 598 cm3", "1"],
+        ["https://www.otomoto.pl/oferta/2", "Opel", "12 000,50", "brak", None, None, None, None],
+    ],
+    columns=COLUMNS,
+)
+
+
+def test_dataset_schema_types_numeric_features():
+    """Price, mileage, power and engine capacity are doubles, production year an integer, text stays a string."""
+    schema = dataset_schema(COLUMNS)
+
+    assert schema.names == COLUMNS
+    assert schema.field("Url").type == pa.string()
+    assert schema.field("Marka pojazdu").type == pa.string()
+    for column in ("Cena", "Przebieg", "Moc", "Pojemność skokowa"):
+        assert schema.field(column).type == pa.float64()
+    assert schema.field("Rok produkcji").type == pa.int16()
+    assert schema.field("ABS").type == pa.int8()
+
+
+def test_to_table_parses_numbers_with_units():
+    """Raw values with units and separators are parsed, unparseable and missing ones become nulls."""
+    table = to_table(FRAME, dataset_schema(COLUMNS))
+
+    assert table.schema == dataset_schema(COLUMNS)
+    assert table.to_pydict() == {
+        "Url": ["https://www.otomoto.pl/oferta/1", "https://www.otomoto.pl/oferta/2"],
+        "Marka pojazdu": ["Opel", "Opel"],
+        "Cena": [45900.0, 12000.5],
+        "Przebieg": [143500.0, None],
+        "Rok produkcji": [2017, None],
+        "Moc": [136.0, None],
+        "Pojemność skokowa": [1598.0, None],
+        "ABS": [1, None],
+    }
+
+
+def test_dataset_round_trip_keeps_types(tmp_path):
+    """Rows written to a partition are read back with numeric columns typed.
+
+    Args:
+        tmp_path (Path): Dataset directory.
+    """
+    DatasetWriter(str(tmp_path), COLUMNS).write("opel", [FRAME], datetime.date(2024, 5, 1))
+
+    saved = read_dataset(str(tmp_path), columns=["Cena", "Rok produkcji", "maker"], filters=[("maker", "=", "opel")])
+
+    assert saved["Cena"].tolist() == [45900.0, 12000.5]
+    assert saved["Rok produkcji"].dtype.kind in "iuf"
+    assert saved["Rok produkcji"].iloc[0] == 2017
+    assert saved["maker"].astype(str).tolist() == ["opel", "opel"]
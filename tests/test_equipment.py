@@ -0,0 +1,88 @@
+"""Tests of utils.equipment bitmask codec."""
+import pandas as pd
+import pytest
+from utils.equipment import EQUIPMENT_COLUMN, EquipmentCodec
+
+EQUIPMENT = [f"Wyposażenie {index}" for index in range(10)]
+FEATURES = ["Marka pojazdu", EQUIPMENT[0], "Cena", *EQUIPMENT[1:], "Url"]
+
+
+@pytest.fixture(name="codec")
+def fixture_codec():
+    """Codec of ten equipment features spread between main features.
+
+    Returns:
+        EquipmentCodec: Codec.
+    """
+    return EquipmentCodec(FEATURES)
+
+
+def test_columns_keep_main_features_order_and_end_with_bitmask(codec):
+    """Compact columns are main features in their order followed by the bitmask column.
+
+    Args:
+        codec (EquipmentCodec): Codec.
+    """
+    assert codec.features == EQUIPMENT
+    assert codec.columns(FEATURES) == ["Marka pojazdu", "Cena", "Url", EQUIPMENT_COLUMN]
+
+
+def test_encode_decode_round_trip(codec):
+    """Decoded flags equal the encoded ones, in the order of requested features, unknown names are ignored.
+
+    Args:
+        codec (EquipmentCodec): Codec.
+    """
+    present = [[EQUIPMENT[0], EQUIPMENT[9]], [], [*EQUIPMENT, "Nieznane wyposażenie", "Cena"]]
+    masks = pd.Series([codec.encode(names) for names in present], index=[10, 11, 12])
+
+    assert masks.iloc[1] == codec.empty_mask
+    decoded = codec.decode(masks)
+    assert list(decoded.columns) == EQUIPMENT
+    assert list(decoded.index) == [10, 11, 12]
+    for (_, row), names in zip(decoded.iterrows(), present):
+        assert row.to_dict() == {feature: float(feature in names) for feature in EQUIPMENT}
+    selected = codec.decode(masks, [EQUIPMENT[9], EQUIPMENT[0]])
+    assert list(selected.columns) == [EQUIPMENT[9], EQUIPMENT[0]]
+    assert selected.to_numpy().tolist() == [[1.0, 1.0], [0.0, 0.0], [1.0, 1.0]]
+
+
+def test_encode_frame_matches_encode(codec):
+    """Frame encoding replaces flag columns with masks equal to encoding every row on its own.
+
+    Args:
+        codec (EquipmentCodec): Codec.
+    """
+    frame = pd.DataFrame(
+        {"Marka pojazdu": ["Opel", "Audi"], EQUIPMENT[3]: [1, None], EQUIPMENT[8]: [1, 1], "Cena": ["1", "2"]}
+    )
+
+    encoded = codec.encode_frame(frame)
+
+    assert list(encoded.columns) == ["Marka pojazdu", "Cena", EQUIPMENT_COLUMN]
+    assert encoded[EQUIPMENT_COLUMN].tolist() == [
+        codec.encode([EQUIPMENT[3], EQUIPMENT[8]]),
+        codec.encode([EQUIPMENT[8]]),
+    ]
+
+
+def test_masks_stay_valid_when_features_are_appended(codec):
+    """Masks written before new features were appended decode with the new features absent, and masks written
+    with them decode on the old codec without them.
+
+    Args:
+        codec (EquipmentCodec): Codec of the old features.
+    """
+    new_features = [*FEATURES, "Nowe wyposażenie"] + [f"Nowsze wyposażenie {index}" for index in range(6)]
+    new_codec = EquipmentCodec(new_features)
+    old_mask = codec.encode([EQUIPMENT[1], EQUIPMENT[8]])
+    new_mask = new_codec.encode([EQUIPMENT[1], "Nowe wyposażenie"])
+    assert len(new_mask) > len(old_mask)
+
+    decoded = new_codec.decode(pd.Series([old_mask, None]))
+    assert decoded.loc[0, EQUIPMENT[1]] == decoded.loc[0, EQUIPMENT[8]] == 1.0
+    assert decoded.loc[0, "Nowe wyposażenie"] == 0.0
+    assert decoded.loc[1].sum() == 0.0
+    assert codec.decode(pd.Series([new_mask])).loc[0].to_dict() == {
+        feature: float(feature == EQUIPMENT[1]) for feature in EQUIPMENT
+    }
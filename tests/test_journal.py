@@ -0,0 +1,121 @@
+"""Tests of modules.scrapers.journal, alone and checkpointing a sink interrupted mid-maker."""
+import pandas as pd
+import pytest
+from modules.scrapers.journal import JobJournal
+from modules.scrapers.sinks import SINKS, CsvSink, make_sink, read_batches
+
+COLUMNS = ["Url", "Marka pojazdu", "Cena"]
+ROWS = [
+    {"Url": f"https://www.otomoto.pl/oferta/{index}", "Marka pojazdu": "Opel", "Cena": str(1000 + index)}
+    for index in range(9)
+]
+
+
+class Crash(Exception):
+    """Stands for the scraper process being killed."""
+
+
+@pytest.fixture(name="journal_path")
+def fixture_journal_path(tmp_path):
+    """Path of a fresh journal.
+
+    Args:
+        tmp_path (Path): Test directory.
+
+    Returns:
+        str: Journal path.
+    """
+    return str(tmp_path / "journal.sqlite")
+
+
+def test_journal_starts_new_job_unless_resumed(journal_path):
+    """Journals start a new job by default and resume the last unfinished one only when asked to.
+
+    Args:
+        journal_path (str): Journal path.
+    """
+    first = JobJournal(journal_path)
+    first.mark_maker_done("opel")
+    first.close()
+
+    fresh = JobJournal(journal_path)
+    resumed = JobJournal(journal_path, resume=True)
+    named = JobJournal(journal_path, job_id=first.job_id)
+
+    assert fresh.job_id != first.job_id
+    assert not fresh.is_maker_done("opel")
+    assert resumed.job_id == fresh.job_id
+    assert named.is_maker_done("opel")
+    for journal in (fresh, resumed, named):
+        journal.close()
+
+
+def test_finished_job_is_not_resumed_and_dropped_on_request(journal_path):
+    """A finished job is skipped by resume and its entries are dropped only by drop_finished_jobs.
+
+    Args:
+        journal_path (str): Journal path.
+    """
+    finished = JobJournal(journal_path)
+    finished.mark_maker_done("opel")
+    finished.finish()
+
+    resumed = JobJournal(journal_path, resume=True)
+    assert resumed.job_id != finished.job_id
+    assert finished.is_maker_done("opel")
+
+    assert resumed.drop_finished_jobs() == 1
+    assert not finished.is_maker_done("opel")
+    resumed.close()
+    finished.close()
+
+
+@pytest.mark.parametrize("output_format", SINKS)
+def test_maker_resumed_after_crash_has_no_duplicate_or_missing_rows(tmp_path, journal_path, output_format):
+    """A maker interrupted after a batch reached the output but before the journal recorded it is resumed from
+    the last journaled checkpoint, writing every row exactly once.
+
+    Args:
+        tmp_path (Path): Output directory.
+        journal_path (str): Journal path.
+        output_format (str): Sink format.
+    """
+    journal = JobJournal(journal_path)
+
+    def record_flush(frame: pd.DataFrame, state: int) -> None:
+        if len(journal.written_urls("opel")) == 4:
+            raise Crash
+        journal.record_flush("opel", frame["Url"], state)
+
+    sink = make_sink(output_format, str(tmp_path), "opel", COLUMNS, batch_size=2, on_flush=record_flush)
+    with pytest.raises(Crash):
+        for row in ROWS:
+            sink.write(row)
+    if isinstance(sink, CsvSink):
+        sink._file.close()  # pylint: disable=protected-access
+    journal.close()
+
+    journal = JobJournal(journal_path, job_id=journal.job_id)
+    written_urls = journal.written_urls("opel")
+    assert len(written_urls) == 4
+    sink = make_sink(
+        output_format,
+        str(tmp_path),
+        "opel",
+        COLUMNS,
+        batch_size=2,
+        on_flush=lambda frame, state: journal.record_flush("opel", frame["Url"], state),
+        resume_state=journal.sink_state("opel"),
+    )
+    for row in ROWS:
+        if row["Url"] not in written_urls:
+            sink.write(row)
+    sink.close()
+    journal.mark_maker_done("opel")
+
+    saved = pd.concat(read_batches(sink.path, raw=True), ignore_index=True)
+    assert list(saved.columns) == COLUMNS
+    assert saved.to_dict("records") == ROWS
+    assert journal.is_maker_done("opel")
+    assert not journal.written_urls("opel")
+    journal.close()
@@ -0,0 +1,81 @@
+"""Tests of modules.scrapers.parsers backends against saved advert pages."""
+import os
+
+import pytest
+from modules.scrapers.parsers import PARSERS, AdvertParser, NextDataAdvertParser, get_parser
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_PATHS = [
+    os.path.join(TESTS_DIRECTORY, "fixtures", "advert.html"),
+    os.path.join(os.path.dirname(TESTS_DIRECTORY), "benchmarks", "fixtures", "advert_current.html"),
+    os.path.join(os.path.dirname(TESTS_DIRECTORY), "benchmarks", "fixtures", "advert_legacy.html"),
+]
+ADVERT_URL = "https://www.otomoto.pl/osobowe/oferta/opel-corsa-ID6100000001.html"
+
+
+class FailingParser(AdvertParser):
+    """
+    Fallback backend failing every call, so a test notices when the json backend leaves __NEXT_DATA__.
+    """
+
+    NAME = "failing"
+
+    def parse(self, path: str, html: str):  # pylint: disable=unused-argument
+        """Fails the calling test.
+
+        Args:
+            path (str): Advert url.
+            html (str): Advert page html.
+        """
+        pytest.fail(f"Fallback parser called for {path}")
+
+
+def _read(path: str) -> str:
+    with open(path, "r", encoding="utf-8") as fixture_file:
+        return fixture_file.read()
+
+
+def test_advert_parser_is_abstract():
+    """The base class cannot be used as a backend."""
+    with pytest.raises(TypeError):
+        AdvertParser()  # pylint: disable=abstract-class-instantiated
+
+
+@pytest.mark.parametrize("path", FIXTURE_PATHS, ids=os.path.basename)
+def test_parsers_produce_identical_rows(path):
+    """bs4, lxml and json backends extract the same features from one page.
+
+    Args:
+        path (str): Fixture advert page.
+    """
+    html = _read(path)
+    rows = {name: get_parser(name).parse(ADVERT_URL, html) for name in PARSERS}
+
+    assert rows["bs4"]
+    assert rows["bs4"] == rows["lxml"] == rows["json"]
+
+
+def test_parsers_extract_fixture_advert():
+    """Main features, equipment, price and currency of the fixture advert are extracted as shown on the page."""
+    row = get_parser("bs4").parse(ADVERT_URL, _read(FIXTURE_PATHS[0]))
+
+    assert row == {
+        "Marka pojazdu": "Opel",
+        "Model pojazdu": "Corsa",
+        "Rok produkcji": "2015",
+        "Przebieg": "98 000 km",
+        "Rodzaj paliwa": "Benzyna",
+        "ABS": 1,
+        "Klimatyzacja manualna": 1,
+        "Radio": 1,
+        "Cena": "29900",
+        "Waluta": "PLN",
+    }
+
+
+def test_json_parser_reads_next_data_without_fallback():
+    """The json backend takes the row from __NEXT_DATA__ alone when the page embeds it."""
+    html = _read(FIXTURE_PATHS[0])
+    row = NextDataAdvertParser(fallback=FailingParser()).parse(ADVERT_URL, html)
+
+    assert row == get_parser("lxml").parse(ADVERT_URL, html)
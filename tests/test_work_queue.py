@@ -0,0 +1,119 @@
+"""Tests of modules.scrapers.work_queue on the SQLite backend."""
+import os
+import time
+
+import pandas as pd
+import pytest
+from modules.scrapers.partition import SearchSlice
+from modules.scrapers.work_queue import Coordinator, SqliteWorkQueue, WorkQueue, WorkUnit, run_worker
+
+UNITS = [WorkUnit("opel", 1, 20, job_id="job"), WorkUnit("opel", 21, 25, job_id="job")]
+
+
+@pytest.fixture(name="queue")
+def fixture_queue(tmp_path):
+    """Empty SQLite queue.
+
+    Args:
+        tmp_path (Path): Test directory.
+
+    Returns:
+        SqliteWorkQueue: Queue.
+    """
+    return SqliteWorkQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+
+
+def test_work_queue_is_abstract():
+    """The base class cannot be used as a queue."""
+    with pytest.raises(TypeError):
+        WorkQueue()  # pylint: disable=abstract-class-instantiated
+
+
+def test_claim_hands_out_every_unit_once(queue):
+    """Units are claimed in order, each by a single worker, and completed units are not handed out again.
+
+    Args:
+        queue (SqliteWorkQueue): Queue.
+    """
+    queue.put(UNITS)
+    queue.put(UNITS)
+
+    assert queue.claim("worker-1") == UNITS[0]
+    assert queue.claim("worker-2") == UNITS[1]
+    assert queue.claim("worker-1") is None
+    queue.complete(UNITS[0])
+    queue.complete(UNITS[1])
+    assert queue.claim("worker-1") is None
+    assert queue.counts() == {"pending": 0, "claimed": 0, "done": 2, "failed": 0}
+
+
+def test_claim_hands_out_unit_again_after_lease_expires(queue):
+    """A unit claimed by a worker which never completes it is handed out again once its lease expires.
+
+    Args:
+        queue (SqliteWorkQueue): Queue.
+    """
+    queue.put(UNITS[:1])
+    assert queue.claim("crashed") == UNITS[0]
+    assert queue.claim("worker") is None
+
+    queue.lease_seconds = 0.01
+    time.sleep(0.02)
+    assert queue.claim("worker") == UNITS[0]
+    queue.complete(UNITS[0])
+    assert queue.counts()["done"] == 1
+
+
+def test_fail_retries_unit_up_to_max_attempts(queue):
+    """A failed unit goes back to the queue until it has been attempted max_attempts times.
+
+    Args:
+        queue (SqliteWorkQueue): Queue.
+    """
+    queue.put(UNITS[:1])
+    queue.fail(queue.claim("worker"))
+    assert queue.counts()["pending"] == 1
+    queue.fail(queue.claim("worker"))
+
+    assert queue.claim("worker") is None
+    assert queue.counts() == {"pending": 0, "claimed": 0, "done": 0, "failed": 1}
+
+
+def test_units_of_another_job_are_queued_again(queue):
+    """Units of a new job are published even when the same page ranges of an earlier job are done.
+
+    Args:
+        queue (SqliteWorkQueue): Queue.
+    """
+    queue.put(UNITS[:1])
+    queue.complete(queue.claim("worker"))
+
+    next_unit = UNITS[0]._replace(job_id="next-job")
+    queue.put([next_unit])
+    assert queue.claim("worker") == next_unit
+
+
+def test_coordinator_plans_again_after_merge(scraper, monkeypatch, tmp_path):
+    """A crawl planned, scraped and merged on a queue can be planned and scraped again on the same queue.
+
+    Args:
+        scraper (CarScraper): Scraper replaying fixtures.
+        monkeypatch (pytest.MonkeyPatch): Patching helper.
+        tmp_path (Path): Test directory.
+    """
+    monkeypatch.setattr(scraper.partitioner, "partition", lambda maker: [(SearchSlice(maker), 2)])
+    queue = SqliteWorkQueue(str(tmp_path / "queue.sqlite"))
+    coordinator = Coordinator(scraper, queue, pages_per_unit=1)
+    first_job = scraper.journal.job_id
+
+    for _ in range(2):
+        units = coordinator.plan(["opel"])
+        assert len(units) == 2
+        assert run_worker(queue, scraper, "worker") == 2
+        merged = coordinator.merge()
+        assert [os.path.basename(path) for path in merged] == ["opel.csv"]
+        assert not pd.read_csv(merged[0]).empty
+
+    assert scraper.journal.job_id != first_job
+    assert not os.path.exists(os.path.join(scraper.data_directory, "shards", first_job))
+    assert queue.counts()["done"] == 4